@@ -0,0 +1,172 @@
+"""
+Bulk analysis streaming for POST /analyze/batch.
+Parses a JSON-array or NDJSON request body incrementally and streams
+NDJSON results back chunk by chunk, so memory stays flat for any input size.
+"""
+import codecs
+import json
+import re
+
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+
+from engine.solar_time import offset_table
+
+CHUNK_SIZE = 1000
+MAX_RECORD_CHARS = 64 * 1024
+
+_SEPARATORS = re.compile(r"[\s,]*")
+_decoder = json.JSONDecoder()
+
+
+class RecordError(Exception):
+    """A record that could not be decoded; reported inline in the output stream."""
+
+
+async def iter_records(chunks):
+    """
+    Yields decoded records (or RecordError instances) from a streamed body.
+    A body starting with '[' is read as a JSON array, anything else as NDJSON.
+    """
+    text = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buf = ""
+    mode = None
+    pos = 0
+    consumed = 0  # characters of the body before buf, for error positions
+
+    async for chunk in chunks:
+        consumed += pos
+        buf = buf[pos:] + text.decode(chunk)
+        pos = 0
+
+        if mode is None:
+            stripped = buf.lstrip()
+            if not stripped:
+                buf = ""
+                continue
+            mode = "array" if stripped[0] == "[" else "ndjson"
+            if mode == "array":
+                pos = buf.index("[") + 1
+
+        if mode == "ndjson":
+            *lines, buf = buf.split("\n")
+            for line in lines:
+                if line.strip():
+                    yield _loads(line)
+            if len(buf) > MAX_RECORD_CHARS:
+                yield RecordError("Record too large")
+                return
+            continue
+
+        while True:
+            pos = _SEPARATORS.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            if buf[pos] == "]":
+                return
+            try:
+                record, pos = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as e:
+                if len(buf) - pos > MAX_RECORD_CHARS:
+                    yield _item_error(e, consumed)
+                    return
+                break  # incomplete record, wait for more data
+            yield record
+
+    consumed += pos
+    buf = buf[pos:] + text.decode(b"", final=True)
+    if mode == "ndjson" and buf.strip():
+        yield _loads(buf)
+    elif mode == "array":
+        # The body ended without a closing ']': either the item that stopped the
+        # parser is malformed, or the array was cut off after a complete item
+        pos = _SEPARATORS.match(buf).end()
+        try:
+            _decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if pos < len(buf):
+                yield _item_error(e, consumed)
+                return
+        yield RecordError("Unterminated JSON array")
+
+
+def _item_error(error, consumed):
+    """RecordError for an array item that failed to decode, positioned in the whole body."""
+    return RecordError(f"Invalid JSON: {error.msg} at char {consumed + error.pos}")
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose content iterator itself consumes the request body.
+    Starlette's disconnect listener would race the body reader for `receive()`
+    messages, so it is skipped; a disconnect surfaces through `request.stream()`.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def _loads(line):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return RecordError(f"Invalid JSON: {e.msg}")
+
+
+def _encode_chunk(start, records, analyze):
+    """
+    Runs one chunk through `analyze` (which returns an encoded JSON object)
+    and joins the results into NDJSON bytes.
+    """
+    lines = []
+    for index, record in enumerate(records, start):
+        try:
+            if isinstance(record, RecordError):
+                raise record
+            if not isinstance(record, dict) or not isinstance(record.get("birthDate"), str):
+                raise RecordError("Each record needs a birthDate string")
+            birth_time = record.get("birthTime", "00:00")
+            if not isinstance(birth_time, str):
+                raise RecordError("birthTime must be a string")
+            longitude = record.get("longitude")
+            if longitude is not None and (isinstance(longitude, bool) or not isinstance(longitude, (int, float))
+                                          or not -180 <= longitude <= 180):
+                raise RecordError("longitude must be a number between -180 and 180")
+            timezone = record.get("timezone")
+            if timezone is not None:
+                if not isinstance(timezone, str):
+                    raise RecordError("timezone must be a string")
+                try:
+                    offset_table(timezone)
+                except ValueError as e:
+                    raise RecordError(str(e)) from None
+            body = analyze(record["birthDate"], birth_time, longitude, timezone)
+            lines.append(b'{"index":%d,%s' % (index, body[1:]))
+            continue
+        except RecordError as e:
+            error = str(e)
+        except ValueError:
+            error = "Invalid date format. Use YYYY-MM-DD and HH:MM"
+        except Exception as e:
+            error = str(e)
+        lines.append(json.dumps(
+            {"index": index, "error": error}, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8"))
+    lines.append(b"")
+    return b"\n".join(lines)
+
+
+async def stream_analysis(chunks, analyze, chunk_size=CHUNK_SIZE):
+    """Yields NDJSON result bytes for every record in the streamed body, one chunk at a time."""
+    batch = []
+    start = 0
+    async for record in iter_records(chunks):
+        batch.append(record)
+        if len(batch) >= chunk_size:
+            yield await run_in_threadpool(_encode_chunk, start, batch, analyze)
+            start += len(batch)
+            batch = []
+    if batch:
+        yield await run_in_threadpool(_encode_chunk, start, batch, analyze)
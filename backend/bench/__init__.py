@@ -0,0 +1,4 @@
+"""
+Offline benchmarks for the Saju engine and API.
+Run from backend/:  python -m bench.run
+"""
@@ -0,0 +1,285 @@
+"""
+Local stand-ins for PayPal and Gemini, for load tests that cost nothing.
+
+PayPal:  POST /v1/oauth2/token, GET /v2/checkout/orders/{id}
+Gemini:  POST /v1beta/models/{model}:generateContent
+         POST /v1beta/models/{model}:streamGenerateContent?alt=sse
+         POST /v1beta/cachedContents, PATCH/DELETE /v1beta/cachedContents/{id}
+
+Latency, error rate and report size are configurable per server:
+
+    python -m bench.fakes paypal --port 9001 --latency 0.15
+    python -m bench.fakes gemini --port 9002 --latency 8 --error-rate 0.02 --output-chars 10000
+    python -m bench.fakes gemini --no-caching    # context caching refused, as for content below the minimum
+
+Then point the API at them:
+
+    PAYPAL_API_BASE=http://127.0.0.1:9001 NEXT_PUBLIC_PAYPAL_CLIENT_ID=x PAYPAL_CLIENT_SECRET=x \
+    GEMINI_BASE_URL=http://127.0.0.1:9002 GOOGLE_API_KEY=x uvicorn main:app
+
+The persona is below the real minimum for context caching, so the API only
+offers it for caching with PERSONA_CACHE_MIN_TOKENS=0 (see engine.persona_cache).
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.1          # mean seconds per call (streams spread it over the chunks)
+    jitter: float = 0.25          # +/- fraction of latency
+    error_rate: float = 0.0       # fraction of calls answered with error_status
+    error_status: int = 503
+    output_chars: int = 10000     # Gemini report length
+    chunks: int = 40              # Gemini stream chunks
+    token_ttl: int = 32400        # PayPal expires_in
+    caching: bool = True          # Gemini context caching available
+    min_cache_tokens: int = 0     # smallest cacheable content, in (estimated) tokens
+
+    async def delay(self, fraction=1.0):
+        spread = self.latency * self.jitter
+        await asyncio.sleep(max(0.0, random.uniform(self.latency - spread, self.latency + spread) * fraction))
+
+    def failed(self):
+        return random.random() < self.error_rate
+
+
+def _error(config, message):
+    return JSONResponse({"error": {"code": config.error_status, "message": message}},
+                        status_code=config.error_status)
+
+
+def paypal_app(config=None):
+    config = config or FakeConfig()
+    app = FastAPI(title="Fake PayPal")
+    app.state.config = config
+    app.state.tokens_issued = 0
+
+    @app.post("/v1/oauth2/token")
+    async def token():
+        await config.delay()
+        if config.failed():
+            return _error(config, "fake token failure")
+        app.state.tokens_issued += 1
+        return {
+            "access_token": f"FAKE-{app.state.tokens_issued}",
+            "token_type": "Bearer",
+            "expires_in": config.token_ttl,
+        }
+
+    @app.get("/v2/checkout/orders/{order_id}")
+    async def order(order_id: str):
+        await config.delay()
+        if config.failed():
+            return _error(config, "fake order failure")
+        # Ids starting with "UNPAID" stay APPROVED, everything else is captured
+        status = "APPROVED" if order_id.startswith("UNPAID") else "COMPLETED"
+        return {"id": order_id, "status": status}
+
+    return app
+
+
+_CHAPTER_PROMPT = re.compile(r"Write only chapter (\d+) ")
+
+
+def _report(chars, chapter=None):
+    """
+    A markdown report with the seven Book of Destiny chapters, `chars` long,
+    or only chapter number `chapter` of it.
+    """
+    from engine.generator import CHAPTERS
+
+    per_chapter = max(chars // len(CHAPTERS), 40)
+    filler = "The Qi of this chart flows like water finding its course. "
+    body = []
+    for idx, title in enumerate(CHAPTERS, 1):
+        if chapter is not None and idx != chapter:
+            continue
+        heading = f"## {idx}. {title}\n\n"
+        text = (filler * (per_chapter // len(filler) + 1))[:max(per_chapter - len(heading) - 2, 0)]
+        body.append(heading + text + "\n\n")
+    return "".join(body)
+
+
+def _tokens(text):
+    return max(len(text) // 4, 1)
+
+
+def _usage(prompt, output, cached=0):
+    prompt_tokens = _tokens(prompt) + cached
+    output_tokens = _tokens(output)
+    usage = {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": output_tokens,
+        "totalTokenCount": prompt_tokens + output_tokens,
+    }
+    if cached:
+        usage["cachedContentTokenCount"] = cached
+    return usage
+
+
+def _candidate(text, finished):
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return candidate
+
+
+def _prompt_text(body):
+    """Text of the request contents and its system instruction."""
+    contents = list(body.get("contents", []))
+    if body.get("systemInstruction"):
+        contents.append(body["systemInstruction"])
+    return "".join(
+        part.get("text", "")
+        for content in contents
+        for part in content.get("parts", [])
+    )
+
+
+def _not_found(name):
+    return JSONResponse({"error": {"code": 404, "message": f"{name} not found", "status": "NOT_FOUND"}},
+                        status_code=404)
+
+
+def _ttl_seconds(body, default=3600):
+    ttl = body.get("ttl")
+    return float(ttl.rstrip("s")) if ttl else default
+
+
+def gemini_app(config=None):
+    config = config or FakeConfig(latency=5.0)
+    app = FastAPI(title="Fake Gemini")
+    app.state.config = config
+    # Cached content name -> [tokens, expiry (time.monotonic())]
+    app.state.caches = {}
+    app.state.caches_created = 0
+
+    def live_cache(name):
+        entry = app.state.caches.get(name)
+        if entry is None or entry[1] < time.monotonic():
+            app.state.caches.pop(name, None)
+            return None
+        return entry
+
+    @app.post("/{version}/cachedContents")
+    async def create_cache(version: str, request: Request):
+        body = await request.json()
+        tokens = _tokens(_prompt_text(body))
+        if not config.caching or tokens < config.min_cache_tokens:
+            message = (f"Cached content is too small. total_token_count={tokens}, "
+                       f"min_total_token_count={max(config.min_cache_tokens, tokens + 1)}")
+            return JSONResponse({"error": {"code": 400, "message": message, "status": "INVALID_ARGUMENT"}},
+                                status_code=400)
+        app.state.caches_created += 1
+        name = f"cachedContents/fake-{app.state.caches_created}"
+        app.state.caches[name] = [tokens, time.monotonic() + _ttl_seconds(body)]
+        return {"name": name, "model": body.get("model"), "displayName": body.get("displayName", ""),
+                "usageMetadata": {"totalTokenCount": tokens}}
+
+    @app.patch("/{version}/cachedContents/{cache_id}")
+    async def update_cache(version: str, cache_id: str, request: Request):
+        name = f"cachedContents/{cache_id}"
+        entry = live_cache(name)
+        if entry is None:
+            return _not_found(name)
+        entry[1] = time.monotonic() + _ttl_seconds(await request.json())
+        return {"name": name, "usageMetadata": {"totalTokenCount": entry[0]}}
+
+    @app.delete("/{version}/cachedContents/{cache_id}")
+    async def delete_cache(version: str, cache_id: str):
+        app.state.caches.pop(f"cachedContents/{cache_id}", None)
+        return {}
+
+    @app.post("/{version}/models/{model_call}")
+    async def models(version: str, model_call: str, request: Request):
+        model, _, method = model_call.partition(":")
+        body = await request.json()
+        prompt = _prompt_text(body)
+        # A chapters-mode prompt gets one chapter, in proportionally less time
+        chapter = _CHAPTER_PROMPT.search(prompt)
+        report = _report(config.output_chars, int(chapter.group(1)) if chapter else None)
+        share = len(report) / max(config.output_chars, 1)
+
+        cached = 0
+        if body.get("cachedContent"):
+            entry = live_cache(body["cachedContent"])
+            if entry is None:
+                return _not_found(body["cachedContent"])
+            cached = entry[0]
+
+        if method == "generateContent":
+            await config.delay(share)
+            if config.failed():
+                return _error(config, "fake generation failure")
+            return {
+                "candidates": [_candidate(report, True)],
+                "usageMetadata": _usage(prompt, report, cached),
+                "modelVersion": model,
+            }
+
+        if method == "streamGenerateContent":
+            if config.failed():
+                await config.delay(0.1)
+                return _error(config, "fake generation failure")
+
+            step = max(len(report) // config.chunks, 1)
+            pieces = [report[i:i + step] for i in range(0, len(report), step)]
+
+            async def events():
+                for n, piece in enumerate(pieces):
+                    await config.delay(share / len(pieces))
+                    chunk = {"candidates": [_candidate(piece, n == len(pieces) - 1)], "modelVersion": model}
+                    if n == len(pieces) - 1:
+                        chunk["usageMetadata"] = _usage(prompt, report, cached)
+                    yield f"data: {json.dumps(chunk)}\r\n\r\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return JSONResponse({"error": {"code": 404, "message": f"unknown method {method}"}}, status_code=404)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake PayPal or Gemini server")
+    parser.add_argument("service", choices=("paypal", "gemini"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None)
+    parser.add_argument("--latency", type=float, default=None)
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--output-chars", type=int, default=10000)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--no-caching", action="store_true", help="refuse Gemini context caches")
+    parser.add_argument("--min-cache-tokens", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = FakeConfig(
+        latency=args.latency if args.latency is not None else (0.1 if args.service == "paypal" else 5.0),
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        output_chars=args.output_chars,
+        chunks=args.chunks,
+        caching=not args.no_caching,
+        min_cache_tokens=args.min_cache_tokens,
+    )
+    app = paypal_app(config) if args.service == "paypal" else gemini_app(config)
+    port = args.port or (9001 if args.service == "paypal" else 9002)
+    uvicorn.run(app, host=args.host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Import-time report for the API worker.
+
+Runs a snippet under `python -X importtime` in a fresh interpreter, lists
+the slowest imports and fails when the /analyze path has loaded any of the
+modules that are meant to stay lazy (the LLM, HTTP and build-time stacks).
+
+    python -m bench.importtime              # import main and serve one /analyze
+    python -m bench.importtime --top 30
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+# Top-level packages /analyze must not import
+HEAVY_MODULES = ("google", "requests", "httpx", "dotenv", "numpy", "ephem")
+
+ANALYZE_SNIPPET = """
+import main
+main.analyze_birth("1990-01-15", "09:00")
+main.cache_stats()
+main.metrics.render()
+"""
+
+
+def import_report(snippet=ANALYZE_SNIPPET):
+    """[(module, self_us, cumulative_us)] for every import the snippet triggers, in load order."""
+    env = dict(os.environ, SOULSTAT_ENV_FILE="", REPORT_STORE_PATH="")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", snippet],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    report = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        report.append((name.strip(), int(self_us), int(cumulative_us)))
+    return report
+
+
+def heavy_imports(report):
+    return [name for name, _, _ in report if name.split(".")[0] in HEAVY_MODULES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time report for the /analyze path")
+    parser.add_argument("--top", type=int, default=15, help="slowest top-level imports to list")
+    args = parser.parse_args()
+
+    report = import_report()
+    total = sum(self_us for _, self_us, _ in report)
+    print(f"{len(report)} modules, {total / 1000:.1f} ms importing")
+    for name, _, cumulative in sorted(report, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:9.1f} ms  {name}")
+
+    heavy = heavy_imports(report)
+    if heavy:
+        print("Loaded on the /analyze path: " + ", ".join(heavy))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
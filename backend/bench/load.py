@@ -0,0 +1,173 @@
+"""
+Async load driver for the Soul Stat API.
+
+Fires requests at a running server (--url) or at the app in-process
+(--in-process), keeping --concurrency requests in flight for --requests
+total or --duration seconds, and reports p50/p95/p99 latency, throughput
+and an error breakdown (HTTP status or exception class).
+
+    python -m bench.load --url http://127.0.0.1:8000 --endpoint deep --concurrency 200 --duration 60
+    python -m bench.load --in-process --endpoint analyze --requests 20000
+
+Pair with bench/fakes.py to load-test /analyze/deep without PayPal or Gemini costs.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+ENDPOINTS = {
+    "analyze": "/analyze",
+    "deep": "/analyze/deep",
+    "deep-stream": "/analyze/deep/stream",
+}
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 2)
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies = []
+        self.errors = Counter()
+        self.ok = 0
+        self.elapsed = 0.0
+
+    def record(self, latency_ms, error=None):
+        self.latencies.append(latency_ms)
+        if error is None:
+            self.ok += 1
+        else:
+            self.errors[error] += 1
+
+    def summary(self):
+        ordered = sorted(self.latencies)
+        total = len(ordered)
+        return {
+            "requests": total,
+            "ok": self.ok,
+            "errors": dict(self.errors),
+            "error_rate": round(sum(self.errors.values()) / total, 4) if total else 0.0,
+            "elapsed_s": round(self.elapsed, 2),
+            "throughput_rps": round(total / self.elapsed, 1) if self.elapsed else 0.0,
+            "p50_ms": _percentile(ordered, 0.50),
+            "p95_ms": _percentile(ordered, 0.95),
+            "p99_ms": _percentile(ordered, 0.99),
+            "max_ms": round(ordered[-1], 2) if ordered else None,
+        }
+
+
+def _payloads(repeat_charts):
+    """Endless request bodies; distinct charts unless repeat_charts, so caches don't flatter deep runs."""
+    from bench.run import make_corpus
+
+    corpus = make_corpus(size=1 if repeat_charts else 50000)
+    n = 0
+    while True:
+        d = corpus[n % len(corpus)]
+        yield {
+            "birthDate": d.strftime("%Y-%m-%d"),
+            "birthTime": d.strftime("%H:%M"),
+            "paymentId": f"LOAD-{n}",
+        }
+        n += 1
+
+
+async def _one(client, path, payload, stream):
+    """Sends one request; returns an error label or None."""
+    if stream:
+        async with client.stream("POST", path, json=payload) as response:
+            if response.status_code != 200:
+                return f"HTTP {response.status_code}"
+            async for line in response.aiter_lines():
+                if line == "event: error":
+                    return "stream error event"
+        return None
+
+    response = await client.post(path, json=payload)
+    if response.status_code != 200:
+        return f"HTTP {response.status_code}"
+    if path == "/analyze/deep" and response.json().get("deep_report", "").startswith("## Error"):
+        return "report error"
+    return None
+
+
+async def run_load(client, endpoint, concurrency, total=None, duration=None, repeat_charts=False):
+    path = ENDPOINTS[endpoint]
+    stream = endpoint == "deep-stream"
+    payloads = _payloads(repeat_charts)
+    result = LoadResult()
+    deadline = time.perf_counter() + duration if duration else None
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while True:
+            if total is not None and issued >= total:
+                return
+            if deadline is not None and time.perf_counter() >= deadline:
+                return
+            issued += 1
+            payload = next(payloads)
+            t0 = time.perf_counter()
+            try:
+                error = await _one(client, path, payload, stream)
+            except Exception as e:
+                error = type(e).__name__
+            result.record((time.perf_counter() - t0) * 1000, error)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - t0
+    return result
+
+
+async def _main(args):
+    import httpx
+
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.in_process:
+        import main
+        transport = httpx.ASGITransport(app=main.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://load", timeout=timeout)
+    else:
+        client = httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits)
+
+    async with client:
+        result = await run_load(
+            client, args.endpoint, args.concurrency,
+            total=args.requests, duration=args.duration, repeat_charts=args.repeat_charts
+        )
+    return result.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Async load driver for the Soul Stat API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--in-process", action="store_true", help="drive main.app through ASGI, no server")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="analyze")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=None)
+    parser.add_argument("--duration", type=float, default=None, help="seconds; default 10 if --requests is unset")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--repeat-charts", action="store_true", help="send one chart over and over")
+    args = parser.parse_args()
+    if args.requests is None and args.duration is None:
+        args.duration = 10.0
+
+    print(json.dumps(asyncio.run(_main(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
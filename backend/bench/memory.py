@@ -0,0 +1,115 @@
+"""
+Memory report for the pre-fork server (Linux; reads /proc/<pid>/smaps_rollup).
+
+Starts serve.py with a growing number of workers, with and without the
+pre-fork preload, lets the warm-up finish, sends some traffic and prints
+RSS and PSS per process. PSS splits shared pages between the processes
+that map them, so the PSS total is what the whole server really costs.
+
+    python -m bench.memory                      # 1, 2, 4, 8 workers, both modes
+    python -m bench.memory --workers 1 4 --settle 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+
+
+def smaps(pid):
+    """Rss, Pss, shared and private memory of a process, in MB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "shared": fields.get("Shared_Clean", 0.0) + fields.get("Shared_Dirty", 0.0),
+        "private": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+
+def children(pid):
+    pids = []
+    task_dir = f"/proc/{pid}/task"
+    for tid in os.listdir(task_dir):
+        with open(f"{task_dir}/{tid}/children") as f:
+            pids.extend(int(p) for p in f.read().split())
+    return pids
+
+
+def _request(url, payload=None):
+    data = None if payload is None else json.dumps(payload).encode()
+    headers = {"Content-Type": "application/json"} if data else {}
+    with urllib.request.urlopen(urllib.request.Request(url, data=data, headers=headers), timeout=5) as r:
+        return r.read()
+
+
+def measure(workers, preload, port, settle, requests):
+    cmd = [sys.executable, "serve.py", "--workers", str(workers), "--bind", f"127.0.0.1:{port}"]
+    if not preload:
+        cmd.append("--no-preload")
+    env = dict(os.environ, REPORT_STORE_PATH="", WARMUP_DELAY_SECONDS="0")
+    server = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                _request(base + "/")
+                break
+            except OSError:
+                if time.monotonic() > deadline or server.poll() is not None:
+                    raise RuntimeError(f"server with {workers} workers did not start")
+                time.sleep(0.2)
+        for i in range(requests):
+            _request(base + "/analyze", {"birthDate": f"19{50 + i % 50}-0{1 + i % 9}-1{i % 10}", "birthTime": "09:00"})
+        # Let every worker finish its warm-up
+        time.sleep(settle)
+
+        worker_pids = children(server.pid)
+        master = smaps(server.pid)
+        per_worker = [smaps(pid) for pid in worker_pids]
+        return {
+            "mode": "preload" if preload else "no-preload",
+            "workers": len(worker_pids),
+            "master_rss": master["rss"],
+            "worker_rss": sum(w["rss"] for w in per_worker) / len(per_worker),
+            "worker_pss": sum(w["pss"] for w in per_worker) / len(per_worker),
+            "worker_private": sum(w["private"] for w in per_worker) / len(per_worker),
+            "total_pss": master["pss"] + sum(w["pss"] for w in per_worker),
+        }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS/PSS per worker as the pre-fork server scales")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--settle", type=float, default=4.0, help="seconds to wait for worker warm-up")
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    header = f"{'mode':11s} {'workers':>7s} {'master RSS':>10s} {'worker RSS':>10s} {'worker PSS':>10s} " \
+             f"{'private':>8s} {'total PSS':>9s}   (MB)"
+    print(header)
+    for preload in (True, False):
+        for workers in args.workers:
+            r = measure(workers, preload, args.port, args.settle, args.requests)
+            print(f"{r['mode']:11s} {r['workers']:7d} {r['master_rss']:10.1f} {r['worker_rss']:10.1f} "
+                  f"{r['worker_pss']:10.1f} {r['worker_private']:8.1f} {r['total_pss']:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Micro and macro benchmarks, fully offline.
+
+Micro: SajuCalculator.compute, SajuInterpreter.analyze, SajuEngine end to end
+       and the batch kernel, over a fixed corpus of birth datetimes (ns/op).
+Macro: /analyze and /analyze/deep through an in-process ASGI client with
+       stubbed PayPal and Gemini (requests/s and latency percentiles).
+
+Results are written as JSON and compared with a stored baseline; any metric
+worse than the baseline by more than --threshold fails the run.
+
+    python -m bench.run                       # compare with bench/baseline.json
+    python -m bench.run --update-baseline     # record a new baseline
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+CORPUS_SEED = 20240204
+CORPUS_SIZE = 5000
+
+# Metrics checked against the baseline; latencies are reported but too noisy to gate on
+GATED = {"ns_per_op": "lower", "requests_per_s": "higher"}
+
+
+def make_corpus(size=CORPUS_SIZE, seed=CORPUS_SEED):
+    """Deterministic birth datetimes spread over 1930-2010."""
+    rng = random.Random(seed)
+    start = datetime(1930, 1, 1)
+    span = int((datetime(2010, 12, 31) - start).total_seconds() // 60)
+    return [start + timedelta(minutes=rng.randrange(span)) for _ in range(size)]
+
+
+def _time_per_op(fn, items, repeat):
+    """Best-of-`repeat` ns per call of fn over every item."""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter_ns()
+        for item in items:
+            fn(item)
+        best = min(best, (time.perf_counter_ns() - t0) / len(items))
+    return round(best, 1)
+
+
+def run_micro(corpus, repeat):
+    from engine import SajuEngine
+
+    engine = SajuEngine()
+    calculator, interpreter = engine.calculator, engine.interpreter
+    pillars = [calculator.compute(d.year, d.month, d.day, d.hour, d.minute) for d in corpus]
+
+    results = {
+        "calculator.compute": _time_per_op(
+            lambda d: calculator.compute(d.year, d.month, d.day, d.hour, d.minute), corpus, repeat
+        ),
+        "interpreter.analyze": _time_per_op(interpreter.analyze, pillars, repeat),
+        "engine.end_to_end": _time_per_op(
+            lambda d: engine.analyze_stats(engine.compute_saju(d.year, d.month, d.day, d.hour, d.minute)),
+            corpus, repeat
+        ),
+    }
+
+    import numpy as np
+    stamps = np.array(corpus, dtype="datetime64[m]")
+    results["calculator.compute_batch"] = _time_per_op(
+        calculator.compute_batch, [stamps], repeat
+    ) / len(stamps)
+
+    return {name: {"ns_per_op": round(value, 1)} for name, value in results.items()}
+
+
+async def _drive(client, requests, concurrency):
+    """Sends every (path, payload) with at most `concurrency` in flight; returns latencies in ms."""
+    latencies = []
+    errors = 0
+    queue = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        for path, payload in queue:
+            t0 = time.perf_counter()
+            response = await client.post(path, json=payload)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if response.status_code != 200:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - t0
+
+
+def _summary(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    return {
+        "requests_per_s": round(len(ordered) / elapsed, 1),
+        "p50_ms": round(statistics.median(ordered), 3),
+        "p99_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))], 3),
+        "errors": errors,
+    }
+
+
+async def _run_macro(corpus, concurrency):
+    import httpx
+    import main
+    from bench import stubs
+
+    stubs.install(main)
+    payloads = [
+        {"birthDate": d.strftime("%Y-%m-%d"), "birthTime": d.strftime("%H:%M"), "paymentId": "BENCH"}
+        for d in corpus
+    ]
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results = {}
+
+        # Cold: every chart is new to the response cache
+        main.analyze_cache._data.clear()
+        latencies, errors, elapsed = await _drive(client, [("/analyze", p) for p in payloads], concurrency)
+        results["api.analyze.cold"] = _summary(latencies, errors, elapsed)
+
+        # Warm: same corpus again, served from the response cache
+        latencies, errors, elapsed = await _drive(client, [("/analyze", p) for p in payloads], concurrency)
+        results["api.analyze.warm"] = _summary(latencies, errors, elapsed)
+
+        deep = payloads[: max(len(payloads) // 10, 1)]
+        latencies, errors, elapsed = await _drive(client, [("/analyze/deep", p) for p in deep], concurrency)
+        results["api.analyze_deep"] = _summary(latencies, errors, elapsed)
+
+        # The exporters read every cache's stats, the report store's included
+        (await client.get("/metrics")).raise_for_status()
+
+    return results
+
+
+def run_macro(corpus, concurrency):
+    return asyncio.run(_run_macro(corpus, concurrency))
+
+
+def compare(results, baseline, threshold):
+    """Returns human-readable regressions of `results` against `baseline`."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base or metric not in GATED:
+                continue
+            if GATED[metric] == "higher":
+                worse = value < base / (1 + threshold)
+            else:
+                worse = value > base * (1 + threshold)
+            if worse:
+                regressions.append(f"{name}.{metric}: {value} vs baseline {base}")
+        if metrics.get("errors"):
+            regressions.append(f"{name}: {metrics['errors']} failed requests")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Soul Stat benchmarks")
+    parser.add_argument("--output", default=os.path.join(BENCH_DIR, "results.json"))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--corpus", type=int, default=CORPUS_SIZE)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--skip-macro", action="store_true")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.corpus)
+    results = run_micro(corpus, args.repeat)
+    if not args.skip_macro:
+        # The macro run keeps the report store on, as deployed, but in a throwaway
+        # file; set before the app is imported, which opens the store
+        os.environ["REPORT_STORE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="soulstat-bench-"), "reports.sqlite3")
+        results.update(run_macro(corpus, args.concurrency))
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "corpus": args.corpus,
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    for name, metrics in results.items():
+        print(f"{name:28s} " + "  ".join(f"{k}={v}" for k, v in metrics.items()))
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --update-baseline")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
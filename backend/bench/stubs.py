@@ -0,0 +1,158 @@
+"""
+In-process stand-ins for the paid services, so the API can be timed offline.
+"""
+import asyncio
+import re
+import time
+from types import SimpleNamespace
+
+from engine.generator import CHAPTERS
+
+STUB_CHAPTERS = [
+    f"## {i}. {title}\n\n" + "The flow of Qi shapes this chapter. " * 40
+    for i, title in enumerate(CHAPTERS, 1)
+]
+STUB_REPORT = "\n\n".join(STUB_CHAPTERS)
+
+_CHAPTER_PROMPT = re.compile(r"Write only chapter (\d+) ")
+
+
+# Prompt tokens of a stub request, of which the persona is this many
+PROMPT_TOKENS = 900
+PERSONA_TOKENS = 700
+
+
+OUTPUT_TOKENS = 2500
+
+
+class _Usage:
+    def __init__(self, cached=0, output=OUTPUT_TOKENS):
+        self.prompt_token_count = PROMPT_TOKENS
+        self.cached_content_token_count = cached
+        self.candidates_token_count = output
+        self.total_token_count = PROMPT_TOKENS + output
+
+
+def _answer(contents):
+    """
+    The stub report, or for a chapters-mode prompt just that chapter, and the
+    share of the full output it is; latency and output tokens scale with it.
+    """
+    match = _CHAPTER_PROMPT.search(contents) if isinstance(contents, str) else None
+    if match is None:
+        return STUB_REPORT, 1.0
+    return STUB_CHAPTERS[int(match.group(1)) - 1], 1 / len(STUB_CHAPTERS)
+
+
+class _Response:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+def _client_error(code, status, message):
+    """The exception the real client raises for a 4xx answer."""
+    from google.genai import errors
+
+    return errors.ClientError(code, {"error": {"code": code, "message": message, "status": status}})
+
+
+class _Caches:
+    """Context caches; refuses every request when caching is off, like content below the minimum size."""
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.live = {}
+        self.created = 0
+        self.updated = 0
+
+    def create(self, model, config=None):
+        if not self.enabled:
+            raise _client_error(400, "INVALID_ARGUMENT", "Cached content is too small")
+        self.created += 1
+        name = f"cachedContents/stub-{self.created}"
+        self.live[name] = config
+        return SimpleNamespace(name=name, usage_metadata=SimpleNamespace(total_token_count=PERSONA_TOKENS))
+
+    def update(self, name, config=None):
+        if name not in self.live:
+            raise _client_error(404, "NOT_FOUND", f"{name} not found")
+        self.updated += 1
+        return SimpleNamespace(name=name, usage_metadata=SimpleNamespace(total_token_count=PERSONA_TOKENS))
+
+    def delete(self, name, config=None):
+        self.live.pop(name, None)
+
+
+class _AsyncCaches:
+    def __init__(self, caches):
+        self._caches = caches
+
+    async def create(self, model, config=None):
+        return self._caches.create(model, config)
+
+    async def update(self, name, config=None):
+        return self._caches.update(name, config)
+
+    async def delete(self, name, config=None):
+        self._caches.delete(name, config)
+
+
+class _Models:
+    def __init__(self, latency, caches):
+        self.latency = latency
+        self.caches = caches
+
+    def _usage(self, config, share=1.0):
+        name = getattr(config, "cached_content", None)
+        if name is not None and name not in self.caches.live:
+            raise _client_error(404, "NOT_FOUND", f"{name} not found")
+        return _Usage(PERSONA_TOKENS if name else 0, round(OUTPUT_TOKENS * share))
+
+    def generate_content(self, model, contents, config=None):
+        text, share = _answer(contents)
+        usage = self._usage(config, share)
+        time.sleep(self.latency * share)
+        return _Response(text, usage)
+
+
+class _AsyncModels(_Models):
+    async def generate_content(self, model, contents, config=None):
+        text, share = _answer(contents)
+        usage = self._usage(config, share)
+        await asyncio.sleep(self.latency * share)
+        return _Response(text, usage)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        usage = self._usage(config)
+
+        async def chunks():
+            for part in STUB_REPORT.split("\n\n"):
+                await asyncio.sleep(self.latency / 14)
+                yield _Response(part + "\n\n")
+            yield _Response("", usage)
+        return chunks()
+
+
+class StubGeminiClient:
+    """
+    Mimics the parts of google.genai.Client that DeepReportGenerator uses.
+    With caching=False every cache creation fails, to exercise the inline-persona fallback.
+    """
+
+    def __init__(self, latency=0.0, caching=True):
+        self.caches = _Caches(caching)
+        self.models = _Models(latency, self.caches)
+        self.aio = SimpleNamespace(models=_AsyncModels(latency, self.caches), caches=_AsyncCaches(self.caches))
+
+
+def install(main_module, gemini_latency=0.0, caching=True):
+    """Points the app at the stubs: every payment verifies, Gemini answers from memory."""
+    import engine.generator as generator
+
+    async def averify(payment_id):
+        return True
+
+    generator._client = StubGeminiClient(gemini_latency, caching)
+    main_module.paypal.verify = lambda payment_id: True
+    main_module.paypal.averify = averify
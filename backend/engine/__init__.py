@@ -1,10 +1,26 @@
 """
 Soul Stat Saju Engine Package
 Modular architecture: Calculator -> Interpreter -> Generator
+
+The generator (and with it google.genai) is imported on first use, so
+processes that only compute and analyze charts never load the LLM stack.
 """
+import threading
+
 from .calculator import SajuCalculator
+from .chart import Chart
+from .index import get_index
+from .luck import LuckCalculator
 from .interpreter import SajuInterpreter
-from .generator import DeepReportGenerator
+from .report_store import ReportStore
+
+
+def __getattr__(name):
+    if name == "DeepReportGenerator":
+        from .generator import DeepReportGenerator
+        return DeepReportGenerator
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class SajuEngine:
     """
@@ -14,13 +30,57 @@ class SajuEngine:
     def __init__(self):
         self.calculator = SajuCalculator()
         self.interpreter = SajuInterpreter()
-        self.generator = DeepReportGenerator()
+        self.luck = LuckCalculator(self.calculator)
+        self.report_store = ReportStore.from_env()
+        self._generator = None
+        self._generator_lock = threading.Lock()
+
+    @property
+    def generator(self):
+        """The DeepReportGenerator, created (and google.genai imported) on first access."""
+        if self._generator is None:
+            with self._generator_lock:
+                if self._generator is None:
+                    from .generator import DeepReportGenerator
+                    self._generator = DeepReportGenerator(store=self.report_store)
+        return self._generator
+
+    @property
+    def generator_loaded(self):
+        return self._generator is not None
+
+    def compute_saju(self, year, month, day, hour, minute=0, longitude=None, timezone=None):
+        return self.calculator.compute(year, month, day, hour, minute, longitude, timezone)
 
-    def compute_saju(self, year, month, day, hour, minute=0):
-        return self.calculator.compute(year, month, day, hour, minute)
+    def compute_saju_batch(self, datetimes, longitude=None, timezone=None):
+        return self.calculator.compute_batch(datetimes, longitude, timezone)
 
-    def analyze_stats(self, pillars_data):
-        return self.interpreter.analyze(pillars_data)
+    def compute_saju_packed(self, datetimes, longitude=None, timezone=None):
+        return self.calculator.compute_packed(datetimes, longitude, timezone)
+
+    def analyze_stats(self, chart):
+        return self.interpreter.analyze(chart)
+
+    def analyze_stats_packed(self, keys):
+        return self.interpreter.analyze_packed(keys)
+
+    def compute_luck(self, year, month, day, hour, minute, gender, span=100, longitude=None, timezone=None):
+        """(Chart, LuckTimeline) with Daewoon, Seun and Wolun pillars for `span` years."""
+        return self.luck.compute(year, month, day, hour, minute, gender, span, longitude, timezone)
+
+    def luck_start(self, year, month, day, hour, minute, gender, longitude=None, timezone=None):
+        """(Chart, forward, start_months) of the luck timeline, without building it."""
+        return self.luck.start(year, month, day, hour, minute, gender, longitude, timezone)
+
+    def search_charts(self, **query):
+        """Birth hours matching a chart pattern; see ChartIndex.query()."""
+        return get_index(self.calculator, self.interpreter).query(**query)
 
     def generate_deep_report(self, pillars_data):
         return self.generator.generate(pillars_data)
+
+    async def agenerate_deep_report(self, pillars_data):
+        return await self.generator.agenerate(pillars_data)
+
+    def stream_deep_report(self, pillars_data):
+        return self.generator.astream(pillars_data)
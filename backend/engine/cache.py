@@ -0,0 +1,115 @@
+"""
+Chart Cache Module
+Canonical chart keys, bounded, thread-safe LRUs for per-chart results and
+per-chart request counters.
+"""
+import threading
+from collections import OrderedDict
+
+
+def sexagenary(gan_idx, ji_idx):
+    """Position (0-59) of a stem/branch pair in the 60-cycle (육십갑자). Works on ints and arrays."""
+    return (6 * gan_idx - 5 * ji_idx) % 60
+
+
+def chart_key(indices):
+    """
+    Canonical integer key for a chart, from its eight indices in META_KEYS order.
+    Each pillar contributes its sexagenary position, so the key fits in 24 bits.
+    """
+    yg, yj, mg, mj, dg, dj, hg, hj = indices
+    return (
+        ((sexagenary(yg, yj) * 60 + sexagenary(mg, mj)) * 60 + sexagenary(dg, dj)) * 60
+        + sexagenary(hg, hj)
+    )
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value or None, refreshing its recency on a hit."""
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class SizedLRUCache(LRUCache):
+    """LRU bounded by the total weight of its values (`weigh(value)`, e.g. bytes) rather than their count."""
+
+    def __init__(self, max_bytes, weigh=len):
+        super().__init__(maxsize=None)
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._weigh = weigh
+
+    def put(self, key, value):
+        size = self._weigh(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.bytes -= self._weigh(old)
+            # A value over the whole budget would only flush everything else
+            if size > self.max_bytes:
+                return
+            self._data[key] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False)
+                self.bytes -= self._weigh(evicted)
+
+    def stats(self):
+        stats = super().stats()
+        stats.update(bytes=self.bytes, max_bytes=self.max_bytes)
+        return stats
+
+
+class ChartCounter:
+    """
+    Requests per chart since the last drain. Counting is a dict update under a
+    lock; the counts are periodically drained into the report store, which
+    ranks charts for pre-generation across all workers.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, chart):
+        with self._lock:
+            self._counts[chart] = self._counts.get(chart, 0) + 1
+
+    def drain(self):
+        """Returns the counts so far and starts over."""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        return counts
@@ -1,104 +1,156 @@
 """
 Saju Calculator Module
 Converts birth date/time to the Four Pillars (사주 - 年柱, 月柱, 日柱, 時柱).
+
+Birth times are civil wall-clock times, Korean unless a timezone is given;
+the year and month pillars follow the solar terms at the birth instant. With
+a birth longitude the day and hour pillars follow true local solar time
+(see engine.solar_time), otherwise the wall clock.
 """
-from datetime import datetime
-from .constants import HEAVENLY_STEMS, EARTHLY_BRANCHES
+from bisect import bisect_right
+from datetime import date
+from .chart import Chart, pack
+from .constants import META_KEYS
+from .solar_terms import FIRST_YEAR, LAST_YEAR, get_terms, get_terms_array, jeol_to_year_month
+from .solar_time import true_solar_time, true_solar_times, utc_offset, utc_offsets
+
+# Anchor: 1900-01-01 is Gap-Sul (甲戌) day
+_BASE_ORDINAL = date(1900, 1, 1).toordinal()
+_UNIX_DAYS = _BASE_ORDINAL - date(1970, 1, 1).toordinal()
+
+# Exact term instants cover births before the first term after 2100
+_TERMS_END = (date(LAST_YEAR + 1, 1, 1).toordinal() - date(1970, 1, 1).toordinal()) * 86400
+
+# Approximate Jeolgi (節氣) start dates as month * 100 + day, in calendar order.
+# Only used outside the exact solar term table (before 1900-01-06 or after 2100).
+# Ipchun (입춘) ~ Feb 4 determines the Saju Year start.
+_TERM_KEYS = (106, 204, 306, 405, 506, 606, 707, 808, 908, 1008, 1107, 1207)
+_IPCHUN_KEY = 204
+
+# Month branch opened by each term; slot 0 covers Jan 1-5 (Ja month of the previous year)
+_TERM_BRANCHES = (0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 0)
+
+
+def _pillar_indices(days, saju_year, month_ji, hour):
+    """
+    Shared integer kernel for scalar and batch computation.
+    Works unchanged on Python ints and NumPy integer arrays.
+    Returns the eight indices in META_KEYS order.
+    """
+    # --- Day Pillar --- (Gap is 0, Sul is 10)
+    day_gan = days % 10
+    day_ji = (days + 10) % 12
+
+    # --- Year Pillar ---
+    year_gan = (saju_year - 4) % 10
+    year_ji = (saju_year - 4) % 12
+
+    # --- Month Pillar --- Month Stem (월두법 / Wol-Du-Beop), sequence starts at In (寅)
+    month_gan = ((year_gan % 5) * 2 + 2 + (month_ji - 2) % 12) % 10
+
+    # --- Hour Pillar --- Hour Stem (시두법 / Shi-Du-Beop)
+    hour_ji = ((hour + 1) // 2) % 12
+    hour_gan = ((day_gan % 5) * 2 + hour_ji) % 10
+
+    return (year_gan, year_ji, month_gan, month_ji, day_gan, day_ji, hour_gan, hour_ji)
 
 
 class SajuCalculator:
     """Computes the Four Pillars of Destiny from birth data."""
 
-    def compute(self, year, month, day, hour, minute=0):
+    def compute(self, year, month, day, hour, minute=0, longitude=None, timezone=None):
         """
         Compute the Four Pillars based on Solar Terms.
-        Returns dict with year/month/day/hour pillars and meta indices.
+        `longitude` (degrees east) switches the day and hour pillars to true solar
+        time; `timezone` is an IANA name or "+HH:MM" (default: Korean civil time).
+        Returns a packed Chart; Chart.to_dict() gives the display pillars and meta indices.
+        """
+        return Chart.from_indices(self.indices(year, month, day, hour, minute, longitude, timezone))
+
+    @staticmethod
+    def _instant(year, month, day, hour, minute, timezone=None):
+        """Days since the 1900-01-01 anchor and the birth instant in Unix seconds."""
+        days = date(year, month, day).toordinal() - _BASE_ORDINAL
+        wall = ((days + _UNIX_DAYS) * 1440 + hour * 60 + minute) * 60
+        return days, wall - utc_offset(wall, timezone)
+
+    def indices(self, year, month, day, hour, minute=0, longitude=None, timezone=None):
+        """Compute the eight stem/branch indices (META_KEYS order) as a tuple of ints."""
+        days, instant = self._instant(year, month, day, hour, minute, timezone)
+
+        # Saju year and month: one bisect over the exact solar term instants
+        terms = get_terms()
+        term_idx = bisect_right(terms, instant) - 1
+        if term_idx >= 0 and instant < _TERMS_END:
+            saju_year, month_ji = jeol_to_year_month(term_idx // 2)
+        else:
+            key = month * 100 + day
+            saju_year = year if key >= _IPCHUN_KEY else year - 1
+            month_ji = _TERM_BRANCHES[bisect_right(_TERM_KEYS, key)]
+
+        if longitude is not None:
+            solar = true_solar_time(instant, longitude)
+            days = solar // 86400 - _UNIX_DAYS
+            hour = solar % 86400 // 3600
+
+        return _pillar_indices(days, saju_year, month_ji, hour)
+
+    def jeol_distance(self, year, month, day, hour, minute=0, timezone=None):
         """
-        birth_date = datetime(year, month, day, hour, minute)
-
-        # --- Day Pillar ---
-        # Anchor: 1900-01-01 is Gap-Sul (甲戌) day
-        base_date = datetime(1900, 1, 1)
-        days_diff = (datetime(year, month, day) - base_date).days
-
-        day_gan_idx = (0 + days_diff) % 10   # Gap is 0
-        day_ji_idx = (10 + days_diff) % 12   # Sul is 10
-
-        day_pillar = {
-            "stem": HEAVENLY_STEMS[day_gan_idx],
-            "branch": EARTHLY_BRANCHES[day_ji_idx]
-        }
-
-        # --- Year Pillar ---
-        # Ipchun (입춘) ~ Feb 4 determines the Saju Year start
-        current_year_ipchun = datetime(year, 2, 4, 0, 0)
-        saju_year = year if birth_date >= current_year_ipchun else year - 1
-
-        year_gan_idx = (saju_year - 4) % 10
-        year_ji_idx = (saju_year - 4) % 12
-        year_pillar = {
-            "stem": HEAVENLY_STEMS[year_gan_idx],
-            "branch": EARTHLY_BRANCHES[year_ji_idx]
-        }
-
-        # --- Month Pillar ---
-        check_year = saju_year
-        terms = [
-            (datetime(check_year, 2, 4), 2),
-            (datetime(check_year, 3, 6), 3),
-            (datetime(check_year, 4, 5), 4),
-            (datetime(check_year, 5, 6), 5),
-            (datetime(check_year, 6, 6), 6),
-            (datetime(check_year, 7, 7), 7),
-            (datetime(check_year, 8, 8), 8),
-            (datetime(check_year, 9, 8), 9),
-            (datetime(check_year, 10, 8), 10),
-            (datetime(check_year, 11, 7), 11),
-            (datetime(check_year, 12, 7), 0),
-            (datetime(check_year + 1, 1, 6), 1)
+        Seconds from the month's opening Jeol (節) to the birth, and from the birth
+        to the next one. Needs the exact term table, so births in 1900-2100 only.
+        """
+        _, instant = self._instant(year, month, day, hour, minute, timezone)
+        terms = get_terms()
+        term_idx = bisect_right(terms, instant) - 1
+        jeol_idx = term_idx - term_idx % 2
+        if jeol_idx < 0 or jeol_idx + 2 >= len(terms) or instant >= _TERMS_END:
+            raise ValueError(f"Solar terms are only tabulated for {FIRST_YEAR}-{LAST_YEAR}")
+        return instant - terms[jeol_idx], terms[jeol_idx + 2] - instant
+
+    def compute_batch(self, datetimes, longitude=None, timezone=None):
+        """
+        Vectorized Four Pillars for many births at once.
+        `datetimes` is any array-like of datetime / numpy.datetime64 values;
+        `longitude` is one value or one per birth, `timezone` as in compute().
+        Returns a dict of int64 index arrays keyed like the scalar `meta`.
+        """
+        import numpy as np
+
+        minutes = np.asarray(datetimes, dtype="datetime64[m]")
+        days64 = minutes.astype("datetime64[D]")
+        months64 = minutes.astype("datetime64[M]")
+
+        year = months64.astype("datetime64[Y]").astype(np.int64) + 1970
+        month = months64.astype(np.int64) % 12 + 1
+        day = (days64 - months64).astype(np.int64) + 1
+        hour = (minutes - days64).astype(np.int64) // 60
+
+        days = days64.astype(np.int64) - _UNIX_DAYS
+        wall = minutes.astype(np.int64) * 60
+        instant = wall - utc_offsets(wall, timezone)
+
+        term_idx = np.searchsorted(get_terms_array(), instant, side="right") - 1
+        exact_year, exact_month_ji = jeol_to_year_month(term_idx // 2)
+
+        key = month * 100 + day
+        approx_year = year - (key < _IPCHUN_KEY)
+        approx_month_ji = np.asarray(_TERM_BRANCHES, dtype=np.int64)[
+            np.searchsorted(_TERM_KEYS, key, side="right")
         ]
 
-        target_ji = 1  # Default
-        for t_date, t_idx in terms:
-            if birth_date >= t_date:
-                target_ji = t_idx
-            else:
-                break
-
-        month_ji_idx = target_ji
-
-        # Month Stem (월두법 / Wol-Du-Beop)
-        month_start_gan_idx = (year_gan_idx % 5) * 2 + 2
-        pass_chart = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 0, 1]
-        seq_idx = pass_chart.index(month_ji_idx)
-        month_gan_idx = (month_start_gan_idx + seq_idx) % 10
-
-        month_pillar = {
-            "stem": HEAVENLY_STEMS[month_gan_idx],
-            "branch": EARTHLY_BRANCHES[month_ji_idx]
-        }
-
-        # --- Hour Pillar ---
-        hour_ji_idx = ((hour + 1) // 2) % 12
-
-        # Hour Stem (시두법 / Shi-Du-Beop)
-        hour_start_gan_idx = (day_gan_idx % 5) * 2
-        hour_gan_idx = (hour_start_gan_idx + hour_ji_idx) % 10
-
-        hour_pillar = {
-            "stem": HEAVENLY_STEMS[hour_gan_idx],
-            "branch": EARTHLY_BRANCHES[hour_ji_idx]
-        }
-
-        return {
-            "year": year_pillar,
-            "month": month_pillar,
-            "day": day_pillar,
-            "hour": hour_pillar,
-            "meta": {
-                "year_gan": year_gan_idx, "year_ji": year_ji_idx,
-                "month_gan": month_gan_idx, "month_ji": month_ji_idx,
-                "day_gan": day_gan_idx, "day_ji": day_ji_idx,
-                "hour_gan": hour_gan_idx, "hour_ji": hour_ji_idx
-            }
-        }
+        in_table = (term_idx >= 0) & (instant < _TERMS_END)
+        saju_year = np.where(in_table, exact_year, approx_year)
+        month_ji = np.where(in_table, exact_month_ji, approx_month_ji)
+
+        if longitude is not None:
+            solar = true_solar_times(instant, longitude)
+            days = solar // 86400 - _UNIX_DAYS
+            hour = solar % 86400 // 3600
+
+        return dict(zip(META_KEYS, _pillar_indices(days, saju_year, month_ji, hour)))
+
+    def compute_packed(self, datetimes, longitude=None, timezone=None):
+        """compute_batch() packed into one int32 chart key per birth (see engine.chart)."""
+        batch = self.compute_batch(datetimes, longitude, timezone)
+        return pack([batch[k] for k in META_KEYS])
@@ -0,0 +1,93 @@
+"""
+Chart Module
+Compact, immutable representation of a Four Pillars chart.
+
+A chart is four positions in the sexagenary cycle (육십갑자), one per pillar,
+packed in base 60 with the year pillar most significant -- the same integer
+as cache.chart_key(). Every position maps back to its stem and branch
+(gan = pos % 10, ji = pos % 12), so nothing else needs storing: a Chart is
+an int, and a batch of charts is an int32 array (4 bytes per chart).
+Display strings are only produced by to_dict(), at the API boundary.
+"""
+from .cache import chart_key
+from .constants import HEAVENLY_STEMS, EARTHLY_BRANCHES, META_KEYS
+
+PILLARS = ("year", "month", "day", "hour")
+
+# Number of distinct charts; every packed key is below this
+CHART_SPACE = 60 ** 4
+
+
+def unpack(keys):
+    """
+    The four sexagenary positions (year, month, day, hour) of packed chart keys.
+    Works on ints and NumPy integer arrays.
+    """
+    return keys // 216000, keys // 3600 % 60, keys // 60 % 60, keys % 60
+
+
+def unpack_indices(keys):
+    """The eight stem/branch indices (META_KEYS order) of packed chart keys; ints or arrays."""
+    indices = []
+    for pos in unpack(keys):
+        indices.append(pos % 10)
+        indices.append(pos % 12)
+    return tuple(indices)
+
+
+class Chart(int):
+    """
+    A Four Pillars chart as its packed key. Hashable, comparable and as small
+    as an int; usable directly wherever a chart key is expected.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_indices(cls, indices):
+        """From the eight stem/branch indices in META_KEYS order."""
+        return cls(chart_key(indices))
+
+    @classmethod
+    def from_meta(cls, meta):
+        """From a legacy `meta` dict of the eight indices."""
+        return cls(chart_key([meta[k] for k in META_KEYS]))
+
+    @property
+    def pillars(self):
+        """Sexagenary positions (0-59) of the year, month, day and hour pillars."""
+        return unpack(int(self))
+
+    @property
+    def indices(self):
+        """The eight stem/branch indices in META_KEYS order."""
+        return unpack_indices(int(self))
+
+    @property
+    def meta(self):
+        return dict(zip(META_KEYS, self.indices))
+
+    def to_dict(self, meta=True):
+        """
+        The display shape served by the API: {"year": {"stem", "branch"}, ...}
+        plus "meta" with the eight indices unless meta is False.
+        """
+        result = {}
+        for name, pos in zip(PILLARS, self.pillars):
+            result[name] = {"stem": HEAVENLY_STEMS[pos % 10], "branch": EARTHLY_BRANCHES[pos % 12]}
+        if meta:
+            result["meta"] = self.meta
+        return result
+
+    def __repr__(self):
+        # Hanja for each pillar, e.g. Chart(己巳 丁丑 庚辰 辛巳)
+        return "Chart({})".format(" ".join(
+            HEAVENLY_STEMS[pos % 10][-2] + EARTHLY_BRANCHES[pos % 12][-2] for pos in self.pillars
+        ))
+
+
+def pack(indices):
+    """Packed keys from eight stem/branch index arrays (META_KEYS order), as int32."""
+    import numpy as np
+
+    return np.asarray(chart_key(indices), dtype=np.int32)
+
@@ -0,0 +1,199 @@
+"""
+Compatibility Module
+One-to-many chart compatibility (궁합, Gunghap) with top-k selection.
+
+Candidates are held as an int8 feature matrix (element counts plus the
+day stem, day branch and year branch), so scoring a pool is a handful of
+array operations: three table lookups prepared for the user's chart and
+one element-balance term. Scores run from 0 to 100:
+
+- Element balance (40): how evenly the two charts' sixteen characters
+  spread over the five elements.
+- Day masters (25): a stem combination (天干合) scores highest, then one
+  element generating the other (相生), then the same element.
+- Day branches (20): six harmonies (六合) and trines (三合) help, a clash
+  (六冲) scores nothing.
+- Year branches (15): the same relations between the birth-year animals.
+"""
+import os
+import threading
+
+from .chart import unpack
+from .constants import STEM_ELEMENTS
+from .interpreter import ELEMENTS, SajuInterpreter
+
+# Feature matrix columns
+WOOD, FIRE, EARTH, METAL, WATER, DAY_STEM, DAY_BRANCH, YEAR_BRANCH = range(8)
+N_FEATURES = 8
+
+BALANCE_POINTS = 40
+# Sum of squared element counts over both charts' 16 characters: 52 is 4/3/3/3/3, 256 is all one element
+_MOST_EVEN, _LEAST_EVEN = 52, 256
+
+STEM_POINTS = {"combination": 25, "generating": 15, "same": 8, "other": 0}
+DAY_BRANCH_POINTS = {"harmony": 20, "trine": 12, "clash": 0, "other": 6}
+YEAR_BRANCH_POINTS = {"trine": 15, "harmony": 10, "clash": 0, "other": 5}
+
+_STEM_ELEMENT_IDX = tuple(ELEMENTS.index(e) for e in STEM_ELEMENTS)
+
+
+def stem_relation(a, b):
+    if (a - b) % 10 == 5:
+        return "combination"
+    ea, eb = _STEM_ELEMENT_IDX[a], _STEM_ELEMENT_IDX[b]
+    if ea == eb:
+        return "same"
+    # Wood -> Fire -> Earth -> Metal -> Water -> Wood
+    if (eb - ea) % 5 == 1 or (ea - eb) % 5 == 1:
+        return "generating"
+    return "other"
+
+
+def branch_relation(a, b):
+    if (a + b) % 12 == 1:
+        return "harmony"
+    if (a - b) % 12 == 6:
+        return "clash"
+    if a != b and a % 4 == b % 4:
+        return "trine"
+    return "other"
+
+
+def features(keys):
+    """(n, N_FEATURES) int8 feature matrix, column-major, for packed chart keys."""
+    import numpy as np
+
+    keys = np.asarray(keys, dtype=np.int64)
+    counts = SajuInterpreter.analyze_packed(keys)["stats"]
+    year, _, day, _ = unpack(keys)
+
+    matrix = np.empty((len(keys), N_FEATURES), dtype=np.int8, order="F")
+    matrix[:, WOOD:WATER + 1] = counts
+    matrix[:, DAY_STEM] = day % 10
+    matrix[:, DAY_BRANCH] = day % 12
+    matrix[:, YEAR_BRANCH] = year % 12
+    return matrix
+
+
+class CandidatePool:
+    """Candidate charts (packed keys) with caller-defined ids and their feature matrix."""
+
+    def __init__(self, keys, ids=None, feature_matrix=None):
+        import numpy as np
+
+        self.keys = np.asarray(keys, dtype=np.int32)
+        self.ids = np.arange(len(self.keys)) if ids is None else np.asarray(ids)
+        if len(self.ids) != len(self.keys):
+            raise ValueError("ids and keys differ in length")
+        self.features = features(self.keys) if feature_matrix is None else feature_matrix
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def load(cls, path):
+        """
+        From a directory written by save(). The arrays are memory-mapped read-only,
+        so every worker process on a host shares one copy through the page cache.
+        """
+        import numpy as np
+
+        def array(name):
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+
+        return cls(array("keys"), array("ids"), array("features"))
+
+    def save(self, path):
+        """Writes keys, ids and the feature matrix as .npy files under the directory `path`."""
+        import numpy as np
+
+        os.makedirs(path, exist_ok=True)
+        for name, values in (("keys", self.keys), ("ids", self.ids), ("features", self.features)):
+            np.save(os.path.join(path, f"{name}.npy"), values, allow_pickle=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    The server-side candidate pool from the COMPATIBILITY_POOL_PATH directory
+    (see CandidatePool.save), mapped on first use; None when not configured.
+    """
+    global _pool
+    path = os.environ.get("COMPATIBILITY_POOL_PATH")
+    if _pool is None and path:
+        with _pool_lock:
+            if _pool is None:
+                _pool = CandidatePool.load(path)
+    return _pool
+
+
+def _tables(chart):
+    """Points a candidate earns for each possible day stem, day branch and year branch."""
+    import numpy as np
+
+    year, _, day, _ = chart.pillars
+    stem = np.array([STEM_POINTS[stem_relation(day % 10, s)] for s in range(10)], dtype=np.float32)
+    day_branch = np.array([DAY_BRANCH_POINTS[branch_relation(day % 12, b)] for b in range(12)], dtype=np.float32)
+    year_branch = np.array([YEAR_BRANCH_POINTS[branch_relation(year % 12, b)] for b in range(12)], dtype=np.float32)
+    return stem, day_branch, year_branch
+
+
+def score(chart, pool):
+    """float32 compatibility score (0-100) of `chart` with every candidate in the pool."""
+    import numpy as np
+
+    stem, day_branch, year_branch = _tables(chart)
+    user = np.asarray(features([int(chart)])[0, WOOD:WATER + 1], dtype=np.int16)
+
+    m = pool.features
+    scores = stem[m[:, DAY_STEM]]
+    scores += day_branch[m[:, DAY_BRANCH]]
+    scores += year_branch[m[:, YEAR_BRANCH]]
+
+    squares = np.zeros(len(pool), dtype=np.int16)
+    for col in range(WOOD, WATER + 1):
+        combined = m[:, col].astype(np.int16) + user[col]
+        squares += combined * combined
+    scores += (_LEAST_EVEN - squares) * np.float32(BALANCE_POINTS / (_LEAST_EVEN - _MOST_EVEN))
+    return scores
+
+
+def top_k(chart, pool, k=10):
+    """
+    Best k candidates as (pool row indices, scores), highest first.
+    Ties go to the earlier candidate.
+    """
+    import numpy as np
+
+    scores = score(chart, pool)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+    # argpartition finds the k-th best score; of the candidates tied with it, the earliest make the cut
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > kth)
+    best = np.concatenate([above, np.flatnonzero(scores == kth)[:k - len(above)]])
+    order = np.lexsort((best, -scores[best]))
+    best = best[order]
+    return best, scores[best]
+
+
+def breakdown(chart, candidate):
+    """Per-component points and relations between two charts, for display."""
+    (uy, _, ud, _), (cy, _, cd, _) = chart.pillars, candidate.pillars
+    user_counts = features([int(chart)])[0]
+    cand_counts = features([int(candidate)])[0]
+    squares = sum(int(user_counts[c] + cand_counts[c]) ** 2 for c in range(WOOD, WATER + 1))
+
+    stem = stem_relation(ud % 10, cd % 10)
+    day_branch = branch_relation(ud % 12, cd % 12)
+    year_branch = branch_relation(uy % 12, cy % 12)
+    return {
+        "balance": round((_LEAST_EVEN - squares) * BALANCE_POINTS / (_LEAST_EVEN - _MOST_EVEN), 2),
+        "day_master": {"relation": stem, "points": STEM_POINTS[stem]},
+        "day_branch": {"relation": day_branch, "points": DAY_BRANCH_POINTS[day_branch]},
+        "year_branch": {"relation": year_branch, "points": YEAR_BRANCH_POINTS[year_branch]},
+    }
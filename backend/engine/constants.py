@@ -28,3 +28,9 @@ def get_element(idx, is_stem=True):
     if is_stem:
         return STEM_ELEMENTS[idx]
     return BRANCH_ELEMENTS[idx]
+
+# Pillar index keys, in the order used by chart meta data and batch results
+META_KEYS = (
+    "year_gan", "year_ji", "month_gan", "month_ji",
+    "day_gan", "day_ji", "hour_gan", "hour_ji"
+)
@@ -3,11 +3,20 @@ Deep Report Generator Module
 Uses Gemini API to produce a comprehensive "Book of Destiny" report.
 Enhanced with classical Saju text references (Sona's recommendation).
 """
+import asyncio
+import logging
 import os
-import sys
+import sqlite3
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from datetime import datetime
+from types import SimpleNamespace
 import google.genai as genai
-from google.genai import types
+from google.genai import errors, types
+from .metrics import STAGE_SECONDS, Counter, Histogram, count_error, record_usage
+from .persona_cache import PersonaCache
+from .report_store import report_key
+from .singleflight import AsyncSingleFlight, SingleFlight
 
 # Configure GenAI
 _client = None
@@ -16,7 +25,10 @@ def _get_client():
     if _client is None:
         api_key = os.environ.get("GOOGLE_API_KEY")
         if api_key:
-            _client = genai.Client(api_key=api_key)
+            # GEMINI_BASE_URL points the client at a local stand-in (bench/fakes.py)
+            base_url = os.environ.get("GEMINI_BASE_URL")
+            http_options = types.HttpOptions(base_url=base_url) if base_url else None
+            _client = genai.Client(api_key=api_key, http_options=http_options)
     return _client
 
 # Enhanced Myungseon Persona with Classical References (소나의 제안 반영)
@@ -51,60 +63,538 @@ Total length should be substantial (aim for depth and detail, approx 10,000 char
 """
 
 
+MODEL_NAME = "gemini-2.0-flash"
+
+# Chapter titles of the Book of Destiny, in the order the persona prescribes
+CHAPTERS = (
+    "The Essence of the Soul",
+    "Hidden Strengths & Shadows",
+    "The Path of Wealth & Career",
+    "Heart & Harmony",
+    "Vessel of the Spirit",
+    "The Current Tides",
+    "Sage's Final Wisdom",
+)
+
+# Max deep reports waiting on Gemini at once through the async path
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("DEEP_REPORT_CONCURRENCY", "256"))
+
+# "single": one call writes the whole report. "chapters": the seven chapters are
+# written by concurrent calls, so latency follows the slowest chapter instead of the sum
+REPORT_MODES = ("single", "chapters")
+DEFAULT_MODE = os.environ.get("DEEP_REPORT_MODE", "single")
+
+# Length asked of each chapter in chapters mode (the persona asks ~10,000 characters in all)
+CHAPTER_CHARS = 1500
+
+# Threads for sync chapters mode, shared by every report; threads start on first use
+_chapter_pool = ThreadPoolExecutor(max_workers=len(CHAPTERS), thread_name_prefix="chapter")
+
+logger = logging.getLogger(__name__)
+
+_GENERATE_SECONDS = STAGE_SECONDS.labels("gemini_generate")
+_STREAM_SECONDS = STAGE_SECONDS.labels("gemini_stream")
+
+CHAPTER_SECONDS = Histogram(
+    "soulstat_chapter_seconds", "Latency of each chapter call in chapters mode", ("chapter",)
+)
+CHAPTER_TOKENS = Counter(
+    "soulstat_chapter_tokens_total", "Gemini tokens per chapter in chapters mode", ("chapter", "kind")
+)
+
+MISSING_KEY_REPORT = (
+    "## Error\n\n"
+    "Google API Key is missing. Please configure the "
+    "GOOGLE_API_KEY environment variable to unlock the Deep Destiny Report."
+)
+
+
+class ReportNotStored(Exception):
+    """A pre-generated report that was empty or could not be saved; `usage` is what the call cost."""
+
+    def __init__(self, message, usage=None):
+        super().__init__(message)
+        self.usage = usage
+
+
 class DeepReportGenerator:
     """Generates AI-powered deep destiny reports using Gemini."""
 
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, store=None, mode=DEFAULT_MODE):
+        if mode not in REPORT_MODES:
+            raise ValueError(f"Unknown report mode: {mode!r} (use one of {', '.join(REPORT_MODES)})")
+        self.max_concurrency = max_concurrency
+        self.store = store
+        self.mode = mode
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Identical concurrent requests share one generation
+        self.flights = SingleFlight()
+        self.aflights = AsyncSingleFlight()
+        # The persona is sent once as cached content, not with every report
+        self.persona = PersonaCache(MYUNGSEON_PERSONA.strip(), MODEL_NAME)
+
+    def warm(self):
+        """Builds the Gemini client and registers the persona cache ahead of the first report."""
+        client = _get_client()
+        if client is not None:
+            self.persona.config(client)
+
     def generate(self, pillars_data):
         """
         Generates a deep, 10,000+ character report using Gemini API.
         pillars_data should contain pillar info + dominant_element + class.
+        A report already in the store for the same prompt inputs is returned as-is.
         """
-        current_year = datetime.now().year
-        current_date_str = datetime.now().strftime("%Y-%m-%d")
+        inputs = self.prompt_inputs(pillars_data)
+        key = report_key(inputs)
+        cached = self._load(key)
+        if cached is not None:
+            return cached
+        return self.flights.do(key, self._generate_uncached, inputs, key)
 
+    def _generate_uncached(self, inputs, key):
         client = _get_client()
         if client is None:
-            return (
-                "## Error\n\n"
-                "Google API Key is missing. Please configure the "
-                "GOOGLE_API_KEY environment variable to unlock the Deep Destiny Report."
-            )
+            count_error("gemini", "api key missing")
+            return MISSING_KEY_REPORT
+
+        try:
+            t0 = time.perf_counter()
+            report = None
+            if self.mode == "chapters":
+                try:
+                    report, _ = self._generate_chapters(client, inputs)
+                except Exception as e:
+                    self._chapters_failed(e)
+            if report is None:
+                response = self._generate_content(client, self._build_prompt(inputs))
+                self._record_usage(response)
+                report = response.text
+            _GENERATE_SECONDS.observe(time.perf_counter() - t0)
+            self._save(key, report)
+            return report
+        except Exception as e:
+            count_error("gemini", e)
+            return f"## Error\n\nThe spirits are silent (API Error): {str(e)}"
+
+    async def agenerate(self, pillars_data):
+        """
+        Async variant of generate() using the native async Gemini client.
+        Waits on the network without holding a thread; at most
+        `max_concurrency` generations are in flight at once.
+        """
+        inputs = self.prompt_inputs(pillars_data)
+        key = report_key(inputs)
+        cached = await asyncio.to_thread(self._load, key)
+        if cached is not None:
+            return cached
+        return await self.aflights.do(key, self._agenerate_uncached, inputs, key)
+
+    async def _agenerate_uncached(self, inputs, key):
+        client = _get_client()
+        if client is None:
+            count_error("gemini", "api key missing")
+            return MISSING_KEY_REPORT
+
+        try:
+            report, _, _ = await self._agenerate_stored(client, inputs, key)
+            return report
+        except Exception as e:
+            count_error("gemini", e)
+            return f"## Error\n\nThe spirits are silent (API Error): {str(e)}"
 
-        prompt = f"""
-        {MYUNGSEON_PERSONA}
-        
-        Analyze the following Saju (Four Pillars) Chart:
-        
-        **Birth Data**:
-        - Year Pillar: {pillars_data['year']['stem']} {pillars_data['year']['branch']}
-        - Month Pillar: {pillars_data['month']['stem']} {pillars_data['month']['branch']}
-        - Day Pillar: {pillars_data['day']['stem']} {pillars_data['day']['branch']} (Day Master)
-        - Hour Pillar: {pillars_data['hour']['stem']} {pillars_data['hour']['branch']}
-        
-        **Context**:
-        - Current Date: {current_date_str} (The forecast for "Current Year" must focus on {current_year})
-        
-        **Meta Analysis**:
-        - Dominant Element: {pillars_data.get('dominant_element', 'Unknown')}
-        - Soul Class: {pillars_data.get('class', 'Unknown')}
-        
-        Write the "Book of Destiny" for this soul now.
+    async def _agenerate_stored(self, client, inputs, key):
         """
+        One generation, saved to the store; returns (report, usage_metadata,
+        whether it was stored) and raises on API errors.
+        """
+        async with self._semaphore:
+            t0 = time.perf_counter()
+            report = usage = None
+            if self.mode == "chapters":
+                try:
+                    report, usage = await self._agenerate_chapters(client, inputs)
+                except Exception as e:
+                    self._chapters_failed(e)
+            if report is None:
+                response = await self._agenerate_content(client, self._build_prompt(inputs))
+                self._record_usage(response)
+                report, usage = response.text, getattr(response, 'usage_metadata', None)
+            _GENERATE_SECONDS.observe(time.perf_counter() - t0)
+        stored = await asyncio.to_thread(self._save, key, report)
+        return report, usage, stored
 
+    def _generate_chapters(self, client, inputs):
+        """(report, summed usage) from one thread per chapter; raises as soon as any chapter fails."""
+        futures = [
+            _chapter_pool.submit(self._generate_chapter, client, inputs, idx) for idx in range(len(CHAPTERS))
+        ]
         try:
-            response = client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=prompt,
-            )
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in done:
+                if future.exception() is not None:
+                    raise future.exception()
+            return self._assemble([future.result() for future in futures])
+        finally:
+            # Chapters still queued behind a failure are not started
+            for future in futures:
+                future.cancel()
 
-            if hasattr(response, 'usage_metadata') and response.usage_metadata:
-                usage = response.usage_metadata
-                sys.stderr.write(
-                    f"[Token Usage] Input: {usage.prompt_token_count}, "
-                    f"Output: {usage.candidates_token_count}, "
-                    f"Total: {usage.total_token_count}\n"
-                )
+    def _generate_chapter(self, client, inputs, idx):
+        t0 = time.perf_counter()
+        response = self._generate_content(client, self._build_chapter_prompt(inputs, idx))
+        return self._chapter_done(idx, response, time.perf_counter() - t0)
+
+    async def _agenerate_chapters(self, client, inputs):
+        """(report, summed usage) from concurrent chapter calls; raises as soon as any chapter fails."""
+        tasks = [
+            asyncio.create_task(self._agenerate_chapter(client, inputs, idx)) for idx in range(len(CHAPTERS))
+        ]
+        try:
+            responses = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return self._assemble(responses)
+
+    async def _agenerate_chapter(self, client, inputs, idx):
+        t0 = time.perf_counter()
+        response = await self._agenerate_content(client, self._build_chapter_prompt(inputs, idx))
+        return self._chapter_done(idx, response, time.perf_counter() - t0)
+
+    def _chapter_done(self, idx, response, seconds):
+        """Records one chapter call's latency and tokens; an empty chapter counts as a failure."""
+        label = str(idx + 1)
+        CHAPTER_SECONDS.labels(label).observe(seconds)
+        self._record_usage(response)
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            CHAPTER_TOKENS.labels(label, "prompt").inc(usage.prompt_token_count or 0)
+            CHAPTER_TOKENS.labels(label, "output").inc(usage.candidates_token_count or 0)
+        if not (response.text or "").strip():
+            raise ValueError(f"chapter {label} came back empty")
+        logger.debug("Chapter %s: %.2fs, %s output tokens", label, seconds,
+                     usage.candidates_token_count if usage is not None else "?")
+        return response
+
+    @staticmethod
+    def _assemble(responses):
+        """The chapters in order, each under its heading, and their usage summed."""
+        parts = []
+        for idx, response in enumerate(responses):
+            text = response.text.strip()
+            if not text.startswith("#"):
+                text = f"## {idx + 1}. {CHAPTERS[idx]}\n\n{text}"
+            parts.append(text)
+
+        usages = [r.usage_metadata for r in responses if getattr(r, 'usage_metadata', None) is not None]
+        usage = None
+        if usages:
+            usage = SimpleNamespace(**{
+                field: sum(getattr(u, field, None) or 0 for u in usages)
+                for field in ("prompt_token_count", "cached_content_token_count",
+                              "candidates_token_count", "total_token_count")
+            })
+        return "\n\n".join(parts) + "\n", usage
+
+    @staticmethod
+    def _chapters_failed(error):
+        count_error("gemini_chapter", error)
+        logger.warning("Chapter generation failed, falling back to a single call: %s", error)
+
+    async def apregenerate(self, pillars_data):
+        """
+        Generates and stores the report for a chart ahead of any request (see
+        engine.pregen). Returns the response's usage_metadata, or None when the
+        store already had the report. Raises on failure, ReportNotStored when
+        the model returned no text or the store write failed, so the job can retry.
+        """
+        client = _get_client()
+        if client is None:
+            raise RuntimeError("GOOGLE_API_KEY is not set")
+        inputs = self.prompt_inputs(pillars_data)
+        key = report_key(inputs)
+        if await asyncio.to_thread(self._load, key) is not None:
+            return None
+        report, usage, stored = await self._agenerate_stored(client, inputs, key)
+        if not stored:
+            raise ReportNotStored("empty report" if not report else "report store write failed", usage)
+        return usage
 
-            return response.text
+    async def astream(self, pillars_data):
+        """
+        Streams the report as (event, data) pairs using the model's streaming API:
+        "chapter" when one of the seven chapter headings starts, "chunk" for text,
+        then a trailing "usage" (token counts) or "error".
+        A stored report, or one another request is already generating, is
+        replayed through the same events with zero token usage. Streaming always
+        uses a single call; chapters mode applies to generate() and agenerate().
+        """
+        inputs = self.prompt_inputs(pillars_data)
+        key = report_key(inputs)
+
+        cached = await asyncio.to_thread(self._load, key)
+        if cached is not None:
+            for event in self._replay(cached, cached=True):
+                yield event
+            return
+
+        future, leader = self.aflights.claim(key)
+        if not leader:
+            try:
+                report = await asyncio.shield(future)
+            except Exception as e:
+                yield "error", {"message": f"The spirits are silent (API Error): {str(e)}"}
+                return
+            for event in self._replay(report, coalesced=True):
+                yield event
+            return
+
+        try:
+            async for event in self._astream_uncached(inputs, key, future):
+                yield event
+        finally:
+            self.aflights.fail(future, RuntimeError("report stream was abandoned"))
+
+    async def _astream_uncached(self, inputs, key, future):
+        client = _get_client()
+        if client is None:
+            count_error("gemini", "api key missing")
+            self.aflights.resolve(future, MISSING_KEY_REPORT)
+            yield "error", {"message": MISSING_KEY_REPORT}
+            return
+
+        splitter = ChapterSplitter()
+        usage = None
+        parts = []
+        config = None
+        try:
+            async with self._semaphore:
+                t0 = time.perf_counter()
+                config = await self.persona.aconfig(client)
+                stream = await client.aio.models.generate_content_stream(
+                    model=MODEL_NAME,
+                    contents=self._build_prompt(inputs),
+                    config=config,
+                )
+                async for response in stream:
+                    if response.usage_metadata:
+                        usage = response.usage_metadata
+                    if response.text:
+                        parts.append(response.text)
+                        for event in splitter.feed(response.text):
+                            yield event
+                _STREAM_SECONDS.observe(time.perf_counter() - t0)
+            for event in splitter.close():
+                yield event
         except Exception as e:
-            return f"## Error\n\nThe spirits are silent (API Error): {str(e)}"
+            count_error("gemini", e)
+            if isinstance(e, errors.ClientError) and config is not None and config.cached_content:
+                # Text may already be out, so no retry here; later reports recreate the cache
+                self.persona.invalidate()
+            self.aflights.fail(future, e)
+            yield "error", {"message": f"The spirits are silent (API Error): {str(e)}"}
+            return
+
+        report = "".join(parts)
+        self.aflights.resolve(future, report)
+        await asyncio.to_thread(self._save, key, report)
+        if usage is not None:
+            record_usage(usage)
+            self.persona.record(usage)
+            yield "usage", {
+                "prompt_tokens": usage.prompt_token_count,
+                "output_tokens": usage.candidates_token_count,
+                "total_tokens": usage.total_token_count
+            }
+
+    def _generate_content(self, client, contents):
+        config = self.persona.config(client)
+        try:
+            return client.models.generate_content(model=MODEL_NAME, contents=contents, config=config)
+        except errors.ClientError:
+            if not config.cached_content:
+                raise
+            # The cache may have expired or been deleted server-side; retry with the persona inline
+            self.persona.invalidate()
+            return client.models.generate_content(
+                model=MODEL_NAME, contents=contents, config=self.persona.fallback_config()
+            )
+
+    async def _agenerate_content(self, client, contents):
+        config = await self.persona.aconfig(client)
+        try:
+            return await client.aio.models.generate_content(model=MODEL_NAME, contents=contents, config=config)
+        except errors.ClientError:
+            if not config.cached_content:
+                raise
+            self.persona.invalidate()
+            return await client.aio.models.generate_content(
+                model=MODEL_NAME, contents=contents, config=self.persona.fallback_config()
+            )
+
+    @staticmethod
+    def _replay(report, **flags):
+        """Events for a report that needed no generation of its own."""
+        splitter = ChapterSplitter()
+        yield from splitter.feed(report)
+        yield from splitter.close()
+        yield "usage", {"prompt_tokens": 0, "output_tokens": 0, "total_tokens": 0, **flags}
+
+    @staticmethod
+    def prompt_inputs(pillars_data):
+        """
+        Everything about a chart that shapes the prompt. The current year is
+        included because the "Current Tides" chapter forecasts it; computed
+        luck pillars are included when the caller supplied them.
+        """
+        inputs = {
+            "year": f"{pillars_data['year']['stem']} {pillars_data['year']['branch']}",
+            "month": f"{pillars_data['month']['stem']} {pillars_data['month']['branch']}",
+            "day": f"{pillars_data['day']['stem']} {pillars_data['day']['branch']}",
+            "hour": f"{pillars_data['hour']['stem']} {pillars_data['hour']['branch']}",
+            "dominant_element": pillars_data.get('dominant_element', 'Unknown'),
+            "class": pillars_data.get('class', 'Unknown'),
+            "current_year": datetime.now().year,
+        }
+        for key in ("daewoon", "seun"):
+            if pillars_data.get(key):
+                inputs[key] = pillars_data[key]
+        return inputs
+
+    @classmethod
+    def _build_prompt(cls, inputs):
+        """
+        The per-chart part of the prompt. The persona is not included: it goes
+        as cached content or a system instruction (see PersonaCache).
+        """
+        return cls._chart_context(inputs) + '\n\nWrite the "Book of Destiny" for this soul now.'
+
+    @classmethod
+    def _build_chapter_prompt(cls, inputs, idx):
+        """The chart context and the one chapter a chapters-mode call writes."""
+        title = CHAPTERS[idx]
+        return cls._chart_context(inputs) + (
+            f'\n\nWrite only chapter {idx + 1} of the "Book of Destiny" for this soul, "{title}", '
+            f'starting with the heading "## {idx + 1}. {title}". Aim for about {CHAPTER_CHARS} characters; '
+            "the other chapters are written separately, so do not add an introduction or closing."
+        )
+
+    @staticmethod
+    def _chart_context(inputs):
+        """Chart, date and analysis lines shared by the whole-report and chapter prompts."""
+        current_date_str = datetime.now().strftime("%Y-%m-%d")
+
+        lines = [
+            "Analyze the following Saju (Four Pillars) Chart:",
+            "",
+            "**Birth Data**:",
+            f"- Year Pillar: {inputs['year']}",
+            f"- Month Pillar: {inputs['month']}",
+            f"- Day Pillar: {inputs['day']} (Day Master)",
+            f"- Hour Pillar: {inputs['hour']}",
+            "",
+            "**Context**:",
+            f"- Current Date: {current_date_str} "
+            f"(The forecast for \"Current Year\" must focus on {inputs['current_year']})",
+            "",
+            "**Meta Analysis**:",
+            f"- Dominant Element: {inputs['dominant_element']}",
+            f"- Soul Class: {inputs['class']}",
+        ]
+        if "daewoon" in inputs:
+            lines += [
+                "",
+                "**Luck Pillars** (computed from the solar terms; use these instead of simulating a flow):",
+                f"- Daewoon (10-year): {inputs['daewoon']}",
+                f"- Seun for {inputs['current_year']}: {inputs.get('seun', 'Unknown')}",
+            ]
+        return "\n".join(lines)
+
+    def _load(self, key):
+        if self.store is None:
+            return None
+        try:
+            return self.store.get(key)
+        except sqlite3.Error as e:
+            count_error("report_store", e)
+            logger.warning("Report store read failed: %s", e)
+            return None
+
+    def _save(self, key, report):
+        """Saves a non-empty report to the store; returns whether it was saved."""
+        if self.store is None or not report:
+            return False
+        try:
+            self.store.put(key, report)
+        except sqlite3.Error as e:
+            count_error("report_store", e)
+            logger.warning("Report store write failed: %s", e)
+            return False
+        return True
+
+    def _record_usage(self, response):
+        if getattr(response, 'usage_metadata', None):
+            record_usage(response.usage_metadata)
+            self.persona.record(response.usage_metadata)
+
+
+def _heading_key(text):
+    return "".join(ch for ch in text.lower().replace("&", "and") if ch.isalnum())
+
+
+_CHAPTER_KEYS = tuple(_heading_key(title) for title in CHAPTERS)
+
+
+class ChapterSplitter:
+    """
+    Incrementally splits streamed markdown into chapter and text events.
+    Text is passed through as soon as it arrives; only a line that may still
+    turn into a '#' heading is held back until its newline.
+    """
+
+    def __init__(self):
+        self.next_chapter = 0
+        self._pending = ""
+
+    def feed(self, text):
+        events = []
+        buf = self._pending + text
+        self._pending = ""
+        while buf:
+            newline = buf.find("\n")
+            line = buf if newline < 0 else buf[:newline + 1]
+            if newline < 0 and line.lstrip().startswith("#"):
+                self._pending = line  # possible heading, wait for the rest
+                break
+            events.extend(self._emit(line))
+            buf = buf[len(line):]
+        return self._merge(events)
+
+    def close(self):
+        line, self._pending = self._pending, ""
+        return self._merge(self._emit(line)) if line else []
+
+    def _emit(self, line):
+        if line.lstrip().startswith("#") and self.next_chapter < len(CHAPTERS):
+            key = _heading_key(line)
+            for idx in range(self.next_chapter, len(CHAPTERS)):
+                if _CHAPTER_KEYS[idx] in key:
+                    self.next_chapter = idx + 1
+                    return [
+                        ("chapter", {"index": idx + 1, "title": CHAPTERS[idx]}),
+                        ("chunk", {"text": line}),
+                    ]
+        return [("chunk", {"text": line})]
+
+    @staticmethod
+    def _merge(events):
+        """Joins consecutive chunk events so each feed() yields as few events as possible."""
+        merged = []
+        for event, data in events:
+            if event == "chunk" and merged and merged[-1][0] == "chunk":
+                merged[-1] = ("chunk", {"text": merged[-1][1]["text"] + data["text"]})
+            else:
+                merged.append((event, data))
+        return merged
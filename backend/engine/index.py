@@ -0,0 +1,234 @@
+"""
+Chart Index Module
+Inverted index from chart features to the birth hours that produce them.
+
+Every hour of a date range (Korean civil time, on the hour) is charted once with
+the batch kernel. Each feature -- the stem and branch of every pillar, the day
+master and dominant element, each element's count and the whole five-element
+count signature -- maps to the sorted list of hours that have it, stored as
+zlib-compressed deltas. A query decodes the lists for its features, intersects
+them smallest first and pages through the result. Decoded lists are int64 and
+can run to megabytes each, so the cache of recently queried ones is bounded by
+bytes.
+"""
+import os
+import threading
+import zlib
+
+from .cache import SizedLRUCache
+from .chart import PILLARS, unpack
+from .constants import HEAVENLY_STEMS, EARTHLY_BRANCHES
+from .interpreter import ELEMENTS
+
+DEFAULT_START_YEAR = int(os.environ.get("CHART_INDEX_START_YEAR", "1930"))
+DEFAULT_END_YEAR = int(os.environ.get("CHART_INDEX_END_YEAR", "2030"))
+DEFAULT_CACHE_BYTES = int(float(os.environ.get("CHART_INDEX_CACHE_MB", "16")) * 2**20)
+
+
+def _match_name(value, names, kind):
+    """Index of `value` in `names`: an int, a full name, a leading phrase ("Yang Fire", "Tiger") or the hanja."""
+    if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+        idx = int(value)
+        if 0 <= idx < len(names):
+            return idx
+    else:
+        wanted = value.strip().lower()
+        for idx, name in enumerate(names):
+            label = name.lower()
+            if wanted in (label, label.split(" (")[0]) or (len(wanted) == 1 and f"({wanted})" in label):
+                return idx
+    raise ValueError(f"Unknown {kind}: {value!r}")
+
+
+def stem_index(value):
+    return _match_name(value, HEAVENLY_STEMS, "stem")
+
+
+def branch_index(value):
+    return _match_name(value, EARTHLY_BRANCHES, "branch")
+
+
+def element_index(value):
+    return _match_name(value, ELEMENTS, "element")
+
+
+def _encode(hours):
+    """Sorted hour offsets -> zlib-compressed uint32 deltas."""
+    import numpy as np
+
+    deltas = np.diff(hours, prepend=0).astype(np.uint32)
+    return zlib.compress(deltas.tobytes(), 6)
+
+
+def _decode(blob):
+    import numpy as np
+
+    return np.cumsum(np.frombuffer(zlib.decompress(blob), dtype=np.uint32), dtype=np.int64)
+
+
+class ChartIndex:
+    """Hourly charts for [start_year, end_year] with compressed postings per feature."""
+
+    def __init__(self, start_year=DEFAULT_START_YEAR, end_year=DEFAULT_END_YEAR,
+                 cache_bytes=DEFAULT_CACHE_BYTES):
+        self.start_year = start_year
+        self.end_year = end_year
+        self.hours = 0
+        self.features = 0
+        self._postings = {}
+        # Decoded postings of recently queried features, up to cache_bytes in total
+        self._decoded = SizedLRUCache(cache_bytes, weigh=lambda hours: hours.nbytes)
+
+    @classmethod
+    def build(cls, calculator, interpreter, start_year=DEFAULT_START_YEAR, end_year=DEFAULT_END_YEAR,
+              cache_bytes=DEFAULT_CACHE_BYTES):
+        import numpy as np
+
+        index = cls(start_year, end_year, cache_bytes)
+        first = np.datetime64(f"{start_year:04d}-01-01T00", "h")
+        last = np.datetime64(f"{end_year + 1:04d}-01-01T00", "h")
+        stamps = np.arange(first, last)
+        index.hours = len(stamps)
+
+        keys = calculator.compute_packed(stamps)
+        analysis = interpreter.analyze_packed(keys)
+        counts = analysis["stats"]
+
+        features = {}
+        for name, pos in zip(PILLARS, unpack(keys.astype(np.int64))):
+            features[f"{name}_stem"] = pos % 10
+            features[f"{name}_branch"] = pos % 12
+        features["day_master"] = analysis["day_master"]
+        features["dominant"] = analysis["dominant"]
+        for element_idx, element in enumerate(ELEMENTS):
+            features[element.lower()] = counts[:, element_idx]
+        # Whole signature as one base-9 number (each count is 0-8)
+        features["signature"] = counts.astype(np.int64) @ (9 ** np.arange(len(ELEMENTS) - 1, -1, -1))
+
+        index.features = len(features)
+        for feature, values in features.items():
+            # A stable sort keeps each value's hours in time order
+            order = np.argsort(values, kind="stable")
+            ordered = values[order]
+            bounds = np.flatnonzero(np.diff(ordered)) + 1
+            for group in np.split(order, bounds):
+                index._postings[(feature, int(values[group[0]]))] = _encode(group)
+        return index
+
+    def _hours(self, term):
+        hours = self._decoded.get(term)
+        if hours is None:
+            blob = self._postings.get(term)
+            if blob is None:
+                return None
+            hours = _decode(blob)
+            self._decoded.put(term, hours)
+        return hours
+
+    def terms(self, year_stem=None, year_branch=None, month_stem=None, month_branch=None,
+              day_stem=None, day_branch=None, hour_stem=None, hour_branch=None,
+              day_master=None, dominant=None, counts=None, signature=None):
+        """
+        Index terms for a query. Stems, branches and elements may be given as
+        indices or names; `counts` maps elements to exact counts and
+        `signature` is all five counts in ELEMENTS order.
+        """
+        terms = []
+        for feature, value in (("year_stem", year_stem), ("month_stem", month_stem),
+                               ("day_stem", day_stem), ("hour_stem", hour_stem)):
+            if value is not None:
+                terms.append((feature, stem_index(value)))
+        for feature, value in (("year_branch", year_branch), ("month_branch", month_branch),
+                               ("day_branch", day_branch), ("hour_branch", hour_branch)):
+            if value is not None:
+                terms.append((feature, branch_index(value)))
+        for feature, value in (("day_master", day_master), ("dominant", dominant)):
+            if value is not None:
+                terms.append((feature, element_index(value)))
+        for element, count in (counts or {}).items():
+            terms.append((ELEMENTS[element_index(element)].lower(), int(count)))
+        if signature is not None:
+            if len(signature) != len(ELEMENTS):
+                raise ValueError("signature needs one count per element")
+            code = 0
+            for count in signature:
+                code = code * 9 + int(count)
+            terms.append(("signature", code))
+        return terms
+
+    def search(self, terms, start=None, end=None):
+        """
+        Sorted hour offsets (from start_year-01-01 00:00) matching every term,
+        optionally limited to [start, end) offsets.
+        """
+        import numpy as np
+
+        postings = []
+        for term in terms:
+            hours = self._hours(term)
+            if hours is None:
+                return np.empty(0, dtype=np.int64)
+            postings.append(hours)
+        if not postings:
+            result = np.arange(self.hours, dtype=np.int64)
+        else:
+            postings.sort(key=len)
+            result = postings[0]
+            for other in postings[1:]:
+                if not len(result):
+                    break
+                pos = np.searchsorted(other, result).clip(max=len(other) - 1)
+                result = result[other[pos] == result]
+
+        lo = 0 if start is None else np.searchsorted(result, start)
+        hi = len(result) if end is None else np.searchsorted(result, end)
+        return result[lo:hi]
+
+    def query(self, start=None, end=None, offset=0, limit=100, **filters):
+        """
+        Paged search. `start`/`end` are datetimes (end exclusive) within the
+        indexed range; returns the total match count, one page of birth
+        datetimes (as numpy datetime64[h]) and the offset of the next page.
+        """
+        import numpy as np
+
+        origin = np.datetime64(f"{self.start_year:04d}-01-01T00", "h")
+        lo = None if start is None else int((np.datetime64(start, "h") - origin).astype(np.int64))
+        hi = None if end is None else int((np.datetime64(end, "h") - origin).astype(np.int64))
+
+        result = self.search(self.terms(**filters), lo, hi)
+        page = result[offset:offset + limit]
+        more = offset + limit < len(result)
+        return {
+            "total": int(len(result)),
+            "matches": origin + page.astype("timedelta64[h]"),
+            "next_offset": offset + limit if more else None,
+        }
+
+    def stats(self):
+        # Every hour appears once per feature; uncompressed that is one uint32 each
+        raw = 4 * self.hours * self.features
+        compressed = sum(len(blob) for blob in self._postings.values())
+        return {
+            "start_year": self.start_year,
+            "end_year": self.end_year,
+            "hours": self.hours,
+            "terms": len(self._postings),
+            "compressed_bytes": compressed,
+            "raw_bytes": raw,
+            "decoded_cache": self._decoded.stats(),
+        }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index(calculator, interpreter):
+    """The process-wide index over the configured range, built on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ChartIndex.build(calculator, interpreter)
+    return _index
@@ -4,9 +4,51 @@ Analyzes Four Pillars data to produce element stats, class, and interpretations.
 """
 import json
 import os
+import sys
+from types import MappingProxyType
+from typing import NamedTuple
+from .chart import Chart, unpack
 from .constants import STEM_ELEMENTS, BRANCH_ELEMENTS
 
 
+# Element order used for stats and bundle indices
+ELEMENTS = ("Wood", "Fire", "Earth", "Metal", "Water")
+TOPICS = ("personality", "wealth", "career", "health", "love")
+
+_STEM_ELEMENT_IDX = tuple(ELEMENTS.index(e) for e in STEM_ELEMENTS)
+_BRANCH_ELEMENT_IDX = tuple(ELEMENTS.index(e) for e in BRANCH_ELEMENTS)
+
+# Element of the stem and of the branch at each sexagenary position
+_POS_STEM_ELEMENT = tuple(_STEM_ELEMENT_IDX[pos % 10] for pos in range(60))
+_POS_BRANCH_ELEMENT = tuple(_BRANCH_ELEMENT_IDX[pos % 12] for pos in range(60))
+
+_REPORT_TEMPLATE = """
+## 1. Essence & Personality
+{personality}
+
+## 2. Wealth & Property
+{wealth}
+
+## 3. Career & Path
+{career}
+
+## 4. Health & Vitality
+{health}
+
+## 5. Love & Relationships
+{love}
+"""
+
+
+class _Bundle(NamedTuple):
+    """Precompiled, immutable reading for one dominant element."""
+    element: str
+    user_class: str
+    class_description: str
+    interpretations: MappingProxyType  # topic -> text, in TOPICS order
+    detailed_report: str
+
+
 class SajuInterpreter:
     """Interprets pillar data into meaningful stats and personality readings."""
 
@@ -14,65 +56,101 @@ class SajuInterpreter:
         data_path = os.path.join(os.path.dirname(__file__), '..', 'saju_data.json')
         with open(data_path, 'r', encoding='utf-8') as f:
             self.data = json.load(f)
+        self._compile()
 
-    def analyze(self, pillars_data):
+    def _compile(self):
+        """
+        Builds everything that depends only on the dominant element (class, texts,
+        report) and on the day master (message) once, so analyze() is index lookups.
         """
-        Analyzes pillar meta data to compute element counts,
+        bundles = []
+        for element in ELEMENTS:
+            interpretations = MappingProxyType({
+                topic: sys.intern(self._get_interpretation(topic, element))
+                for topic in TOPICS
+            })
+            bundles.append(_Bundle(
+                element=element,
+                user_class=sys.intern(self.data["classes"].get(element, "Wanderer")),
+                class_description=sys.intern(self.data["class_descriptions"].get(
+                    element, "운명의 흐름을 여행하는 방랑자입니다."
+                )),
+                interpretations=interpretations,
+                detailed_report=_REPORT_TEMPLATE.format(**interpretations).strip()
+            ))
+        self._bundles = tuple(bundles)
+
+        # messages[day_master_idx][dominant_idx]
+        self._messages = tuple(
+            tuple(
+                f"You were born with the energy of {day_master}, "
+                f"and your chart is most strongly influenced by {dominant}."
+                for dominant in ELEMENTS
+            )
+            for day_master in ELEMENTS
+        )
+
+    def analyze(self, chart):
+        """
+        Analyzes a Chart to compute element counts,
         dominant element, class, and interpretations.
+        A legacy pillar dict with "meta" indices is accepted too.
         """
-        meta = pillars_data["meta"]
+        if not isinstance(chart, int):
+            chart = Chart.from_meta(chart["meta"])
+        year, month, day, hour = unpack(int(chart))
 
         # Count elements from all 8 characters (4 stems + 4 branches)
-        element_counts = {"Wood": 0, "Fire": 0, "Earth": 0, "Metal": 0, "Water": 0}
-
-        for key in ["year_gan", "month_gan", "day_gan", "hour_gan"]:
-            element_counts[STEM_ELEMENTS[meta[key]]] += 1
-        for key in ["year_ji", "month_ji", "day_ji", "hour_ji"]:
-            element_counts[BRANCH_ELEMENTS[meta[key]]] += 1
-
-        dominant = max(element_counts, key=element_counts.get)
-        day_master_element = STEM_ELEMENTS[meta["day_gan"]]
+        counts = [0, 0, 0, 0, 0]
+        day_master_idx = _POS_STEM_ELEMENT[day]
+        counts[_POS_STEM_ELEMENT[year]] += 1
+        counts[_POS_STEM_ELEMENT[month]] += 1
+        counts[day_master_idx] += 1
+        counts[_POS_STEM_ELEMENT[hour]] += 1
+        counts[_POS_BRANCH_ELEMENT[year]] += 1
+        counts[_POS_BRANCH_ELEMENT[month]] += 1
+        counts[_POS_BRANCH_ELEMENT[day]] += 1
+        counts[_POS_BRANCH_ELEMENT[hour]] += 1
+
+        # First maximum wins ties, in ELEMENTS order
+        dominant_idx = counts.index(max(counts))
+        bundle = self._bundles[dominant_idx]
 
-        # Class lookup
-        user_class = self.data["classes"].get(dominant, "Wanderer")
-        class_description = self.data["class_descriptions"].get(
-            dominant, "운명의 흐름을 여행하는 방랑자입니다."
-        )
-
-        # Detailed Interpretations
-        interpretations = {
-            topic: self._get_interpretation(topic, dominant)
-            for topic in ["personality", "wealth", "career", "health", "love"]
+        return {
+            "stats": dict(zip(ELEMENTS, counts)),
+            "class": bundle.user_class,
+            "class_description": bundle.class_description,
+            "dominant_element": bundle.element,
+            "day_master": ELEMENTS[day_master_idx],
+            "interpretations": bundle.interpretations.copy(),
+            "detailed_report": bundle.detailed_report,
+            "message": self._messages[day_master_idx][dominant_idx]
         }
 
-        # Generate full report text
-        detailed_report = f"""
-## 1. Essence & Personality
-{interpretations['personality']}
-
-## 2. Wealth & Property
-{interpretations['wealth']}
-
-## 3. Career & Path
-{interpretations['career']}
+    @staticmethod
+    def analyze_packed(keys):
+        """
+        Element analysis for an array of packed chart keys, without building any
+        per-chart objects. Returns "stats" (n x 5 uint8 counts in ELEMENTS order)
+        and the "dominant" and "day_master" element indices.
+        """
+        import numpy as np
 
-## 4. Health & Vitality
-{interpretations['health']}
+        keys = np.asarray(keys, dtype=np.int64)
+        stem_element = np.asarray(_POS_STEM_ELEMENT, dtype=np.intp)
+        branch_element = np.asarray(_POS_BRANCH_ELEMENT, dtype=np.intp)
 
-## 5. Love & Relationships
-{interpretations['love']}
-""".strip()
+        rows = np.arange(len(keys))
+        counts = np.zeros((len(keys), len(ELEMENTS)), dtype=np.uint8)
+        for pos in unpack(keys):
+            counts[rows, stem_element[pos]] += 1
+            counts[rows, branch_element[pos]] += 1
 
         return {
-            "stats": element_counts,
-            "class": user_class,
-            "class_description": class_description,
-            "dominant_element": dominant,
-            "day_master": day_master_element,
-            "interpretations": interpretations,
-            "detailed_report": detailed_report,
-            "message": f"You were born with the energy of {day_master_element}, "
-                       f"and your chart is most strongly influenced by {dominant}."
+            "stats": counts,
+            # argmax keeps the first maximum, like analyze()
+            "dominant": counts.argmax(axis=1),
+            "day_master": stem_element[unpack(keys)[2]],
         }
 
     def _get_interpretation(self, topic, dominant):
@@ -0,0 +1,132 @@
+"""
+Luck Pillars Module
+Daewoon (大運, ten-year luck pillars), Seun (歲運, annual pillars) and
+Wolun (月運, monthly pillars) for a whole lifetime.
+
+Daewoon run from the month pillar, forward for a Yang-year man or Yin-year
+woman and backward otherwise. The first one starts at an age given by the
+distance from the birth to the next Jeol (forward) or back to the month's
+opening Jeol (backward): three days count as one year.
+Pillars are sexagenary positions (0-59); `cycle()` names them.
+"""
+from typing import NamedTuple
+
+from .cache import sexagenary
+from .calculator import _pillar_indices
+from .constants import HEAVENLY_STEMS, EARTHLY_BRANCHES
+
+DAEWOON_COUNT = 10
+DEFAULT_SPAN = 100
+
+# Month branches in Saju-year order, from In (寅) at Ipchun to Chuk (丑)
+_MONTH_BRANCHES = (2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 0, 1)
+
+_GENDERS = {"male": True, "m": True, "man": True, "female": False, "f": False, "woman": False}
+
+
+def parse_gender(value):
+    """True for male, False for female."""
+    try:
+        return _GENDERS[str(value).strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown gender: {value!r} (use male or female)") from None
+
+
+def is_forward(year_gan, male):
+    """Yang-year men and Yin-year women run forward (순행), the others backward (역행)."""
+    return (year_gan % 2 == 0) == male
+
+
+def start_age_months(distance_seconds):
+    """Age at the first Daewoon: three days to the Jeol make a year, so a day is four months."""
+    return round(distance_seconds / 86400 * 4)
+
+
+def cycle():
+    """Display stem/branch for each sexagenary position."""
+    return [{"stem": HEAVENLY_STEMS[pos % 10], "branch": EARTHLY_BRANCHES[pos % 12]} for pos in range(60)]
+
+
+def pillar_name(pos):
+    return f"{HEAVENLY_STEMS[pos % 10]} {EARTHLY_BRANCHES[pos % 12]}"
+
+
+class LuckTimeline(NamedTuple):
+    """A lifetime of luck pillars as sexagenary positions."""
+    forward: bool
+    start_months: int    # age in months when the first Daewoon begins
+    birth_year: int      # calendar year of birth; seun[0] is its pillar
+    birth_month: int
+    daewoon: object      # (DAEWOON_COUNT,) positions
+    seun: object         # (span,) positions, one per calendar year
+    wolun: object        # (span, 12) positions, months from Ipchun of each year
+
+    def daewoon_start(self, k):
+        """(age in months, "YYYY-MM") at which Daewoon k (0-based) begins."""
+        months = self.start_months + 120 * k
+        total = self.birth_month - 1 + months
+        return months, f"{self.birth_year + total // 12:04d}-{total % 12 + 1:02d}"
+
+    def to_dict(self):
+        """JSON shape served by the API."""
+        daewoon = []
+        for k, pos in enumerate(self.daewoon.tolist()):
+            months, start = self.daewoon_start(k)
+            daewoon.append({"index": k + 1, "age": round(months / 12, 2), "start": start, "pillar": pos})
+        return {
+            "direction": "forward" if self.forward else "backward",
+            "start_age": {"years": self.start_months // 12, "months": self.start_months % 12},
+            "daewoon": daewoon,
+            "seun": {"start_year": self.birth_year, "pillars": self.seun.tolist()},
+            "wolun": {"start_year": self.birth_year, "pillars": self.wolun.tolist()},
+            "cycle": cycle(),
+        }
+
+    def prompt_summary(self, current_year):
+        """Plain-text Daewoon flow and current-year Seun for the deep report prompt."""
+        lines = []
+        for k, pos in enumerate(self.daewoon.tolist()):
+            months, start = self.daewoon_start(k)
+            age = months // 12
+            lines.append(f"Age {age}-{age + 9} (from {start}): {pillar_name(pos)}")
+        offset = current_year - self.birth_year
+        seun = pillar_name(int(self.seun[offset])) if 0 <= offset < len(self.seun) else "Unknown"
+        return {"daewoon": "; ".join(lines), "seun": seun}
+
+
+def luck_timeline(chart, birth_year, birth_month, forward, start_months, span=DEFAULT_SPAN):
+    """All Daewoon, Seun and Wolun pillars for `span` years from the birth year, in one vectorized pass."""
+    import numpy as np
+
+    month_pos = chart.pillars[1]
+    step = 1 if forward else -1
+    daewoon = (month_pos + step * np.arange(1, DAEWOON_COUNT + 1)) % 60
+
+    years = birth_year + np.arange(span)
+    seun = (years - 4) % 60
+
+    # Month stems follow each year's stem (월두법), same kernel as the birth chart
+    _, _, month_gan, month_ji, _, _, _, _ = _pillar_indices(
+        0, years[:, None], np.asarray(_MONTH_BRANCHES)[None, :], 0
+    )
+    wolun = sexagenary(month_gan, month_ji)
+
+    return LuckTimeline(forward, start_months, birth_year, birth_month, daewoon, seun, wolun)
+
+
+class LuckCalculator:
+    """Builds luck timelines for births, using the calculator's solar terms."""
+
+    def __init__(self, calculator):
+        self.calculator = calculator
+
+    def start(self, year, month, day, hour, minute, gender, longitude=None, timezone=None):
+        """(Chart, forward, start_months): everything a timeline depends on besides its span."""
+        chart = self.calculator.compute(year, month, day, hour, minute, longitude, timezone)
+        forward = is_forward(chart.pillars[0] % 10, parse_gender(gender))
+        since_jeol, until_jeol = self.calculator.jeol_distance(year, month, day, hour, minute, timezone)
+        return chart, forward, start_age_months(until_jeol if forward else since_jeol)
+
+    def compute(self, year, month, day, hour, minute, gender, span=DEFAULT_SPAN, longitude=None, timezone=None):
+        chart, forward, start_months = self.start(year, month, day, hour, minute, gender, longitude, timezone)
+        return chart, luck_timeline(chart, year, month, forward, start_months, span)
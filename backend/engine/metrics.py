@@ -0,0 +1,257 @@
+"""
+Metrics Module
+Minimal Prometheus-style counters and histograms with a text exposition.
+
+Recording is lock-free on the hot path: every thread writes to its own
+shard (found through a thread-local), and shards are only summed when the
+metrics are rendered. A lock is taken once per thread per metric child, the
+first time that thread records to it, and again when the thread exits.
+"""
+import threading
+import weakref
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+# Seconds; fine at the low end for the in-process stages, coarse for LLM calls
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+REGISTRY = []
+
+
+class _Owner:
+    """Kept in a thread-local; released, and so finalized, when its thread exits."""
+    __slots__ = ("__weakref__",)
+
+
+class _Sharded:
+    """
+    Per-thread state objects created on demand and remembered for rendering.
+    State is a list of numbers summed element-wise; when a thread exits its
+    shard is folded into a retired total, so short-lived threads do not
+    leave shards behind.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._local = threading.local()
+        self._shards = {}
+        self._retired = factory()
+        self._lock = threading.Lock()
+
+    def shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._factory()
+            with self._lock:
+                self._shards[id(shard)] = shard
+            self._local.shard = shard
+            self._local.owner = owner = _Owner()
+            weakref.finalize(owner, self._retire, shard)
+            return shard
+
+    def _retire(self, shard):
+        with self._lock:
+            del self._shards[id(shard)]
+            for i, value in enumerate(shard):
+                self._retired[i] += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._shards.values()) + [list(self._retired)]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Family(ABC):
+    """A named, registered metric with zero or more label dimensions."""
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    @abstractmethod
+    def render(self):
+        """Exposition lines for this metric."""
+
+
+class _Recorded(_Family):
+    """A family recorded into per-label-values children (counters, histograms)."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        super().__init__(name, help_text, labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Returns the child for these label values; keep a reference to it on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child for one set of label values."""
+
+    @abstractmethod
+    def _render_child(self, values, child):
+        """Exposition lines for one child."""
+
+    def render(self):
+        lines = self._header()
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_state",)
+
+    def __init__(self):
+        self._state = _Sharded(lambda: [0])
+
+    def inc(self, amount=1):
+        self._state.shard()[0] += amount
+
+    def value(self):
+        return sum(shard[0] for shard in self._state.snapshot())
+
+
+class Counter(_Recorded):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value())}"]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "_state")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # per-thread [bucket counts..., +Inf count, sum]
+        self._state = _Sharded(lambda: [0] * (len(bounds) + 1) + [0.0])
+
+    def observe(self, value):
+        shard = self._state.shard()
+        shard[bisect_left(self.bounds, value)] += 1
+        shard[-1] += value
+
+    def totals(self):
+        totals = [0] * (len(self.bounds) + 1) + [0.0]
+        for shard in self._state.snapshot():
+            for i, v in enumerate(shard):
+                totals[i] += v
+        return totals
+
+
+class Histogram(_Recorded):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help_text, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        totals = child.totals()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), totals):
+            cumulative += count
+            le = bound if bound == "+Inf" else repr(float(bound))
+            lines.append(
+                f"{self.name}_bucket{_format_labels(self.labelnames, values, ('le', le))} {cumulative}"
+            )
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(totals[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge(_Family):
+    """Values read at render time from a callback returning (label_values, value) pairs."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames, callback):
+        self.callback = callback
+        super().__init__(name, help_text, labelnames)
+
+    def render(self):
+        lines = self._header()
+        for values, value in self.callback():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+def render():
+    """Prometheus text exposition (format 0.0.4) of every registered metric."""
+    lines = []
+    for family in REGISTRY:
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Instruments shared across the app ---
+
+STAGE_SECONDS = Histogram(
+    "soulstat_stage_seconds", "Latency of each request-handling stage", ("stage",)
+)
+GEMINI_TOKENS = Counter(
+    "soulstat_gemini_tokens_total", "Gemini tokens consumed by deep reports", ("kind",)
+)
+ERRORS = Counter(
+    "soulstat_errors_total", "Errors by pipeline stage and exception class", ("stage", "error")
+)
+
+
+def count_error(stage, error):
+    """Counts an error under its class name (or a short label for non-exception failures)."""
+    ERRORS.labels(stage, error if isinstance(error, str) else type(error).__name__).inc()
+
+
+def record_usage(usage):
+    """Adds a Gemini response's usage_metadata to the token counters."""
+    GEMINI_TOKENS.labels("prompt").inc(usage.prompt_token_count or 0)
+    GEMINI_TOKENS.labels("output").inc(usage.candidates_token_count or 0)
+    GEMINI_TOKENS.labels("total").inc(usage.total_token_count or 0)
+    GEMINI_TOKENS.labels("cached").inc(getattr(usage, "cached_content_token_count", None) or 0)
@@ -0,0 +1,195 @@
+"""
+Persona Cache Module
+Keeps the Myungseon persona in Gemini context caching, so a deep report
+request carries only its compact chart payload.
+
+The persona is registered once per process as cached content, and its TTL
+is extended shortly before it runs out. When caching is unavailable the
+persona travels with each request as a plain system instruction instead.
+
+The API only caches content of at least a minimum size (PERSONA_CACHE_MIN_TOKENS,
+4096 for Gemini 2.0 Flash). The current persona is about 400 tokens, so caching
+is inert in production until a larger prefix is cached or the model's minimum
+drops: an instruction estimated below the minimum is never offered, and an API
+answer that the content is too small turns caching off for the process instead
+of being retried. Other failed creations are retried after a back-off; caching
+is also off with PERSONA_CACHE=0, and a cache that disappears is recreated.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from google.genai import types
+
+from .metrics import Histogram, count_error
+
+DEFAULT_TTL_SECONDS = int(os.environ.get("PERSONA_CACHE_TTL_SECONDS", "3600"))
+ENABLED = os.environ.get("PERSONA_CACHE", "1") != "0"
+# Smallest content, in tokens, the model accepts as cached content
+MIN_TOKENS = int(os.environ.get("PERSONA_CACHE_MIN_TOKENS", "4096"))
+
+# The TTL is extended once less than this fraction of it remains
+REFRESH_FRACTION = 0.2
+# Seconds to wait before trying to create the cache again after a refusal
+RETRY_SECONDS = 600
+
+DISPLAY_NAME = "myungseon-persona"
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    """Rough token count of English text (about four characters per token)."""
+    return max(len(text) // 4, 1)
+
+
+def _too_small(error):
+    """Whether a cache creation was refused for content below the model's minimum size."""
+    return "too small" in str(error).lower()
+
+PROMPT_TOKENS_SAVED = Histogram(
+    "soulstat_prompt_tokens_saved",
+    "Input tokens per deep report read from the persona cache instead of billed in full",
+    buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+
+
+class PersonaCache:
+    """Gemini cached content for a fixed system instruction, with TTL refresh and fallback."""
+
+    def __init__(self, instruction, model, ttl_seconds=DEFAULT_TTL_SECONDS, enabled=ENABLED, min_tokens=None):
+        self.instruction = instruction
+        self.model = model
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = MIN_TOKENS if min_tokens is None else min_tokens
+        self.enabled = enabled
+        if enabled and estimate_tokens(instruction) < self.min_tokens:
+            logger.info(
+                "Persona (~%d tokens) is below the %d-token minimum for context caching; sending it inline",
+                estimate_tokens(instruction), self.min_tokens,
+            )
+            self.enabled = False
+        self.name = None
+        self.expires = 0.0       # time.monotonic() at which the cache runs out
+        self.tokens = None       # persona size as reported when the cache was created
+        self.cached_requests = 0
+        self.fallback_requests = 0
+        self.tokens_saved = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._alock = asyncio.Lock()
+
+    def fallback_config(self):
+        """Request config carrying the persona inline."""
+        return types.GenerateContentConfig(system_instruction=self.instruction)
+
+    def _current_config(self):
+        if self.name is not None:
+            return types.GenerateContentConfig(cached_content=self.name)
+        return self.fallback_config()
+
+    def _due(self):
+        """Whether the cache needs creating or its TTL extending before the next request."""
+        if not self.enabled:
+            return False
+        now = time.monotonic()
+        if self.name is not None:
+            return now >= self.expires - self.ttl_seconds * REFRESH_FRACTION
+        return now >= self._retry_at
+
+    def config(self, client):
+        """GenerateContentConfig for one request: the cached persona when available."""
+        if self._due():
+            with self._lock:
+                if self._due():
+                    try:
+                        if self.name is not None and time.monotonic() < self.expires:
+                            cached = client.caches.update(name=self.name, config=self._update_config())
+                        else:
+                            cached = client.caches.create(model=self.model, config=self._create_config())
+                    except Exception as e:
+                        self._failed(e)
+                    else:
+                        self._stored(cached)
+        return self._current_config()
+
+    async def aconfig(self, client):
+        """Async variant of config() using the client's async caches API."""
+        if self._due():
+            async with self._alock:
+                if self._due():
+                    try:
+                        if self.name is not None and time.monotonic() < self.expires:
+                            cached = await client.aio.caches.update(name=self.name, config=self._update_config())
+                        else:
+                            cached = await client.aio.caches.create(model=self.model, config=self._create_config())
+                    except Exception as e:
+                        self._failed(e)
+                    else:
+                        self._stored(cached)
+        return self._current_config()
+
+    def _create_config(self):
+        return types.CreateCachedContentConfig(
+            system_instruction=self.instruction,
+            display_name=DISPLAY_NAME,
+            ttl=f"{self.ttl_seconds}s",
+        )
+
+    def _update_config(self):
+        return types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s")
+
+    def _stored(self, cached):
+        created = cached.name != self.name
+        self.name = cached.name
+        self.expires = time.monotonic() + self.ttl_seconds
+        usage = getattr(cached, "usage_metadata", None)
+        if created:
+            self.tokens = getattr(usage, "total_token_count", None)
+            logger.info("Persona cached as %s (%s tokens)", self.name, self.tokens)
+
+    def _failed(self, error):
+        count_error("persona_cache", error)
+        if self.name is not None:
+            # A failed extension: create a new cache on the next request
+            logger.warning("Persona cache %s could not be extended: %s", self.name, error)
+            self.invalidate()
+        elif _too_small(error):
+            # Retrying cannot help: the persona does not change while the process runs
+            logger.warning("Persona is too small for context caching, sending it inline from now on: %s", error)
+            self.enabled = False
+        else:
+            logger.warning("Persona caching unavailable, sending it inline: %s", error)
+            self._retry_at = time.monotonic() + RETRY_SECONDS
+
+    def invalidate(self):
+        """Drops the cache (e.g. after a request naming it failed); the next request recreates it."""
+        self.name = None
+        self.expires = 0.0
+        self._retry_at = 0.0
+
+    def record(self, usage):
+        """Counts a response's input tokens that were served from the cache."""
+        saved = (getattr(usage, "cached_content_token_count", None) or 0) if usage is not None else 0
+        if saved:
+            self.cached_requests += 1
+        else:
+            self.fallback_requests += 1
+        self.tokens_saved += saved
+        PROMPT_TOKENS_SAVED.observe(saved)
+
+    def stats(self):
+        requests = self.cached_requests + self.fallback_requests
+        return {
+            "mode": "cached_content" if self.name is not None else "system_instruction",
+            "enabled": self.enabled,
+            "name": self.name,
+            "expires_in": round(max(self.expires - time.monotonic(), 0.0), 1) if self.name else None,
+            "persona_tokens": self.tokens,
+            "cached_requests": self.cached_requests,
+            "fallback_requests": self.fallback_requests,
+            "tokens_saved": self.tokens_saved,
+            "tokens_saved_per_request": round(self.tokens_saved / requests, 1) if requests else 0.0,
+        }
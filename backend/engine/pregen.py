@@ -0,0 +1,281 @@
+"""
+Pre-generation Module
+Generates deep reports for the most requested charts ahead of time, so
+/analyze/deep serves them straight from the report store.
+
+Charts are ranked by the request counts the API keeps in the report store
+(ReportStore.popular_charts). The top N are queued in a job table in the
+same SQLite file. A bounded pool of async workers then works through the
+queue via DeepReportGenerator, within a tokens-per-minute budget. Each job's
+outcome and token usage is written as soon as it finishes, so an interrupted
+run resumes where it stopped and failed jobs are retried by the next run.
+`status` reports progress and the estimated cost.
+
+Reports are generated for the chart alone (no gender given) and the current
+year, the prompt most deep requests produce.
+
+    python -m engine.pregen run --top 500 --workers 4 --tpm 1000000
+    python -m engine.pregen status
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import time
+
+from .chart import Chart
+from .interpreter import SajuInterpreter
+from .report_store import ReportStore, report_key
+
+DEFAULT_WORKERS = 4
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+MAX_ATTEMPTS = 3
+
+# Tokens reserved per report until real usage has been seen (prompt plus ~10k characters of output)
+INITIAL_ESTIMATE = 4000
+
+# USD per million tokens (gemini-2.0-flash list prices); cached prompt tokens bill at the cache rate
+PRICES = {
+    "input": float(os.environ.get("PREGEN_PRICE_INPUT", "0.10")),
+    "cached": float(os.environ.get("PREGEN_PRICE_CACHED", "0.025")),
+    "output": float(os.environ.get("PREGEN_PRICE_OUTPUT", "0.40")),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pregen_jobs (
+    key           TEXT PRIMARY KEY,
+    chart         INTEGER NOT NULL,
+    rank          INTEGER NOT NULL,
+    status        TEXT NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    error         TEXT,
+    updated       REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pregen_jobs_status ON pregen_jobs (status, rank);
+"""
+
+# Job states: waiting, generated by the job, already in the store, last attempt failed
+STATUSES = ("pending", "done", "stored", "failed")
+
+
+def cost(prompt_tokens, cached_tokens, output_tokens):
+    """Estimated USD for the given token counts."""
+    return (
+        (prompt_tokens - cached_tokens) * PRICES["input"]
+        + cached_tokens * PRICES["cached"]
+        + output_tokens * PRICES["output"]
+    ) / 1_000_000
+
+
+def chart_data(chart, interpreter):
+    """Pillars merged with their analysis, as the API passes them to the generator."""
+    return {**chart.to_dict(), **interpreter.analyze(chart)}
+
+
+class JobQueue:
+    """Pre-generation jobs and their outcomes, kept next to the reports in the store's SQLite file."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    def enqueue(self, jobs):
+        """Adds (key, chart, rank) jobs not queued before; returns how many were new."""
+        before = self.conn.total_changes
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO pregen_jobs (key, chart, rank, status, updated) VALUES (?, ?, ?, 'pending', ?)",
+            [(key, int(chart), rank, now) for key, chart, rank in jobs]
+        )
+        self.conn.execute("COMMIT")
+        return self.conn.total_changes - before
+
+    def pending(self, max_attempts=MAX_ATTEMPTS):
+        """(key, chart) of jobs still to run, best ranked first; failed jobs until they run out of attempts."""
+        return self.conn.execute(
+            "SELECT key, chart FROM pregen_jobs "
+            "WHERE status = 'pending' OR (status = 'failed' AND attempts < ?) ORDER BY rank",
+            (max_attempts,)
+        ).fetchall()
+
+    def finish(self, key, status, usage=None, error=None):
+        self.conn.execute(
+            "UPDATE pregen_jobs SET status = ?, attempts = attempts + 1, prompt_tokens = ?, "
+            "cached_tokens = ?, output_tokens = ?, error = ?, updated = ? WHERE key = ?",
+            (status, *_token_counts(usage), error, time.time(), key)
+        )
+
+    def summary(self):
+        """Jobs per status, total tokens and estimated cost of everything generated so far."""
+        jobs = dict.fromkeys(STATUSES, 0)
+        jobs.update(self.conn.execute("SELECT status, COUNT(*) FROM pregen_jobs GROUP BY status"))
+        prompt, cached, output = self.conn.execute(
+            "SELECT COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(cached_tokens), 0), "
+            "COALESCE(SUM(output_tokens), 0) FROM pregen_jobs"
+        ).fetchone()
+        return {
+            "jobs": jobs,
+            "tokens": {"prompt": prompt, "cached": cached, "output": output},
+            "cost_usd": round(cost(prompt, cached, output), 4),
+        }
+
+
+def _token_counts(usage):
+    if usage is None:
+        return 0, 0, 0
+    return (
+        usage.prompt_token_count or 0,
+        getattr(usage, "cached_content_token_count", None) or 0,
+        usage.candidates_token_count or 0,
+    )
+
+
+class TokenBudget:
+    """
+    Token bucket refilled at tokens_per_minute and holding at most a minute's
+    worth. A generation reserves its estimated size up front and settles the
+    difference once its real usage is known; an overdraft delays later calls.
+    """
+
+    def __init__(self, tokens_per_minute):
+        self.capacity = tokens_per_minute
+        self.rate = tokens_per_minute / 60
+        self.available = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens):
+        tokens = min(tokens, self.capacity)
+        # Waiters queue on the lock, so reservations are granted in order
+        async with self._lock:
+            self._refill()
+            while self.available < tokens:
+                await asyncio.sleep((tokens - self.available) / self.rate)
+                self._refill()
+            self.available -= tokens
+
+    def settle(self, reserved, used):
+        self.available += reserved - used
+
+
+def rank_jobs(store, interpreter, top):
+    """(report key, chart, rank) for the `top` most requested charts."""
+    from .generator import DeepReportGenerator
+
+    jobs = []
+    for rank, (chart, _) in enumerate(store.popular_charts(top)):
+        inputs = DeepReportGenerator.prompt_inputs(chart_data(Chart(chart), interpreter))
+        jobs.append((report_key(inputs), chart, rank))
+    return jobs
+
+
+async def run(generator, queue, interpreter, workers=DEFAULT_WORKERS,
+              tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_attempts=MAX_ATTEMPTS, progress=None):
+    """
+    Works off the pending jobs with `workers` concurrent generations.
+    `progress`, if given, is called with the running tally after each job.
+    Returns the tally for this run.
+    """
+    jobs = queue.pending(max_attempts)
+    todo = asyncio.Queue()
+    for job in jobs:
+        todo.put_nowait(job)
+
+    budget = TokenBudget(tokens_per_minute)
+    tally = {"total": len(jobs), "done": 0, "stored": 0, "failed": 0,
+             "prompt_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "started": time.monotonic()}
+
+    async def worker():
+        while not todo.empty():
+            key, chart = todo.get_nowait()
+            generated = tally["done"]
+            used_so_far = tally["prompt_tokens"] + tally["output_tokens"]
+            estimate = used_so_far // generated if generated else INITIAL_ESTIMATE
+            await budget.acquire(estimate)
+            try:
+                usage = await generator.apregenerate(chart_data(Chart(chart), interpreter))
+            except Exception as e:
+                # An empty or unsaved report still cost its tokens
+                usage = getattr(e, "usage", None)
+                status = "failed"
+                queue.finish(key, status, usage, error=str(e))
+            else:
+                status = "stored" if usage is None else "done"
+                queue.finish(key, status, usage)
+            prompt, cached, output = _token_counts(usage)
+            budget.settle(estimate, prompt + output)
+            tally[status] += 1
+            tally["prompt_tokens"] += prompt
+            tally["cached_tokens"] += cached
+            tally["output_tokens"] += output
+            if progress is not None:
+                progress(tally)
+
+    await asyncio.gather(*(worker() for _ in range(min(workers, len(jobs)))))
+    return tally
+
+
+def format_progress(tally):
+    finished = tally["done"] + tally["stored"] + tally["failed"]
+    elapsed = time.monotonic() - tally["started"]
+    remaining = (tally["total"] - finished) * elapsed / finished if finished else 0
+    spent = cost(tally["prompt_tokens"], tally["cached_tokens"], tally["output_tokens"])
+    return (
+        f"[{finished}/{tally['total']}] generated {tally['done']}, already stored {tally['stored']}, "
+        f"failed {tally['failed']} | {tally['prompt_tokens'] + tally['output_tokens']} tokens, "
+        f"${spent:.4f} | {elapsed:.0f}s elapsed, ~{remaining:.0f}s left"
+    )
+
+
+def format_summary(summary):
+    jobs = ", ".join(f"{status} {count}" for status, count in summary["jobs"].items())
+    tokens = summary["tokens"]
+    return (
+        f"Jobs: {jobs}\n"
+        f"Tokens: prompt {tokens['prompt']} (cached {tokens['cached']}), output {tokens['output']}\n"
+        f"Estimated cost: ${summary['cost_usd']:.4f}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate deep reports for the most requested charts")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="queue the top charts and generate their reports")
+    run_parser.add_argument("--top", type=int, default=100, help="number of most requested charts to cover")
+    run_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    run_parser.add_argument("--tpm", type=int, default=DEFAULT_TOKENS_PER_MINUTE, help="tokens per minute budget")
+    run_parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS)
+    commands.add_parser("status", help="show job progress and cost")
+    args = parser.parse_args(argv)
+
+    store = ReportStore.from_env()
+    if store is None:
+        parser.error("REPORT_STORE_PATH is empty; pre-generated reports are kept in the report store")
+    queue = JobQueue(store.path)
+
+    if args.command == "run":
+        from .generator import DeepReportGenerator
+
+        interpreter = SajuInterpreter()
+        added = queue.enqueue(rank_jobs(store, interpreter, args.top))
+        print(f"Queued {added} new charts from the top {args.top}")
+        generator = DeepReportGenerator(store=store)
+        asyncio.run(run(
+            generator, queue, interpreter, args.workers, args.tpm, args.max_attempts,
+            progress=lambda tally: print(format_progress(tally), flush=True)
+        ))
+    print(format_summary(queue.summary()))
+
+
+if __name__ == '__main__':
+    main()
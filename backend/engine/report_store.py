@@ -0,0 +1,166 @@
+"""
+Report Store Module
+Disk-backed, content-addressed store for generated deep reports.
+SQLite in WAL mode, so every uvicorn worker on a host can share one file.
+Bodies are zlib-compressed; entries expire after a TTL and the least
+recently read entries are evicted once the store grows past its size cap.
+The same file keeps per-chart request counts, which rank charts for
+pre-generation (engine.pregen).
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), '..', 'reports.sqlite3')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    key      TEXT PRIMARY KEY,
+    body     BLOB NOT NULL,
+    size     INTEGER NOT NULL,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_accessed ON reports (accessed);
+CREATE TABLE IF NOT EXISTS chart_requests (
+    chart    INTEGER PRIMARY KEY,
+    requests INTEGER NOT NULL,
+    last     REAL NOT NULL
+);
+"""
+
+
+def report_key(inputs):
+    """Content address of a report: SHA-256 of its prompt inputs as canonical JSON."""
+    canonical = json.dumps(inputs, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ReportStore:
+    """Persistent report cache shared by all worker processes on one host."""
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=256 * 1024 * 1024, ttl_seconds=365 * 86400, clock=time.time):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock  # wall-clock seconds; entries from other processes are compared against it
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._schema_ready = False
+
+    @classmethod
+    def from_env(cls):
+        """
+        Configured by REPORT_STORE_PATH (empty disables the store),
+        REPORT_STORE_MAX_MB and REPORT_STORE_TTL_DAYS.
+        """
+        path = os.environ.get("REPORT_STORE_PATH", DEFAULT_PATH)
+        if not path:
+            return None
+        return cls(
+            path=path,
+            max_bytes=int(float(os.environ.get("REPORT_STORE_MAX_MB", "256")) * 1024 * 1024),
+            ttl_seconds=int(float(os.environ.get("REPORT_STORE_TTL_DAYS", "365")) * 86400),
+        )
+
+    def _conn(self):
+        """One connection per thread; SQLite connections must not cross threads."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._schema_ready:
+                conn.executescript(_SCHEMA)
+                self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """Returns the stored report text, or None when absent or expired."""
+        now = self.clock()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT body FROM reports WHERE key = ? AND created > ?",
+            (key, now - self.ttl_seconds)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        conn.execute("UPDATE reports SET accessed = ? WHERE key = ?", (now, key))
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def put(self, key, report):
+        """Stores a report, then drops expired entries and evicts down to the size cap."""
+        now = self.clock()
+        body = zlib.compress(report.encode("utf-8"), 6)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO reports (key, body, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, body, len(body), now, now)
+            )
+            conn.execute("DELETE FROM reports WHERE created <= ?", (now - self.ttl_seconds,))
+            self._evict(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM reports").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM reports ORDER BY accessed"):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM reports WHERE key = ?", victims)
+
+    def add_requests(self, counts):
+        """Adds per-chart request counts ({chart key: requests}) to the popularity table."""
+        if not counts:
+            return
+        now = self.clock()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO chart_requests (chart, requests, last) VALUES (?, ?, ?) "
+                "ON CONFLICT (chart) DO UPDATE SET requests = requests + excluded.requests, last = excluded.last",
+                [(int(chart), n, now) for chart, n in counts.items()]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def popular_charts(self, limit):
+        """The `limit` most requested chart keys as (chart, requests), most requested first."""
+        return self._conn().execute(
+            "SELECT chart, requests FROM chart_requests ORDER BY requests DESC, chart LIMIT ?", (limit,)
+        ).fetchall()
+
+    def stats(self):
+        count, size = self._conn().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM reports"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,114 @@
+"""
+Single-Flight Module
+Coalesces concurrent identical work: the first caller for a key runs it,
+callers arriving while it is in flight wait and receive the same result.
+"""
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread-based single-flight group for the sync paths."""
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args):
+        """Runs fn(*args) once per key at a time; concurrent callers share its outcome."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    asyncio single-flight group. The shared work runs as its own task, so a
+    leader whose request is cancelled does not cancel it for the followers.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._futures = {}
+
+    def claim(self, key):
+        """
+        Returns (future, is_leader). A leader must settle the future with
+        resolve() or fail(); followers simply await it.
+        """
+        future = self._futures.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return future, False
+        future = self._futures[key] = asyncio.get_running_loop().create_future()
+        future.add_done_callback(lambda _: self._futures.pop(key, None))
+        self.leaders += 1
+        return future, True
+
+    @staticmethod
+    def resolve(future, result):
+        if not future.done():
+            future.set_result(result)
+
+    @staticmethod
+    def fail(future, error):
+        if not future.done():
+            future.set_exception(error)
+            future.exception()  # mark retrieved when nobody else was waiting
+
+    async def do(self, key, fn, *args):
+        """Awaits fn(*args) once per key at a time; concurrent callers share its outcome."""
+        future, leader = self.claim(key)
+        if leader:
+            task = asyncio.ensure_future(fn(*args))
+
+            def settle(done):
+                if done.cancelled():
+                    self.fail(future, asyncio.CancelledError())
+                elif done.exception() is not None:
+                    self.fail(future, done.exception())
+                else:
+                    self.resolve(future, done.result())
+
+            task.add_done_callback(settle)
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._futures)}
@@ -0,0 +1,93 @@
+"""
+Solar Terms (절기 / 節氣) Table
+Exact instants of the 24 solar terms for 1900-2100, stored as a sorted
+little-endian int64 array of UTC epoch seconds in `solar_terms.bin`.
+
+The file is memory-mapped read-only, so every worker on a host shares the
+same pages. Entry 0 is Sohan (소한, 285°) of January 1900; entry i sits at
+solar longitude 285° + 15° * i, so even entries are the 12 Jeol (節) terms
+that open the Saju months.
+
+Rebuild (requires `ephem`):  python -m engine.solar_terms
+"""
+import math
+import mmap
+import os
+
+TERMS_PATH = os.path.join(os.path.dirname(__file__), '..', 'solar_terms.bin')
+
+FIRST_YEAR = 1900
+LAST_YEAR = 2100
+
+# Saju year of the Chuk (丑) month opened by entry 0 (Sohan, Jan 1900)
+_FIRST_SAJU_YEAR = FIRST_YEAR - 1
+_FIRST_LONGITUDE = 285
+
+_terms = None
+
+
+def get_terms():
+    """Returns the term table as a memoryview of native int64 (mapped on first use)."""
+    global _terms
+    if _terms is None:
+        with open(TERMS_PATH, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _terms = memoryview(buf).cast('q')
+    return _terms
+
+
+def get_terms_array():
+    """Returns the term table as a read-only NumPy int64 view over the same mapping."""
+    import numpy as np
+    return np.frombuffer(get_terms(), dtype='<i8')
+
+
+def jeol_to_year_month(jeol):
+    """
+    Maps a Jeol number (count of Jeol terms since Sohan 1900) to
+    (saju_year, month_ji). Works on ints and NumPy arrays.
+    """
+    return _FIRST_SAJU_YEAR + (jeol + 11) // 12, (jeol + 1) % 12
+
+
+def _sun_longitude(d):
+    """Apparent geocentric ecliptic longitude of the Sun (radians, equinox of date)."""
+    import ephem
+    sun = ephem.Sun(d)
+    equatorial = ephem.Equatorial(sun.g_ra, sun.g_dec, epoch=d)
+    return float(ephem.Ecliptic(equatorial, epoch=d).lon)
+
+
+def build(path=TERMS_PATH):
+    """Computes every term instant from Sohan 1900 through the end of 2100 and writes the table."""
+    import ephem
+    import numpy as np
+
+    unix_epoch = ephem.Date('1970/1/1')
+    end = ephem.Date(f'{LAST_YEAR + 1}/1/1')
+    guess = ephem.Date(f'{FIRST_YEAR}/1/6')
+
+    instants = []
+    i = 0
+    while True:
+        target = math.radians((_FIRST_LONGITUDE + 15 * i) % 360)
+
+        def offset(d):
+            return (_sun_longitude(d) - target + math.pi) % (2 * math.pi) - math.pi
+
+        instant = ephem.newton(offset, guess, guess + 1)
+        if instant >= end:
+            break
+        instants.append(round((instant - unix_epoch) * 86400))
+        guess = ephem.Date(instant + 15.2)
+        i += 1
+
+    table = np.asarray(instants, dtype='<i8')
+    assert np.all(np.diff(table) > 0), "solar term table must be strictly increasing"
+    table.tofile(path)
+    return len(table)
+
+
+if __name__ == '__main__':
+    count = build()
+    print(f"Wrote {count} solar terms to {os.path.abspath(TERMS_PATH)}")
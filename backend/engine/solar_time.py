@@ -0,0 +1,371 @@
+"""
+Solar Time Module
+Historical UTC offsets and true local solar time (진태양시) for birth instants.
+
+Birth times are civil wall-clock times. Turning one into an instant needs the
+UTC offset in force at the time, which in Korea has not always been UTC+9:
+local mean time until 1908, UTC+8:30 in 1908-1911 and 1954-1961, and summer
+time in 1948-1951, 1955-1960 and 1987-1988. That table is built in; other
+zones are read once from the compiled IANA database (the TZif files zoneinfo
+uses: explicit transitions, then the POSIX TZ rule for later years) and a
+fixed offset such as "+09:00" works anywhere.
+
+The hour pillar follows the Sun rather than the clock: true solar time is
+the UTC instant plus four minutes per degree of east longitude plus the
+equation of time (apparent minus mean solar time, within about +-16 minutes).
+The equation of time is tabulated once per day for 1900-2100 as int16
+seconds in `equation_of_time.bin`, memory-mapped like the solar term table,
+so the whole correction is two lookups.
+
+Rebuild (requires `ephem`):  python -m engine.solar_time
+"""
+import calendar
+import functools
+import math
+import mmap
+import os
+import re
+import struct
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+EOT_PATH = os.path.join(os.path.dirname(__file__), '..', 'equation_of_time.bin')
+
+FIRST_YEAR = 1900
+LAST_YEAR = 2100
+
+# Unix day number of the first table entry (1900-01-01)
+_FIRST_DAY = -25567
+
+# Korean civil time: (old wall clock at which the change happens, new offset in seconds)
+_KOREA_LMT = 30472  # UTC+8:27:52, Seoul local mean time
+_KOREA_CHANGES = (
+    ((1908, 4, 1, 0, 0), 30600),
+    ((1912, 1, 1, 0, 0), 32400),
+    ((1948, 6, 1, 0, 0), 36000),
+    ((1948, 9, 13, 0, 0), 32400),
+    ((1949, 4, 3, 0, 0), 36000),
+    ((1949, 9, 11, 0, 0), 32400),
+    ((1950, 4, 1, 0, 0), 36000),
+    ((1950, 9, 10, 0, 0), 32400),
+    ((1951, 5, 6, 0, 0), 36000),
+    ((1951, 9, 9, 0, 0), 32400),
+    ((1954, 3, 21, 0, 0), 30600),
+    ((1955, 5, 5, 0, 0), 34200),
+    ((1955, 9, 9, 0, 0), 30600),
+    ((1956, 5, 20, 0, 0), 34200),
+    ((1956, 9, 30, 0, 0), 30600),
+    ((1957, 5, 5, 0, 0), 34200),
+    ((1957, 9, 22, 0, 0), 30600),
+    ((1958, 5, 4, 0, 0), 34200),
+    ((1958, 9, 21, 0, 0), 30600),
+    ((1959, 5, 3, 0, 0), 34200),
+    ((1959, 9, 20, 0, 0), 30600),
+    ((1960, 5, 1, 0, 0), 34200),
+    ((1960, 9, 18, 0, 0), 30600),
+    ((1961, 8, 10, 0, 0), 32400),
+    ((1987, 5, 10, 2, 0), 36000),
+    ((1987, 10, 11, 3, 0), 32400),
+    ((1988, 5, 8, 2, 0), 36000),
+    ((1988, 10, 9, 3, 0), 32400),
+)
+_KOREA_NAMES = {"asia/seoul", "rok", "kst"}
+
+_FIXED_OFFSET = re.compile(r"^(?:utc|gmt)?\s*([+-])(\d{1,2})(?::?(\d{2}))?$")
+
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+
+def _wall_seconds(dt):
+    return int((dt - _UNIX_EPOCH).total_seconds())
+
+
+_TZIF_HEADER = struct.Struct(">4sc15x6l")
+_POSIX_OFFSET = r"[+-]?\d+(?::\d+){0,2}"
+_POSIX_NAME = r"(?:<[^>]+>|[A-Za-z]+)"
+_POSIX_TZ = re.compile(
+    rf"^{_POSIX_NAME}({_POSIX_OFFSET})(?:{_POSIX_NAME}({_POSIX_OFFSET})?,([^,]+),([^,]+))?$"
+)
+
+_zone_names = None
+
+
+def get_zone_names():
+    """Lower-cased IANA zone name -> canonical name, for every zone zoneinfo lists (read on first use)."""
+    global _zone_names
+    if _zone_names is None:
+        from zoneinfo import available_timezones
+        _zone_names = {zone.lower(): zone for zone in available_timezones()}
+    return _zone_names
+
+
+def _zone_name(name):
+    """Canonical IANA name for `name`, matched regardless of case and surrounding space."""
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+    zone = get_zone_names().get(name.strip().lower())
+    if zone is None:
+        # Zones zoneinfo can load but does not list (e.g. from a custom TZPATH)
+        try:
+            ZoneInfo(name.strip())
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone: {name!r}") from None
+        zone = name.strip()
+    return zone
+
+
+def zone_key(timezone=None):
+    """
+    Normalised form of a timezone spec, cheap to compute: None for Korean civil
+    time, an offset in seconds for "UTC" or "+HH:MM", else the canonical IANA
+    name. Raises ValueError for anything else.
+    """
+    if timezone is None:
+        return None
+    spec = timezone.strip().lower()
+    if spec in _KOREA_NAMES:
+        return None
+    if spec in ("utc", "gmt", "z"):
+        return 0
+    fixed = _FIXED_OFFSET.match(spec)
+    if fixed:
+        sign, hours, minutes = fixed.groups()
+        seconds = int(hours) * 3600 + int(minutes or 0) * 60
+        if seconds > 14 * 3600:
+            raise ValueError(f"UTC offset out of range: {timezone!r}")
+        return -seconds if sign == "-" else seconds
+    return _zone_name(timezone)
+
+
+def _tzif_data(name):
+    """Compiled TZif data for an IANA zone, from where zoneinfo looks: TZPATH, then the tzdata package."""
+    import zoneinfo
+    from importlib import resources
+
+    for root in zoneinfo.TZPATH:
+        path = os.path.join(root, name)
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                return f.read()
+    return resources.files("tzdata.zoneinfo").joinpath(name).read_bytes()
+
+
+def _parse_tzif(data):
+    """(transition instants, local time type per transition, UTC offset per type, POSIX TZ footer)."""
+    magic, version, isutcnt, isstdcnt, leapcnt, timecnt, typecnt, charcnt = _TZIF_HEADER.unpack_from(data)
+    if magic != b"TZif":
+        raise ValueError("Not a TZif file")
+    pos, time_size = _TZIF_HEADER.size, 4
+    if version >= b"2":
+        # Skip the 32-bit block; the 64-bit one after it covers every year
+        pos += timecnt * 5 + typecnt * 6 + charcnt + leapcnt * 8 + isstdcnt + isutcnt
+        _, _, isutcnt, isstdcnt, leapcnt, timecnt, typecnt, charcnt = _TZIF_HEADER.unpack_from(data, pos)
+        pos, time_size = pos + _TZIF_HEADER.size, 8
+
+    times = struct.unpack_from(f">{timecnt}{'q' if time_size == 8 else 'l'}", data, pos)
+    pos += timecnt * time_size
+    kinds = data[pos:pos + timecnt]
+    pos += timecnt
+    offsets = [struct.unpack_from(">l", data, pos + 6 * i)[0] for i in range(typecnt)]
+    pos += typecnt * 6 + charcnt + leapcnt * (time_size + 4) + isstdcnt + isutcnt
+    footer = data[pos:].split(b"\n")[1].decode("ascii") if version >= b"2" else ""
+    return times, kinds, offsets, footer
+
+
+def _posix_seconds(text):
+    """Seconds in a POSIX TZ "[+-]hh[:mm[:ss]]" field."""
+    sign = -1 if text.startswith("-") else 1
+    parts = [int(part) for part in text.lstrip("+-").split(":")]
+    return sign * sum(part * unit for part, unit in zip(parts, (3600, 60, 1)))
+
+
+def _rule_seconds(rule, year):
+    """Local seconds since 1970-01-01 (naive) at which a POSIX TZ rule ("Mm.w.d", "Jn" or "n", "/time") fires."""
+    date_rule, _, at = rule.partition("/")
+    if date_rule.startswith("M"):
+        month, week, weekday = (int(part) for part in date_rule[1:].split("."))
+        first = datetime(year, month, 1)
+        # POSIX weekdays count from Sunday
+        day = 1 + (weekday - (first.weekday() + 1)) % 7 + (week - 1) * 7
+        while day > calendar.monthrange(year, month)[1]:
+            day -= 7
+        date = first.replace(day=day)
+    elif date_rule.startswith("J"):
+        # 1-365, never counting February 29
+        julian = int(date_rule[1:])
+        date = datetime(year, 1, 1) + timedelta(days=julian - 1 + (calendar.isleap(year) and julian >= 60))
+    else:
+        date = datetime(year, 1, 1) + timedelta(days=int(date_rule))
+    return _wall_seconds(date) + (_posix_seconds(at) if at else 7200)
+
+
+def _footer_changes(footer, after, last_year):
+    """[(UTC instant, new offset)] from a POSIX TZ rule, for changes after `after` up to `last_year`."""
+    match = _POSIX_TZ.match(footer)
+    if not match or match.group(3) is None:
+        return []
+    std_text, dst_text, start_rule, end_rule = match.groups()
+    std = -_posix_seconds(std_text)
+    dst = -_posix_seconds(dst_text) if dst_text else std + 3600
+    changes = []
+    first_year = datetime(1970, 1, 1).year + int(after // (365.2425 * 86400))
+    for year in range(max(first_year - 1, FIRST_YEAR), last_year + 1):
+        # The start rule is in standard time, the end rule in summer time
+        changes.append((_rule_seconds(start_rule, year) - std, dst))
+        changes.append((_rule_seconds(end_rule, year) - dst, std))
+    return sorted(change for change in changes if change[0] > after)
+
+
+def _zone_changes(name):
+    """(UTC offset before the first change, [(old wall clock, new offset)]) from the zone's TZif data."""
+    times, kinds, offsets, footer = _parse_tzif(_tzif_data(name))
+    # Before its first transition a zone is on its first local time type
+    initial = offsets[0] if offsets else 0
+    changes = [(t, offsets[k]) for t, k in zip(times, kinds)]
+    changes += _footer_changes(footer, times[-1] if times else -2**63, LAST_YEAR)
+
+    start = _FIRST_DAY * 86400
+    end = _wall_seconds(datetime(LAST_YEAR + 1, 1, 1))
+    first = initial
+    for instant, offset in changes:
+        if instant > start:
+            break
+        first = offset
+    previous = first
+    wall_changes = []
+    for instant, offset in changes:
+        if start < instant <= end and offset != previous:
+            wall_changes.append((instant + previous, offset))
+            previous = offset
+    return first, wall_changes
+
+
+def offset_table(timezone=None):
+    """
+    (change points, offsets) for a timezone: offsets[i] applies to wall-clock
+    seconds before change point i and offsets[-1] after the last. `timezone`
+    is None (Korean civil time), an IANA name or a fixed offset like "+09:00".
+    An ambiguous wall time (clocks turned back) takes the earlier offset.
+    """
+    return _offset_table(zone_key(timezone))
+
+
+# Keyed by zone_key(), so there is at most one entry per zone or fixed offset
+@functools.lru_cache(maxsize=None)
+def _offset_table(key):
+    if key is None:
+        first = _KOREA_LMT
+        changes = [(_wall_seconds(datetime(*when)), offset) for when, offset in _KOREA_CHANGES]
+    elif isinstance(key, int):
+        return (), (key,)
+    else:
+        first, changes = _zone_changes(key)
+    return tuple(t for t, _ in changes), (first,) + tuple(o for _, o in changes)
+
+
+def utc_offset(wall_seconds, timezone=None):
+    """UTC offset in seconds for a wall-clock time given as seconds since 1970-01-01 00:00 (naive)."""
+    points, offsets = offset_table(timezone)
+    return offsets[bisect_right(points, wall_seconds)]
+
+
+def utc_offsets(wall_seconds, timezone=None):
+    """Vectorized utc_offset() over an int64 array."""
+    import numpy as np
+
+    points, offsets = offset_table(timezone)
+    table = np.asarray(offsets, dtype=np.int64)
+    return table[np.searchsorted(np.asarray(points, dtype=np.int64), wall_seconds, side="right")]
+
+
+_eot = None
+
+
+def get_eot():
+    """Returns the equation-of-time table as a memoryview of native int16 (mapped on first use)."""
+    global _eot
+    if _eot is None:
+        with open(EOT_PATH, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _eot = memoryview(buf).cast('h')
+    return _eot
+
+
+def get_eot_array():
+    """Returns the equation-of-time table as a read-only NumPy int16 view over the same mapping."""
+    import numpy as np
+    return np.frombuffer(get_eot(), dtype='<i2')
+
+
+def _approximate_eot(unix_day):
+    """Equation of time (seconds) from the low-precision solar ephemeris, for days outside the table."""
+    d = unix_day - 10957  # days from J2000.0 (noon UT)
+    g = math.radians(357.529 + 0.98560028 * d)
+    q = 280.459 + 0.98564736 * d
+    lon = math.radians(q + 1.915 * math.sin(g) + 0.020 * math.sin(2 * g))
+    e = math.radians(23.439 - 0.00000036 * d)
+    ra = math.degrees(math.atan2(math.cos(e) * math.sin(lon), math.cos(lon)))
+    return round(((q - ra + 180) % 360 - 180) * 240)
+
+
+def equation_of_time(unix_day):
+    """Apparent minus mean solar time in seconds on a day (days since 1970-01-01)."""
+    table = get_eot()
+    idx = unix_day - _FIRST_DAY
+    if 0 <= idx < len(table):
+        return table[idx]
+    return _approximate_eot(unix_day)
+
+
+def true_solar_time(instant, longitude):
+    """Local apparent solar time at `longitude` (degrees east) for a Unix instant, as Unix-scale seconds."""
+    mean = instant + round(longitude * 240)
+    return mean + equation_of_time(mean // 86400)
+
+
+def true_solar_times(instants, longitude):
+    """Vectorized true_solar_time(); `longitude` may be a scalar or an array."""
+    import numpy as np
+
+    shift = np.rint(np.asarray(longitude, dtype=np.float64) * 240).astype(np.int64)
+    mean = np.asarray(instants, dtype=np.int64) + shift
+    days = mean // 86400
+    idx = days - _FIRST_DAY
+    table = get_eot_array()
+    inside = (idx >= 0) & (idx < len(table))
+    eot = table[np.where(inside, idx, 0)].astype(np.int64)
+    if not inside.all():
+        outside = ~inside
+        eot[outside] = [_approximate_eot(int(d)) for d in days[outside]]
+    return mean + eot
+
+
+def build(path=EOT_PATH):
+    """Computes the equation of time at 12:00 UT for every day of 1900-2100 and writes the table."""
+    import ephem
+    import numpy as np
+
+    observer = ephem.Observer()
+    observer.lon = observer.lat = '0'
+    observer.pressure = 0
+    sun = ephem.Sun()
+
+    first = ephem.Date(f'{FIRST_YEAR}/1/1 12:00')
+    days = int(ephem.Date(f'{LAST_YEAR + 1}/1/1 12:00') - first)
+    values = []
+    for i in range(days):
+        observer.date = first + i
+        sun.compute(observer)
+        # At 12:00 UT on the Greenwich meridian the mean Sun's hour angle is zero,
+        # so the true Sun's hour angle is the equation of time
+        hour_angle = (float(observer.sidereal_time()) - float(sun.ra) + math.pi) % (2 * math.pi) - math.pi
+        values.append(round(hour_angle * 86400 / (2 * math.pi)))
+
+    table = np.asarray(values, dtype='<i2')
+    table.tofile(path)
+    return len(table)
+
+
+if __name__ == '__main__':
+    count = build()
+    print(f"Wrote {count} days of the equation of time to {os.path.abspath(EOT_PATH)}")
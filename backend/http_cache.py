@@ -0,0 +1,97 @@
+"""
+HTTP caching helpers for GET /chart.
+Strong ETags, If-None-Match matching and Accept-Encoding negotiation
+(brotli when the optional `brotli` package is installed, then gzip).
+"""
+import gzip
+import hashlib
+import os
+
+# Files whose contents determine a chart's analysis body
+_VERSIONED_FILES = (
+    "engine/calculator.py", "engine/chart.py", "engine/constants.py", "engine/interpreter.py",
+    "engine/solar_terms.py", "engine/solar_time.py", "saju_data.json", "solar_terms.bin", "equation_of_time.bin",
+)
+
+_data_version = None
+_brotli = None
+
+
+def data_version():
+    """Short digest of the engine code and data tables; changes whenever a chart's body could."""
+    global _data_version
+    if _data_version is None:
+        digest = hashlib.sha256()
+        root = os.path.dirname(__file__)
+        for name in _VERSIONED_FILES:
+            with open(os.path.join(root, name), "rb") as f:
+                digest.update(f.read())
+        _data_version = digest.hexdigest()[:12]
+    return _data_version
+
+
+def _brotli_module():
+    """The brotli module, or False when it is not installed (checked once)."""
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli
+
+
+def _accepted(accept_encoding):
+    """Codings from an Accept-Encoding header with a non-zero q-value."""
+    codings = set()
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            codings.add(coding.strip().lower())
+    return codings
+
+
+def negotiate(accept_encoding):
+    """Content-Coding to send: "br", "gzip" or "identity"."""
+    codings = _accepted(accept_encoding)
+    if ("br" in codings or "*" in codings) and _brotli_module():
+        return "br"
+    if "gzip" in codings or "*" in codings:
+        return "gzip"
+    return "identity"
+
+
+def encode(body, coding):
+    if coding == "br":
+        return _brotli_module().compress(body, quality=11)
+    if coding == "gzip":
+        return gzip.compress(body, compresslevel=9, mtime=0)
+    return body
+
+
+def etag(chart, coding):
+    """
+    Strong ETag for a chart's body in one content-coding: each coding is a
+    different byte sequence, so each gets its own validator.
+    """
+    suffix = "" if coding == "identity" else f"-{coding}"
+    return f'"{int(chart):07x}-{data_version()}{suffix}"'
+
+
+def not_modified(if_none_match, tag):
+    """Whether an If-None-Match header matches `tag` (weak comparison, as RFC 9110 specifies for it)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == tag:
+            return True
+    return False
@@ -1,73 +1,132 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
-import requests
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import asyncio
+import importlib
+import json
+import logging
 import os
-from dotenv import load_dotenv
+import sqlite3
+import time
 
-# Load environment variables
-load_dotenv(os.path.join(os.path.dirname(__file__), '../frontend/.env.local'))
+# Load environment variables (deployments set them directly and skip python-dotenv)
+ENV_FILE = os.getenv("SOULSTAT_ENV_FILE", os.path.join(os.path.dirname(__file__), '../frontend/.env.local'))
+if os.path.exists(ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(ENV_FILE)
 
 # Import from the new modular engine package
 from engine import SajuEngine
+from engine.cache import ChartCounter, LRUCache
+from engine import compatibility, luck, metrics
+from engine.chart import Chart
+from engine.index import get_index
+from engine.solar_terms import get_terms
+from engine.solar_time import get_eot, get_zone_names, zone_key
+from batch import BodyStreamingResponse, stream_analysis
+import http_cache
+from payments import PayPalClient
 from datetime import datetime
 
-# PayPal Configuration
-PAYPAL_CLIENT_ID = os.getenv("NEXT_PUBLIC_PAYPAL_CLIENT_ID")
-PAYPAL_CLIENT_SECRET = os.getenv("PAYPAL_CLIENT_SECRET")
-PAYPAL_API_BASE = "https://api-m.sandbox.paypal.com"  # Change to "https://api-m.paypal.com" for production
+logger = logging.getLogger(__name__)
+
+# PayPal Configuration (long-lived pooled client, token cached across requests)
+paypal = PayPalClient.from_env()
+
 
 def verify_payment(payment_id: str) -> bool:
     """Verifies the payment with PayPal API."""
-    if not PAYPAL_CLIENT_ID or not PAYPAL_CLIENT_SECRET:
-        print("PayPal credentials missing")
-        return False
-    
+    return paypal.verify(payment_id)
+
+
+async def averify_payment(payment_id: str) -> bool:
+    """Async variant of verify_payment for the async endpoints."""
+    return await paypal.averify(payment_id)
+
+
+# Seconds after startup before the LLM and payment stacks are loaded; WARMUP=0 turns it off
+WARMUP_DELAY = float(os.getenv("WARMUP_DELAY_SECONDS", "1.0"))
+
+
+def warm_up():
+    """Imports google.genai and the HTTP clients so the first paid request doesn't wait on them."""
+    t0 = time.perf_counter()
     try:
-        # 1. Get Access Token
-        auth_response = requests.post(
-            f"{PAYPAL_API_BASE}/v1/oauth2/token",
-            auth=(PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET),
-            data={"grant_type": "client_credentials"}
-        )
-        if auth_response.status_code != 200:
-            print(f"Failed to get access token: {auth_response.text}")
-            return False
-            
-        access_token = auth_response.json().get("access_token")
-        
-        # 2. Verify Order Details
-        order_response = requests.get(
-            f"{PAYPAL_API_BASE}/v2/checkout/orders/{payment_id}",
-            headers={"Authorization": f"Bearer {access_token}"}
-        )
-        
-        if order_response.status_code != 200:
-            print(f"Failed to get order details: {order_response.text}")
-            return False
-            
-        order_data = order_response.json()
-        status = order_data.get("status")
-        
-        # Check if completed or approved (depending on flow, simplified to captured/completed here)
-        if status == "COMPLETED":
-            return True
-        elif status == "APPROVED":
-            # If strictly checking for capture, this might be insufficient, but for now we accept it and assume capture happens on client
-            # Ideally we should trigger capture here if not captured, but the client code calls capture.
-            # Let's check logic: Client capture() -> onSuccess with details -> Backend verify.
-            # So status should be COMPLETED.
-            return False
-            
-        print(f"Payment status invalid: {status}")
-        return False
-        
-    except Exception as e:
-        print(f"Payment verification error: {e}")
-        return False
+        engine.generator.warm()
+        paypal.warm()
+    except Exception:
+        logger.exception("Warm-up failed")
+        return
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - t0)
+
+
+def preload():
+    """
+    Loads everything workers only read, for a pre-fork master (serve.py), so
+    forked workers share it instead of each building a copy: the solar term
+    and equation-of-time tables, the timezone names, the /chart ETag version,
+    the compatibility pool, the chart index (PRELOAD_CHART_INDEX=1), and the
+    Gemini and HTTP client modules the warm-up would otherwise import once per
+    worker.
+    """
+    get_terms()
+    get_eot()
+    get_zone_names()
+    http_cache.data_version()
+    compatibility.get_pool()
+    if os.getenv("PRELOAD_CHART_INDEX") == "1":
+        get_index(engine.calculator, engine.interpreter)
+    engine.generator  # creates the generator, importing google.genai
+    for module in ("requests", "httpx"):
+        importlib.import_module(module)
+
+
+# Requests per chart, drained into the report store where engine.pregen ranks them
+chart_requests = ChartCounter()
+CHART_COUNTS_FLUSH_SECONDS = float(os.getenv("CHART_COUNTS_FLUSH_SECONDS", "60"))
 
-app = FastAPI(title="Soul Stat API", version="0.4.0")
+
+def flush_chart_requests():
+    counts = chart_requests.drain()
+    if engine.report_store is None:
+        return
+    try:
+        engine.report_store.add_requests(counts)
+    except sqlite3.Error as e:
+        metrics.count_error("report_store", e)
+        logger.warning("Chart request counts were not saved: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    warming = None
+    if os.getenv("WARMUP", "1") != "0":
+        async def warm_later():
+            # Startup has finished and the server is accepting connections by the time this runs
+            await asyncio.sleep(WARMUP_DELAY)
+            await asyncio.to_thread(warm_up)
+
+        warming = asyncio.create_task(warm_later())
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(CHART_COUNTS_FLUSH_SECONDS)
+            await asyncio.to_thread(flush_chart_requests)
+
+    flushing = asyncio.create_task(flush_periodically())
+    yield
+    if warming is not None:
+        warming.cancel()
+    flushing.cancel()
+    await asyncio.to_thread(flush_chart_requests)
+    paypal.close()
+    await paypal.aclose()
+
+
+app = FastAPI(title="Soul Stat API", version="0.4.0", lifespan=lifespan)
 
 # Configure CORS
 origins = [
@@ -82,20 +141,73 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 engine = SajuEngine()
 
 
-class AnalyzeRequest(BaseModel):
+class BirthPlace(BaseModel):
+    """
+    Optional birthplace details. A longitude (degrees east) puts the day and hour
+    pillars on true solar time; timezone is an IANA name or "+HH:MM" offset for
+    births outside Korea (default: Korean civil time, with its historical offsets).
+    """
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    timezone: Optional[str] = None
+
+    @field_validator("timezone")
+    @classmethod
+    def known_timezone(cls, value):
+        if value is not None:
+            zone_key(value)  # raises ValueError for unknown zones; the offset table is built when charting
+        return value
+
+
+class AnalyzeRequest(BirthPlace):
     birthDate: str
     birthTime: str = "00:00"
 
 
-class DeepAnalyzeRequest(BaseModel):
+class DeepAnalyzeRequest(BirthPlace):
     birthDate: str
     birthTime: str = "00:00"
     paymentId: str  # Made mandatory
+    gender: Optional[str] = None  # "male" / "female"; adds real Daewoon/Seun pillars to the report
+
+    @field_validator("gender")
+    @classmethod
+    def known_gender(cls, value):
+        if value:
+            luck.parse_gender(value)  # raises ValueError for anything but male/female
+        return value
+
+
+class Candidate(BaseModel):
+    id: str
+    birthDate: str
+    birthTime: str = "00:00"
+
+
+class CompatibilityRequest(BirthPlace):
+    birthDate: str
+    birthTime: str = "00:00"
+    k: int = Field(10, ge=1, le=100)
+    # Scored instead of the server-side pool when given
+    candidates: Optional[List[Candidate]] = Field(None, max_length=100000)
+
+
+class LuckRequest(BirthPlace):
+    birthDate: str
+    birthTime: str = "00:00"
+    gender: str
+    years: int = Field(100, ge=1, le=150)
+
+    @field_validator("gender")
+    @classmethod
+    def known_gender(cls, value):
+        luck.parse_gender(value)
+        return value
 
 
 @app.get("/")
@@ -103,47 +215,385 @@ def read_root():
     return {"message": "Soul Stat API v0.4.0 is running", "status": "ok"}
 
 
+# Final /analyze bodies keyed by chart; there are far fewer distinct charts than requests
+analyze_cache = LRUCache(maxsize=int(os.getenv("ANALYZE_CACHE_SIZE", "4096")))
+
+# Stage timers bound once, so the hot path skips the label lookup
+_DATE_PARSE_SECONDS = metrics.STAGE_SECONDS.labels("date_parse")
+_COMPUTE_SECONDS = metrics.STAGE_SECONDS.labels("compute_saju")
+_ANALYZE_SECONDS = metrics.STAGE_SECONDS.labels("analyze_stats")
+
+
+def _cache_stats():
+    stats = {"analyze": analyze_cache.stats(), "encoded": encoded_cache.stats(), "luck": luck_cache.stats()}
+    if engine.report_store is not None:
+        stats["reports"] = engine.report_store.stats()
+    return stats
+
+
+def _cache_lookups():
+    for name, stats in _cache_stats().items():
+        yield (name, "hit"), stats["hits"]
+        yield (name, "miss"), stats["misses"]
+
+
+def _cache_hit_ratios():
+    for name, stats in _cache_stats().items():
+        yield (name,), stats["hit_ratio"]
+
+
+def _deep_flights():
+    if not engine.generator_loaded:
+        return
+    for mode, flights in (("sync", engine.generator.flights), ("async", engine.generator.aflights)):
+        stats = flights.stats()
+        yield (mode, "leader"), stats["leaders"]
+        yield (mode, "coalesced"), stats["coalesced"]
+
+
+metrics.Gauge("soulstat_cache_lookups", "Cache lookups by result", ("cache", "result"), _cache_lookups)
+metrics.Gauge("soulstat_cache_hit_ratio", "Cache hit ratio", ("cache",), _cache_hit_ratios)
+metrics.Gauge("soulstat_deep_requests", "Deep report requests that generated (leader) or shared a generation",
+              ("mode", "role"), _deep_flights)
+
+
+def parse_birth(birth_date: str, birth_time: str) -> datetime:
+    t0 = time.perf_counter()
+    dt = datetime.strptime(f"{birth_date} {birth_time}", "%Y-%m-%d %H:%M")
+    _DATE_PARSE_SECONDS.observe(time.perf_counter() - t0)
+    return dt
+
+
+def chart_data(dt: datetime, gender: Optional[str] = None, longitude: Optional[float] = None,
+               timezone: Optional[str] = None) -> dict:
+    """
+    Pillars merged with their analysis, as the deep report generator takes them;
+    with a gender, also the Daewoon flow and this year's Seun.
+    """
+    t0 = time.perf_counter()
+    chart = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour, dt.minute, longitude, timezone)
+    t1 = time.perf_counter()
+    chart_requests.count(chart)
+    _COMPUTE_SECONDS.observe(t1 - t0)
+    analysis = engine.analyze_stats(chart)
+    _ANALYZE_SECONDS.observe(time.perf_counter() - t1)
+    data = {**chart.to_dict(), **analysis}
+    if gender:
+        _, timeline = engine.compute_luck(
+            dt.year, dt.month, dt.day, dt.hour, dt.minute, gender, longitude=longitude, timezone=timezone
+        )
+        data.update(timeline.prompt_summary(datetime.now().year))
+    return data
+
+
+def analysis_body(chart: Chart) -> bytes:
+    """Encoded /analyze payload for a chart, from the per-chart cache."""
+    # A Chart is its own cache key
+    body = analyze_cache.get(chart)
+    if body is None:
+        t0 = time.perf_counter()
+        analysis = engine.analyze_stats(chart)
+        _ANALYZE_SECONDS.observe(time.perf_counter() - t0)
+
+        # Same encoding as FastAPI's JSONResponse; 'meta' is left out of the response
+        body = json.dumps(
+            {**analysis, "pillars": chart.to_dict(meta=False)},
+            ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode("utf-8")
+        analyze_cache.put(chart, body)
+    return body
+
+
+def birth_chart(birth_date: str, birth_time: str, longitude: Optional[float] = None,
+                timezone: Optional[str] = None) -> Chart:
+    """Parses a birth date/time, computes its chart and counts the request."""
+    dt = parse_birth(birth_date, birth_time)
+    t0 = time.perf_counter()
+    chart = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour, dt.minute, longitude, timezone)
+    _COMPUTE_SECONDS.observe(time.perf_counter() - t0)
+    chart_requests.count(chart)
+    return chart
+
+
+def analyze_birth(birth_date: str, birth_time: str, longitude: Optional[float] = None,
+                  timezone: Optional[str] = None) -> bytes:
+    """Runs one birth date/time through the engine and returns the encoded /analyze payload."""
+    return analysis_body(birth_chart(birth_date, birth_time, longitude, timezone))
+
+
 @app.post("/analyze")
 def analyze_saju(request: AnalyzeRequest):
     try:
-        dt = datetime.strptime(f"{request.birthDate} {request.birthTime}", "%Y-%m-%d %H:%M")
-        pillars = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour, dt.minute)
-        analysis = engine.analyze_stats(pillars)
-
-        # Remove 'meta' from pillars for cleaner response
-        pillars_clean = {k: v for k, v in pillars.items() if k != "meta"}
-
-        return {**analysis, "pillars": pillars_clean}
-    except ValueError:
+        body = analyze_birth(request.birthDate, request.birthTime, request.longitude, request.timezone)
+        return Response(body, media_type="application/json")
+    except ValueError as e:
+        metrics.count_error("analyze", e)
         raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD and HH:MM")
     except Exception as e:
+        metrics.count_error("analyze", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# /analyze bodies in each content-coding, keyed by (chart, coding)
+encoded_cache = LRUCache(maxsize=int(os.getenv("ENCODED_CACHE_SIZE", "4096")))
+
+# A chart's analysis only changes with the engine or its data, which the ETag carries
+CHART_CACHE_CONTROL = os.getenv(
+    "CHART_CACHE_CONTROL", "public, max-age=604800, s-maxage=31536000, stale-while-revalidate=86400"
+)
+
+
+@app.get("/chart/{birth_date}/{birth_time}")
+def get_chart(
+    birth_date: str, birth_time: str, request: Request,
+    longitude: Optional[float] = Query(None, ge=-180, le=180), timezone: Optional[str] = None
+):
+    """
+    The /analyze result as a cacheable resource, e.g. GET /chart/1990-05-15/14:30.
+    The strong ETag is the chart key plus the engine/data version, so a CDN or
+    browser revalidates with If-None-Match and gets a 304 without a body.
+    """
+    try:
+        zone_key(timezone)
+        chart = birth_chart(birth_date, birth_time, longitude, timezone)
+    except ValueError as e:
+        metrics.count_error("chart", e)
+        raise HTTPException(status_code=400, detail="Invalid date, time or timezone. Use YYYY-MM-DD and HH:MM")
+
+    coding = http_cache.negotiate(request.headers.get("accept-encoding"))
+    tag = http_cache.etag(chart, coding)
+    headers = {"ETag": tag, "Cache-Control": CHART_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if http_cache.not_modified(request.headers.get("if-none-match"), tag):
+        return Response(status_code=304, headers=headers)
+
+    body = encoded_cache.get((chart, coding))
+    if body is None:
+        body = http_cache.encode(analysis_body(chart), coding)
+        encoded_cache.put((chart, coding), body)
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return Response(body, media_type="application/json", headers=headers)
+
+
+# Encoded /luck bodies; the timeline is fixed by the chart, direction, start age and birth month
+luck_cache = LRUCache(maxsize=int(os.getenv("LUCK_CACHE_SIZE", "1024")))
+_LUCK_SECONDS = metrics.STAGE_SECONDS.labels("luck")
+
+
+@app.post("/luck")
+def luck_timeline(request: LuckRequest):
+    """
+    Daewoon (10-year), Seun (annual) and Wolun (monthly) pillars for `years` years from birth.
+    Pillars are sexagenary positions; "cycle" maps each position to its stem and branch.
+    """
+    try:
+        dt = parse_birth(request.birthDate, request.birthTime)
+        t0 = time.perf_counter()
+        chart, forward, start_months = engine.luck_start(
+            dt.year, dt.month, dt.day, dt.hour, dt.minute, request.gender, request.longitude, request.timezone
+        )
+        key = (chart, forward, start_months, dt.year, dt.month, request.years)
+        body = luck_cache.get(key)
+        if body is None:
+            timeline = luck.luck_timeline(chart, dt.year, dt.month, forward, start_months, request.years)
+            body = json.dumps(
+                {"pillars": chart.to_dict(meta=False), **timeline.to_dict()},
+                ensure_ascii=False, separators=(",", ":")
+            ).encode("utf-8")
+            luck_cache.put(key, body)
+        _LUCK_SECONDS.observe(time.perf_counter() - t0)
+        return Response(body, media_type="application/json")
+    except ValueError as e:
+        metrics.count_error("luck", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+_COMPATIBILITY_SECONDS = metrics.STAGE_SECONDS.labels("compatibility")
+
+
+def candidate_pool(candidates: List[Candidate]):
+    """A CandidatePool for request-supplied births, charted in one vectorized pass."""
+    import numpy as np
+
+    stamps = np.array([f"{c.birthDate}T{c.birthTime}" for c in candidates], dtype="datetime64[m]")
+    return compatibility.CandidatePool(engine.compute_saju_packed(stamps), [c.id for c in candidates])
+
+
+@app.post("/compatibility")
+def compatibility_matches(request: CompatibilityRequest):
+    """
+    Gunghap: the k candidates most compatible with the given birth, best first.
+    Candidates come from the request or, if none are sent, from the pool at COMPATIBILITY_POOL_PATH.
+    """
+    try:
+        dt = parse_birth(request.birthDate, request.birthTime)
+        chart = engine.compute_saju(
+            dt.year, dt.month, dt.day, dt.hour, dt.minute, request.longitude, request.timezone
+        )
+        pool = candidate_pool(request.candidates) if request.candidates else compatibility.get_pool()
+    except ValueError as e:
+        metrics.count_error("compatibility", e)
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {e}")
+    if pool is None:
+        raise HTTPException(status_code=404, detail="No candidates sent and no candidate pool configured")
+
+    t0 = time.perf_counter()
+    rows, scores = compatibility.top_k(chart, pool, request.k)
+    _COMPATIBILITY_SECONDS.observe(time.perf_counter() - t0)
+
+    matches = []
+    for row, score in zip(rows.tolist(), scores.tolist()):
+        candidate = Chart(int(pool.keys[row]))
+        matches.append({
+            "id": pool.ids[row].item(),
+            "score": round(score, 2),
+            "pillars": candidate.to_dict(meta=False),
+            "breakdown": compatibility.breakdown(chart, candidate),
+        })
+    return {"pool_size": len(pool), "matches": matches}
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request):
+    """
+    Bulk analysis. Body is a JSON array or NDJSON of {birthDate, birthTime} records,
+    each optionally with a longitude and timezone as in /analyze.
+    Streams one NDJSON line per record (with its "index"); failures are reported inline as "error".
+    """
+    return BodyStreamingResponse(
+        stream_analysis(request.stream(), analyze_birth),
+        media_type="application/x-ndjson"
+    )
+
+
+_SEARCH_SECONDS = metrics.STAGE_SECONDS.labels("chart_search")
+
+
+@app.get("/charts/search")
+def search_charts(
+    year_stem: Optional[str] = None, year_branch: Optional[str] = None,
+    month_stem: Optional[str] = None, month_branch: Optional[str] = None,
+    day_stem: Optional[str] = None, day_branch: Optional[str] = None,
+    hour_stem: Optional[str] = None, hour_branch: Optional[str] = None,
+    day_master: Optional[str] = None, dominant: Optional[str] = None,
+    wood: Optional[int] = None, fire: Optional[int] = None, earth: Optional[int] = None,
+    metal: Optional[int] = None, water: Optional[int] = None,
+    start: Optional[str] = None, end: Optional[str] = None,
+    offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Reverse lookup: birth hours (Korean civil time, on the hour) whose chart matches every given filter.
+    Stems/branches/elements take an index, a name ("Yang Fire", "Tiger", "Water") or the hanja;
+    wood..water require an exact element count. start/end (YYYY-MM-DD, end exclusive) narrow the range.
+    """
+    counts = {name: count for name, count in
+              (("Wood", wood), ("Fire", fire), ("Earth", earth), ("Metal", metal), ("Water", water))
+              if count is not None}
+    try:
+        t0 = time.perf_counter()
+        result = engine.search_charts(
+            year_stem=year_stem, year_branch=year_branch, month_stem=month_stem, month_branch=month_branch,
+            day_stem=day_stem, day_branch=day_branch, hour_stem=hour_stem, hour_branch=hour_branch,
+            day_master=day_master, dominant=dominant, counts=counts,
+            start=datetime.strptime(start, "%Y-%m-%d") if start else None,
+            end=datetime.strptime(end, "%Y-%m-%d") if end else None,
+            offset=offset, limit=limit
+        )
+        _SEARCH_SECONDS.observe(time.perf_counter() - t0)
+    except ValueError as e:
+        metrics.count_error("chart_search", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "total": result["total"],
+        "matches": [
+            {"birthDate": stamp[:10], "birthTime": stamp[11:13] + ":00"}
+            for stamp in result["matches"].astype(str).tolist()
+        ],
+        "next_offset": result["next_offset"],
+    }
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    stats = _cache_stats()
+    if engine.generator_loaded:
+        stats["deep_flights"] = {
+            "sync": engine.generator.flights.stats(),
+            "async": engine.generator.aflights.stats()
+        }
+        stats["persona"] = engine.generator.persona.stats()
+    return stats
+
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text exposition: per-stage latency, token and error counters, cache ratios."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def deep_chart_data(request: DeepAnalyzeRequest) -> dict:
+    """chart_data() for a deep report request; invalid birth data is a 400 with the reason."""
+    try:
+        dt = parse_birth(request.birthDate, request.birthTime)
+    except ValueError as e:
+        metrics.count_error("analyze_deep", e)
+        raise HTTPException(status_code=400, detail="Invalid date format")
+    try:
+        return chart_data(dt, request.gender, request.longitude, request.timezone)
+    except ValueError as e:
+        metrics.count_error("analyze_deep", e)
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.post("/analyze/deep")
-def analyze_deep(request: DeepAnalyzeRequest):
+async def analyze_deep(request: DeepAnalyzeRequest):
+    # The birth data is checked before the payment, which verifying consumes
+    full_data = await asyncio.to_thread(deep_chart_data, request)
     try:
         # Verify Payment
-        if not verify_payment(request.paymentId):
+        if not await averify_payment(request.paymentId):
              raise HTTPException(status_code=402, detail="Payment verification failed or payment required.")
 
-        dt = datetime.strptime(f"{request.birthDate} {request.birthTime}", "%Y-%m-%d %H:%M")
-        pillars = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour, dt.minute)
-        analysis = engine.analyze_stats(pillars)
-
-        # Merge pillars and analysis for the report generator
-        full_data = {**pillars, **analysis}
-        deep_report = engine.generate_deep_report(full_data)
+        deep_report = await engine.agenerate_deep_report(full_data)
 
         return {"deep_report": deep_report}
 
-    except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid date format")
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error generating deep report: {e}")
+        metrics.count_error("analyze_deep", e)
+        logger.exception("Error generating deep report")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/analyze/deep/stream")
+async def analyze_deep_stream(request: DeepAnalyzeRequest):
+    """
+    Server-sent-events variant of /analyze/deep. Relays the report as it is generated:
+    "chapter" events at each of the seven chapter headings, "chunk" events with text,
+    a trailing "usage" event with token counts, and a final "done".
+    """
+    full_data = await asyncio.to_thread(deep_chart_data, request)
+    if not await averify_payment(request.paymentId):
+        raise HTTPException(status_code=402, detail="Payment verification failed or payment required.")
+
+    async def events():
+        async for event, data in engine.stream_deep_report(full_data):
+            yield sse_event(event, data)
+        yield sse_event("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
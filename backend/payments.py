@@ -0,0 +1,291 @@
+"""
+PayPal payment verification.
+One long-lived client per process: pooled keep-alive connections, an OAuth
+token cached until shortly before it expires (refreshed by a single caller
+when many need it at once), strict timeouts and bounded retries.
+Sync (requests) and async (httpx) variants share the same token cache;
+each HTTP library is imported when its variant is first used.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+from engine.metrics import STAGE_SECONDS, count_error
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_TOKEN_SECONDS = STAGE_SECONDS.labels("paypal_token")
+_ORDER_SECONDS = STAGE_SECONDS.labels("paypal_order")
+
+
+class PayPalClient:
+    """Verifies PayPal orders against the Orders v2 API."""
+
+    def __init__(self, client_id, client_secret, api_base,
+                 connect_timeout=3.0, read_timeout=10.0,
+                 max_attempts=3, backoff=0.25, max_backoff=2.0,
+                 token_margin=300, pool_size=32):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.api_base = api_base.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.token_margin = token_margin
+        self.pool_size = pool_size
+
+        self._token = None
+        self._token_expiry = 0.0
+        self._token_lock = threading.Lock()
+        self._async_token_lock = None
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._async_client = None
+        self._async_client_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            client_id=os.getenv("NEXT_PUBLIC_PAYPAL_CLIENT_ID"),
+            client_secret=os.getenv("PAYPAL_CLIENT_SECRET"),
+            # Set to "https://api-m.paypal.com" for production
+            api_base=os.getenv("PAYPAL_API_BASE", "https://api-m.sandbox.paypal.com"),
+        )
+
+    @property
+    def configured(self):
+        return bool(self.client_id and self.client_secret)
+
+    def _token_valid(self):
+        return self._token is not None and time.monotonic() < self._token_expiry
+
+    def _store_token(self, payload):
+        # Treat the token as expired `token_margin` seconds early
+        expires_in = int(payload.get("expires_in", 0))
+        self._token = payload.get("access_token")
+        self._token_expiry = time.monotonic() + max(expires_in - self.token_margin, 0)
+
+    def _invalidate_token(self, token):
+        if self._token == token:
+            self._token = None
+
+    def _delay(self, attempt):
+        """Exponential backoff with full jitter, capped at max_backoff."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
+    @staticmethod
+    def _order_status(response):
+        if response.status_code != 200:
+            count_error("paypal_order", f"HTTP {response.status_code}")
+            logger.warning("Failed to get order details: %s", response.text)
+            return None
+        return response.json().get("status")
+
+    @staticmethod
+    def _token_failed(response):
+        count_error("paypal_token", f"HTTP {response.status_code}")
+        logger.warning("Failed to get access token: %s", response.text)
+
+    @staticmethod
+    def _is_paid(status):
+        # Client capture() -> onSuccess with details -> Backend verify, so the order must be COMPLETED.
+        # APPROVED means the capture has not happened yet.
+        if status == "COMPLETED":
+            return True
+        if status is not None and status != "APPROVED":
+            count_error("paypal_order", f"status {status}")
+            logger.warning("Payment status invalid: %s", status)
+        return False
+
+    # --- Sync ---
+
+    def _get_session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session = session
+        return self._session
+
+    def _request(self, method, path, **kwargs):
+        import requests
+
+        session = self._get_session()
+        for attempt in range(self.max_attempts):
+            try:
+                response = session.request(
+                    method, f"{self.api_base}{path}",
+                    timeout=(self.connect_timeout, self.read_timeout), **kwargs
+                )
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_attempts - 1:
+                    raise
+            if attempt < self.max_attempts - 1:
+                time.sleep(self._delay(attempt))
+        return response
+
+    def access_token(self):
+        """Returns a cached OAuth token, fetching a new one when it is close to expiry."""
+        if self._token_valid():
+            return self._token
+        with self._token_lock:
+            if self._token_valid():
+                return self._token
+            t0 = time.perf_counter()
+            response = self._request(
+                "POST", "/v1/oauth2/token",
+                auth=(self.client_id, self.client_secret),
+                data={"grant_type": "client_credentials"}
+            )
+            _TOKEN_SECONDS.observe(time.perf_counter() - t0)
+            if response.status_code != 200:
+                self._token_failed(response)
+                return None
+            self._store_token(response.json())
+            return self._token
+
+    def verify(self, payment_id):
+        """True when the order exists and its payment has been captured."""
+        if not self.configured:
+            count_error("paypal", "credentials missing")
+            logger.error("PayPal credentials missing")
+            return False
+
+        try:
+            for _ in range(2):
+                token = self.access_token()
+                if token is None:
+                    return False
+                t0 = time.perf_counter()
+                response = self._request(
+                    "GET", f"/v2/checkout/orders/{payment_id}",
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                _ORDER_SECONDS.observe(time.perf_counter() - t0)
+                if response.status_code != 401:
+                    break
+                # Token revoked early: refresh once and retry
+                self._invalidate_token(token)
+            return self._is_paid(self._order_status(response))
+        except Exception as e:
+            count_error("paypal", e)
+            logger.warning("Payment verification error: %s", e)
+            return False
+
+    def warm(self):
+        """Imports both HTTP stacks and builds their pools ahead of the first payment."""
+        self._get_session()
+        self._get_async_client()
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    # --- Async ---
+
+    def _get_async_client(self, transport=None):
+        """
+        The shared httpx.AsyncClient, created once under a lock: the warm-up
+        thread and the event loop may both ask for it first.
+        """
+        if self._async_client is None:
+            with self._async_client_lock:
+                if self._async_client is None:
+                    import httpx
+
+                    # The token lock is in place before the client is published
+                    self._async_token_lock = asyncio.Lock()
+                    self._async_client = httpx.AsyncClient(
+                        base_url=self.api_base,
+                        timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                        limits=httpx.Limits(max_connections=self.pool_size,
+                                            max_keepalive_connections=self.pool_size),
+                        transport=transport,
+                    )
+        return self._async_client
+
+    async def _arequest(self, method, path, **kwargs):
+        import httpx
+
+        client = self._get_async_client()
+        for attempt in range(self.max_attempts):
+            try:
+                response = await client.request(method, path, **kwargs)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+            except (httpx.TransportError, httpx.TimeoutException):
+                if attempt == self.max_attempts - 1:
+                    raise
+            if attempt < self.max_attempts - 1:
+                await asyncio.sleep(self._delay(attempt))
+        return response
+
+    async def aaccess_token(self):
+        """Async access_token(); concurrent callers wait on a single refresh."""
+        if self._token_valid():
+            return self._token
+        self._get_async_client()
+        async with self._async_token_lock:
+            if self._token_valid():
+                return self._token
+            t0 = time.perf_counter()
+            response = await self._arequest(
+                "POST", "/v1/oauth2/token",
+                auth=(self.client_id, self.client_secret),
+                data={"grant_type": "client_credentials"}
+            )
+            _TOKEN_SECONDS.observe(time.perf_counter() - t0)
+            if response.status_code != 200:
+                self._token_failed(response)
+                return None
+            self._store_token(response.json())
+            return self._token
+
+    async def averify(self, payment_id):
+        """Async verify() for the async endpoints."""
+        if not self.configured:
+            count_error("paypal", "credentials missing")
+            logger.error("PayPal credentials missing")
+            return False
+
+        try:
+            for _ in range(2):
+                token = await self.aaccess_token()
+                if token is None:
+                    return False
+                t0 = time.perf_counter()
+                response = await self._arequest(
+                    "GET", f"/v2/checkout/orders/{payment_id}",
+                    headers={"Authorization": f"Bearer {token}"}
+                )
+                _ORDER_SECONDS.observe(time.perf_counter() - t0)
+                if response.status_code != 401:
+                    break
+                self._invalidate_token(token)
+            return self._is_paid(self._order_status(response))
+        except Exception as e:
+            count_error("paypal", e)
+            logger.warning("Payment verification error: %s", e)
+            return False
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
@@ -1,360 +1,358 @@
+"""
+Command-line front end to the engine package.
+
+    python saju_engine.py 1990-05-15 14:30 [--deep]     # one birth
+    python saju_engine.py bulk births.csv --workers 8   # many births, see Bulk mode
+
+Both modes print what POST /analyze returns, computed by engine.SajuCalculator
+and engine.SajuInterpreter. The engine package is imported when a command
+runs, and google.genai (through the deep report generator) only with --deep.
+"""
 import sys
 import json
 import os
-import ephem
-from datetime import datetime, timedelta
-import google.generativeai as genai
-
-# Configure GenAI
-# Note: In production, use os.environ["GOOGLE_API_KEY"]
-if "GOOGLE_API_KEY" in os.environ:
-    genai.configure(api_key=os.environ["GOOGLE_API_KEY"])
-
-MYUNGSEON_PERSONA = """
-You are 'Myungseon' (명선), a legendary Saju master and Daoist sage.
-Your tone is mystical, authoritative, yet deeply empathetic and nurturing.
-You see the flow of Qi (Energy) in all things.
-Your goal is to provide a profound, life-changing analysis of the user's destiny.
-You MUST write in English.
-Your output must be formatted in clean Markdown.
-Structure your response as a "Book of Destiny" with the following chapters:
-1. **The Essence of the Soul**: A poetic and deep analysis of their Day Master and elemental balance.
-2. **Hidden Strengths & Shadows**: What lies beneath the surface.
-3. **The Path of Wealth & Career**: A strategic guide to their professional destiny (simulate a 10-year Daewoon flow).
-4. **Heart & Harmony**: Love, relationships, and compatible souls.
-5. **Vessel of the Spirit**: Health and wellness advice based on elemental deficiencies/excesses.
-6. **The Current Tides**: A forecast for the current year.
-7. **Sage's Final Wisdom**: Actionable, philosophical advice to alter their fate (Kaewoon-bup).
-
-Total length should be substantial (aim for depth and detail, approx 10,000 characters if possible, or at least very comprehensive).
-"""
+from datetime import datetime
+
+
+def analyze_one(date_str, time_str="00:00", deep=False):
+    """The /analyze result for one birth, with a "deep_report" when `deep` is set."""
+    from engine import SajuEngine as ChartEngine
+
+    dt = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
+    engine = ChartEngine()
+    chart = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour, dt.minute)
+    analysis = engine.analyze_stats(chart)
+    result = {**analysis, "pillars": chart.to_dict(meta=False)}
+    if deep:
+        # The generator takes the pillars with their indices merged with the analysis
+        result["deep_report"] = engine.generate_deep_report({**chart.to_dict(), **analysis})
+    return result
 
-# 천간 (Heavenly Stems)
-# 천간 (Heavenly Stems)
-HEAVENLY_STEMS = ["Yang Wood (甲)", "Yin Wood (乙)", "Yang Fire (丙)", "Yin Fire (丁)", "Yang Earth (戊)", "Yin Earth (己)", "Yang Metal (庚)", "Yin Metal (辛)", "Yang Water (壬)", "Yin Water (癸)"]
-# 지지 (Earthly Branches)
-EARTHLY_BRANCHES = ["Rat (子)", "Ox (丑)", "Tiger (寅)", "Rabbit (卯)", "Dragon (辰)", "Snake (巳)", "Horse (午)", "Sheep (未)", "Monkey (申)", "Rooster (酉)", "Dog (戌)", "Pig (亥)"]
 
-# 오행 매핑 (Five Elements)
-STEM_ELEMENTS = ["Wood", "Wood", "Fire", "Fire", "Earth", "Earth", "Metal", "Metal", "Water", "Water"]
-BRANCH_ELEMENTS = ["Water", "Earth", "Wood", "Wood", "Earth", "Fire", "Fire", "Earth", "Metal", "Metal", "Earth", "Water"]
+# --- Bulk mode ---
+# python saju_engine.py bulk births.csv --workers 8 > charts.ndjson
+#
+# Reads CSV (birthDate,birthTime[,longitude,timezone], header optional) or
+# NDJSON records from a file or stdin and writes one JSON line per record, in
+# input order: {"index": n, ...} with the fields of POST /analyze, or
+# {"index": n, "error": ...}. Charts come from the engine package's vectorized
+# path (exact solar terms, as the API serves them) a chunk of rows at a time.
 
-# 십신 매핑 (Ten Gods) - 일간 기준
-TEN_GODS_MAP = {
-    ("Wood", "Wood"): "BeeGyun", ("Wood", "Fire"): "SikSin", ("Wood", "Earth"): "PyunJae", ("Wood", "Metal"): "PyunGwan", ("Wood", "Water"): "PyunIn",
-    # ... Simplified mapping logic needed or full matrix
+BULK_CHUNK_SIZE = 20000
+
+# CSV header names (lower-cased) -> record fields; without a header, columns are _CSV_POSITIONAL
+_CSV_COLUMNS = {
+    "birthdate": "birthDate", "birth_date": "birthDate", "date": "birthDate",
+    "birthtime": "birthTime", "birth_time": "birthTime", "time": "birthTime",
+    "longitude": "longitude", "timezone": "timezone",
 }
+_CSV_POSITIONAL = ("birthDate", "birthTime", "longitude", "timezone")
 
-def get_element(stem_idx, is_stem=True):
-    if is_stem:
-        return STEM_ELEMENTS[stem_idx]
-    else:
-        return BRANCH_ELEMENTS[stem_idx]
-
-class SajuEngine:
-    def __init__(self):
-        # Load external data
-        data_path = os.path.join(os.path.dirname(__file__), 'saju_data.json')
-        with open(data_path, 'r', encoding='utf-8') as f:
-            self.data = json.load(f)
-
-    def compute_saju(self, year, month, day, hour, minute=0):
-        """
-        Compute the Four Pillars based on exact Solar Terms.
-        """
-        birth_date = datetime(year, month, day, hour, minute)
-        
-        # 1. Day Pillar
-        # Base date: 1900-01-01 (Gap-Sul day? Need to verify)
-        # 1900-01-01 is roughly Lunar 1899-12-01.
-        # Standard: 1899-12-23 (Jan 30 1900 is Lunar New Year?)
-        # Let's use a known anchor. 2024-01-01 is Gab-Ja (No wait, 2024 is Gab-Jin year).
-        # 2024-01-01 is Gap-Ja day? No.
-        # Anchor: 1900-01-01 is Monday.
-        # Reference: 1924-01-01 (Gap-Ja day start cycle? No).
-        
-        # Reliable Anchor: 2000-01-01 is Mu-O (戊午) day?
-        # Let's use python's ordinal date.
-        # Python date(1,1,1).toordinal() -> 1
-        # We need a known Gap-Ja day.
-        # 2023-01-01 -> Gye-Sa day.
-        # Let's use a standard library approach equivalent logic:
-        # Day Gan = (Total Days - Offset) % 10
-        # Day Ji = (Total Days - Offset) % 12
-        
-        base_date = datetime(1900, 1, 1)
-        # 1900-01-01 is Gap-Sul (甲戌) day. (Valid Reference)
-        days_diff = (datetime(year, month, day) - base_date).days
-        
-        day_gan_idx = (0 + days_diff) % 10  # Gap is 0
-        day_ji_idx = (10 + days_diff) % 12 # Sul is 10
-        
-        day_pillar = {
-            "stem": HEAVENLY_STEMS[day_gan_idx],
-            "branch": EARTHLY_BRANCHES[day_ji_idx]
-        }
-        
-        # 2. Year Pillar & Month Pillar (Requires Solar Terms)
-        # We need to find the solar term dates for the birth year.
-        # Ipchun (315 deg) determines the Year start.
-        
-        # MVP Simplification for Year/Month:
-        # Ipchun ~ Feb 4. 
-        # Real Saju requires minute-level precision for month change (Jeolgi),
-        # but for an MVP, day-level check is acceptable (Jeolgi typically changes on 4-8th of month).
-        
-        # Solar Terms (approximate dates):
-        # Feb 4 (Ipchun) -> Month 1 (In)
-        # ...
-        
-        # Logic:
-        # 1. Determine Saju Year.
-        # If today < Ipchun(Year), Saju Year = Year - 1
-        # Else Saju Year = Year
-        
-        current_year_ipchun = datetime(year, 2, 4, 0, 0) # Approx
-        
-        saju_year = year
-        if birth_date < current_year_ipchun:
-            saju_year = year - 1
-            
-        # Year Pillar
-        year_gan_idx = (saju_year - 4) % 10
-        year_ji_idx = (saju_year - 4) % 12
-        year_pillar = {
-            "stem": HEAVENLY_STEMS[year_gan_idx],
-            "branch": EARTHLY_BRANCHES[year_ji_idx]
-        }
-        
-        # Month Pillar
-        # Base Month is determined by Year Stem. (Wol-Du-Beop)
-        # Year Stem 'Gap/Gi' -> Start Month 'Mu-In'
-        # Formula for Month Stem start index:
-        # (Year Stem Index % 5) * 2 + 2 (In month is 3rd branch, index 2?)
-        
-        check_year = saju_year
-        # Terms for the SAJU YEAR (starting Feb 4)
-        terms = [
-            (datetime(check_year, 2, 4), 2),   # In
-            (datetime(check_year, 3, 6), 3),   # Myo
-            (datetime(check_year, 4, 5), 4),   # Jin
-            (datetime(check_year, 5, 6), 5),   # Sa
-            (datetime(check_year, 6, 6), 6),   # O
-            (datetime(check_year, 7, 7), 7),   # Mi
-            (datetime(check_year, 8, 8), 8),   # Shin
-            (datetime(check_year, 9, 8), 9),   # Yu
-            (datetime(check_year, 10, 8), 10), # Sul
-            (datetime(check_year, 11, 7), 11), # Hae
-            (datetime(check_year, 12, 7), 0),  # Ja
-            (datetime(check_year + 1, 1, 6), 1)# Chuk
-        ]
-        
-        # Find the month
-        month_ji_idx = 1 # Default to last month of prev year (Chuk) if before first term?
-
-        target_ji = 1 # Default
-        for t_date, t_idx in terms:
-            if birth_date >= t_date:
-                target_ji = t_idx
-            else:
-                break
-        
-        month_ji_idx = target_ji
-        
-        # Month Stem (Wol-Du-Beop)
-        month_start_gan_idx = (year_gan_idx % 5) * 2 + 2
-        # Month branches start at In(2).
-        
-        # Branch Order in Saju Month Sequence: In(2), Myo(3)... Hae(11), Ja(0), Chuk(1)
-        pass_chart = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 0, 1]
-        seq_idx = pass_chart.index(month_ji_idx)
-        
-        month_gan_idx = (month_start_gan_idx + seq_idx) % 10
-        
-        month_pillar = {
-            "stem": HEAVENLY_STEMS[month_gan_idx],
-            "branch": EARTHLY_BRANCHES[month_ji_idx]
-        }
-
-
-        # 3. Hour Pillar
-        # Determined by Day Stem and Hour.
-        # Formula: ((Hour + 1) // 2) % 12 maps to branch index.
-        
-        hour_ji_idx = ((hour + 1) // 2) % 12
-        # If hour is 23 (11pm), (24//2) % 12 = 0 (Ja). Correct.
-        
-        # Hour Stem (Shi-Du-Beop)
-        # Formula: (Day Stem Index % 5) * 2
-        
-        hour_start_gan_idx = (day_gan_idx % 5) * 2
-        hour_gan_idx = (hour_start_gan_idx + hour_ji_idx) % 10
-        
-        hour_pillar = {
-            "stem": HEAVENLY_STEMS[hour_gan_idx],
-            "branch": EARTHLY_BRANCHES[hour_ji_idx]
-        }
-        
-        return {
-            "year": year_pillar,
-            "month": month_pillar,
-            "day": day_pillar,
-            "hour": hour_pillar,
-            "meta": {
-                "year_gan": year_gan_idx, "year_ji": year_ji_idx,
-                "month_gan": month_gan_idx, "month_ji": month_ji_idx,
-                "day_gan": day_gan_idx, "day_ji": day_ji_idx,
-                "hour_gan": hour_gan_idx, "hour_ji": hour_ji_idx
-            }
-        }
-
-    def analyze_stats(self, pillars_data):
-        meta = pillars_data["meta"]
-        
-        # Counts
-        element_counts = {"Wood": 0, "Fire": 0, "Earth": 0, "Metal": 0, "Water": 0}
-        
-        # Add Stems
-        element_counts[STEM_ELEMENTS[meta["year_gan"]]] += 1
-        element_counts[STEM_ELEMENTS[meta["month_gan"]]] += 1
-        element_counts[STEM_ELEMENTS[meta["day_gan"]]] += 1
-        element_counts[STEM_ELEMENTS[meta["hour_gan"]]] += 1
-        
-        # Add Branches
-        element_counts[BRANCH_ELEMENTS[meta["year_ji"]]] += 1
-        element_counts[BRANCH_ELEMENTS[meta["month_ji"]]] += 1
-        element_counts[BRANCH_ELEMENTS[meta["day_ji"]]] += 1
-        element_counts[BRANCH_ELEMENTS[meta["hour_ji"]]] += 1
-        
-        # Determine Dominant
-        dominant = max(element_counts, key=element_counts.get)
-        
-        # Determine Class based on Dominant Element + Day Master
-        day_master_element = STEM_ELEMENTS[meta["day_gan"]]
-        
-        classes = self.data["classes"]
-        class_descriptions = self.data["class_descriptions"]
-
-        user_class = classes.get(dominant, "Wanderer")
-        class_description = class_descriptions.get(dominant, "운명의 흐름을 여행하는 방랑자입니다.")
-        
-        
-        # Detailed Interpretations based on Dominant Element
-        interpretations = {
-            "personality": self._get_interpretation("personality", dominant),
-            "wealth": self._get_interpretation("wealth", dominant),
-            "career": self._get_interpretation("career", dominant),
-            "health": self._get_interpretation("health", dominant),
-            "love": self._get_interpretation("love", dominant),
-        }
-        
-        # Generate Detailed Report
-        detailed_report = f"""
-## 1. Essence & Personality
-{interpretations['personality']}
-
-## 2. Wealth & Property
-{interpretations['wealth']}
-
-## 3. Career & Path
-{interpretations['career']}
-
-## 4. Health & Vitality
-{interpretations['health']}
-
-## 5. Love & Relationships
-{interpretations['love']}
-"""
+# --brief keeps the pillars, element counts and these fields, leaving out the interpretation texts
+_BRIEF_FIELDS = ("class", "dominant_element", "day_master")
+
+_DATE_ERROR = "Invalid date format. Use YYYY-MM-DD and HH:MM"
+
+
+def _csv_columns(first_line):
+    """Record field per CSV column when `first_line` is a header, else None."""
+    import csv
 
-        return {
-            "stats": element_counts,
-            "class": user_class,
-            "class_description": class_description,
-            "dominant_element": dominant,
-            "day_master": day_master_element,
-            "interpretations": interpretations,
-            "detailed_report": detailed_report.strip(),
-            "message": f"You were born with the energy of {day_master_element}, and your chart is most strongly influenced by {dominant}."
-        }
-
-    def _get_interpretation(self, topic, dominant):
-        # Use simple dictionary lookup from loaded data
-        return self.data["interpretations"].get(topic, {}).get(dominant, "운명의 흐름을 스스로 개척해 나가는 힘이 있습니다.")
-
-    def generate_deep_report(self, pillars_data):
-        """
-        Generates a deep, 10,000+ character report using Gemini API.
-        """
-        current_year = datetime.now().year
-        current_date_str = datetime.now().strftime("%Y-%m-%d")
-
-        if "GOOGLE_API_KEY" not in os.environ:
-             return "## Error\n\nGoogle API Key is missing. Please configure the GOOGLE_API_KEY environment variable to unlock the Deep Destiny Report."
-
-        # Use a supported model name (models/gemini-flash-latest)
-        model = genai.GenerativeModel('gemini-flash-latest')
-        
-        # Construct the Prompt
-        prompt = f"""
-        {MYUNGSEON_PERSONA}
-        
-        Analyze the following Saju (Four Pillars) Chart:
-        
-        **Birth Data**:
-        - Year Pillar: {pillars_data['year']['stem']} {pillars_data['year']['branch']}
-        - Month Pillar: {pillars_data['month']['stem']} {pillars_data['month']['branch']}
-        - Day Pillar: {pillars_data['day']['stem']} {pillars_data['day']['branch']} (Day Master)
-        - Hour Pillar: {pillars_data['hour']['stem']} {pillars_data['hour']['branch']}
-        
-        **Context**:
-        - Current Date: {current_date_str} (The forecast for "Current Year" must focus on {current_year})
-        
-        **Meta Analysis**:
-        - Dominant Element: {pillars_data.get('dominant_element', 'Unknown')}
-        - Soul Class: {pillars_data.get('class', 'Unknown')}
-        
-        Write the "Book of Destiny" for this soul now.
-        """
-        
+    cells = next(csv.reader([first_line]), [])
+    if not cells or cells[0].strip()[:1].isdigit():
+        return None
+    return tuple(_CSV_COLUMNS.get(cell.strip().lower()) for cell in cells)
+
+
+def _encode(value):
+    # Same encoding as the API's response bodies
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class BulkAnalyzer:
+    """
+    Turns chunks of input lines into NDJSON result bytes. A result line is
+    assembled from encoded fragments (per pillar position, per dominant element
+    and day master) prepared once, so no per-row analysis dict is built.
+    """
+
+    def __init__(self, brief=False, deep=False):
+        from engine import SajuEngine as ChartEngine
+        from engine.chart import PILLARS
+        from engine.constants import EARTHLY_BRANCHES, HEAVENLY_STEMS
+        from engine.interpreter import ELEMENTS
+
+        self.engine = ChartEngine()
+        self.brief = brief
+        self.deep = deep
+        # Line prefix up to the element counts, then one "name":{"stem","branch"} per pillar and position
+        self._prefix = (
+            b'{"index":%d,"stats":{' + b",".join(b'"%s":%%d' % e.encode() for e in ELEMENTS) + b"},%s"
+        )
+        pillars = [_encode({"stem": HEAVENLY_STEMS[pos % 10], "branch": EARTHLY_BRANCHES[pos % 12]}) for pos in range(60)]
+        self._pillars = [[b'"%s":%s' % (name.encode(), pillar) for pillar in pillars] for name in PILLARS]
+        # Encoded fields between "stats" and "pillars", per (dominant element, day master); filled on first use
+        self._middles = {}
+
+    def _middle(self, key, dominant, day_master):
+        middle = self._middles.get((dominant, day_master))
+        if middle is None:
+            from engine.chart import Chart
+
+            analysis = self.engine.analyze_stats(Chart(key))
+            del analysis["stats"]
+            if self.brief:
+                analysis = {field: analysis[field] for field in _BRIEF_FIELDS}
+            middle = self._middles[(dominant, day_master)] = _encode(analysis)[1:-1]
+        return middle
+
+    def _records(self, fmt, columns, lines):
+        if fmt == "ndjson":
+            for line in lines:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield f"Invalid JSON: {e.msg}"
+            return
+
+        import csv
+
+        for row in csv.reader(lines):
+            record = {}
+            for name, value in zip(columns or _CSV_POSITIONAL, row):
+                value = value.strip()
+                if name and value:
+                    record[name] = value
+            if "longitude" in record:
+                try:
+                    record["longitude"] = float(record["longitude"])
+                except ValueError:
+                    yield "longitude must be a number between -180 and 180"
+                    continue
+            yield record
+
+    @staticmethod
+    def _validate(record, offset_table):
+        """(birth date, birth time, longitude, timezone), or an error message."""
+        if isinstance(record, str):
+            return record
+        if not isinstance(record, dict) or not isinstance(record.get("birthDate"), str):
+            return "Each record needs a birthDate string"
+        birth_time = record.get("birthTime", "00:00")
+        if not isinstance(birth_time, str):
+            return "birthTime must be a string"
+        longitude = record.get("longitude")
+        if longitude is not None and (isinstance(longitude, bool) or not isinstance(longitude, (int, float))
+                                      or not -180 <= longitude <= 180):
+            return "longitude must be a number between -180 and 180"
+        timezone = record.get("timezone")
+        if timezone is not None:
+            if not isinstance(timezone, str):
+                return "timezone must be a string"
+            try:
+                offset_table(timezone)
+            except ValueError as e:
+                return str(e)
+        return record["birthDate"], birth_time, longitude, timezone
+
+    @staticmethod
+    def _parse_times(births):
+        """datetime64[m] per birth (NaT where the date or time is invalid)."""
+        import numpy as np
+
+        stamps = [
+            f"{birth_date}T{birth_time}" if len(birth_date) == 10 and len(birth_time) == 5 else None
+            for birth_date, birth_time, _, _ in births
+        ]
         try:
-            response = model.generate_content(prompt)
-            
-            # Log usage metadata if available (to stderr to not break JSON)
-            if hasattr(response, 'usage_metadata'):
-                usage = response.usage_metadata
-                sys.stderr.write(f"[Token Usage] Input: {usage.prompt_token_count}, Output: {usage.candidates_token_count}, Total: {usage.total_token_count}\\n")
-            
-            return response.text
-        except Exception as e:
-            return f"## Error\n\nThe spirits are silent (API Error): {str(e)}"
+            if None not in stamps:
+                return np.array(stamps, dtype="datetime64[m]")
+        except ValueError:
+            pass
+        # Slow path for the chunk: anything strptime accepts, as the API does
+        parsed = []
+        for birth_date, birth_time, _, _ in births:
+            try:
+                parsed.append(datetime.strptime(f"{birth_date} {birth_time}", "%Y-%m-%d %H:%M"))
+            except ValueError:
+                parsed.append(None)
+        return np.array(parsed, dtype="datetime64[m]")
+
+    def _compute(self, times, births):
+        """Packed chart key per birth, computing each (timezone, has longitude) group in one call."""
+        import numpy as np
+
+        keys = np.zeros(len(births), dtype=np.int64)
+        groups = {}
+        for i, (_, _, longitude, timezone) in enumerate(births):
+            groups.setdefault((timezone, longitude is None), []).append(i)
+        for (timezone, no_longitude), rows in groups.items():
+            longitude = None if no_longitude else np.array([births[i][2] for i in rows], dtype=np.float64)
+            keys[rows] = self.engine.compute_saju_packed(times[rows], longitude, timezone)
+        return keys
+
+    def _deep_report(self, key):
+        from engine.chart import Chart
+
+        chart = Chart(key)
+        return self.engine.generate_deep_report({**chart.to_dict(), **self.engine.analyze_stats(chart)})
+
+    def analyze_chunk(self, start, fmt, columns, lines):
+        """NDJSON bytes for `lines`, the records numbered from `start`."""
+        import numpy as np
+        from engine.chart import unpack
+        from engine.solar_time import offset_table
+
+        results = [self._validate(record, offset_table) for record in self._records(fmt, columns, lines)]
+        valid = [i for i, result in enumerate(results) if not isinstance(result, str)]
+        births = [results[i] for i in valid]
+        if births:
+            times = self._parse_times(births)
+            parsed = ~np.isnat(times)
+            for i in np.flatnonzero(~parsed).tolist():
+                results[valid[i]] = _DATE_ERROR
+            keep = parsed.tolist()
+            valid = [row for row, ok in zip(valid, keep) if ok]
+            births = [birth for birth, ok in zip(births, keep) if ok]
+        if births:
+            keys = self._compute(times[parsed], births)
+            analysis = self.engine.analyze_stats_packed(keys)
+            rows = zip(keys.tolist(), analysis["stats"].tolist(), analysis["dominant"].tolist(),
+                       analysis["day_master"].tolist(), *(pos.tolist() for pos in unpack(keys)))
+            for row, (key, stats, dominant, day_master, year, month, day, hour) in zip(valid, rows):
+                results[row] = (key, stats, self._middle(key, dominant, day_master), year, month, day, hour)
+
+        year_p, month_p, day_p, hour_p = self._pillars
+        out = []
+        for index, result in enumerate(results, start):
+            if isinstance(result, str):
+                out.append(_encode({"index": index, "error": result}))
+                continue
+            key, stats, middle, year, month, day, hour = result
+            line = self._prefix % (index, *stats, middle) + b',"pillars":{%s,%s,%s,%s}' % (
+                year_p[year], month_p[month], day_p[day], hour_p[hour]
+            )
+            if self.deep:
+                line += b',"deep_report":' + _encode(self._deep_report(key))
+            out.append(line + b"}")
+        out.append(b"")
+        return b"\n".join(out)
+
+
+_analyzer = None
+
+
+def _init_analyzer(brief, deep):
+    """Builds the process's BulkAnalyzer (and maps the solar tables) unless one with these settings exists."""
+    global _analyzer
+    if _analyzer is None or (_analyzer.brief, _analyzer.deep) != (brief, deep):
+        from engine.solar_terms import get_terms
+        from engine.solar_time import get_eot
+
+        get_terms()
+        get_eot()
+        _analyzer = BulkAnalyzer(brief, deep)
+    return _analyzer
+
+
+def _analyze_chunk(task):
+    return _analyzer.analyze_chunk(*task)
+
+
+def _chunks(source, fmt, chunk_size):
+    """(start index, format, CSV columns, lines) tasks; blank lines are skipped."""
+    from itertools import islice
+
+    first = next((line for line in source if line.strip()), None)
+    if first is None:
+        return
+    if fmt == "auto":
+        fmt = "ndjson" if first.lstrip().startswith("{") else "csv"
+    columns = _csv_columns(first) if fmt == "csv" else None
+    pending = [] if columns is not None else [first]
+    start = 0
+    while True:
+        lines = pending + [line for line in islice(source, chunk_size - len(pending)) if line.strip()]
+        pending = []
+        if not lines:
+            return
+        yield start, fmt, columns, lines
+        start += len(lines)
+
+
+def run_bulk(source, out, workers=1, fmt="auto", chunk_size=BULK_CHUNK_SIZE, brief=False, deep=False):
+    """
+    Writes NDJSON results for every record in the text stream `source` to the
+    binary stream `out`; returns the number of records. With several workers,
+    chunks go to a process pool, at most two per worker in flight.
+    """
+    from collections import deque
+
+    _init_analyzer(brief, deep)
+    tasks = _chunks(source, fmt, chunk_size)
+    count = 0
+    if workers <= 1:
+        for task in tasks:
+            out.write(_analyze_chunk(task))
+            count += len(task[3])
+        return count
+
+    import multiprocessing
+
+    # Forked workers inherit the analyzer and tables built above; others build their own
+    with multiprocessing.Pool(workers, initializer=_init_analyzer, initargs=(brief, deep)) as pool:
+        in_flight = deque()
+        for task in tasks:
+            in_flight.append(pool.apply_async(_analyze_chunk, (task,)))
+            count += len(task[3])
+            if len(in_flight) >= 2 * workers:
+                out.write(in_flight.popleft().get())
+        while in_flight:
+            out.write(in_flight.popleft().get())
+    return count
+
+
+def bulk_main(argv):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(prog="saju_engine.py bulk", description="Analyze many births as JSON lines")
+    parser.add_argument("input", nargs="?", default="-", help="CSV or NDJSON file, '-' for stdin")
+    parser.add_argument("--format", choices=("auto", "csv", "ndjson"), default="auto")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, 0 for one per CPU")
+    parser.add_argument("--chunk-size", type=int, default=BULK_CHUNK_SIZE, help="records per dispatched chunk")
+    parser.add_argument("--brief", action="store_true", help="leave out the interpretation texts")
+    parser.add_argument("--deep", action="store_true", help="add a deep report per record (Gemini)")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    if args.input == "-":
+        source = open(sys.stdin.fileno(), "r", encoding="utf-8", newline="", closefd=False)
+    else:
+        source = open(args.input, "r", encoding="utf-8", newline="")
+    try:
+        with source:
+            count = run_bulk(source, sys.stdout.buffer, workers, args.format, max(args.chunk_size, 1),
+                             args.brief, args.deep)
+        sys.stdout.buffer.flush()
+    except BrokenPipeError:
+        # Output closed early (e.g. piped into head); keep the interpreter from flushing into it again
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    sys.stderr.write(f"[Bulk] {count} records in {time.perf_counter() - t0:.2f}s\n")
+
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 1 and sys.argv[1] == "bulk":
+        bulk_main(sys.argv[2:])
+    elif len(sys.argv) > 1:
         # Arg 1: Date (YYYY-MM-DD), Arg 2: Time (HH:MM), Arg 3: --deep (optional)
         date_str = sys.argv[1]
         time_str = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith("--") else "00:00"
-        
-        is_deep = "--deep" in sys.argv
-        
-        dt = datetime.strptime(f"{date_str} {time_str}", "%Y-%m-%d %H:%M")
-        
-        engine = SajuEngine()
-        pillars = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour, dt.minute)
-        analysis = engine.analyze_stats(pillars)
-        
-        # Merge results for output
-        result = {
-            **analysis,
-            "pillars": {k: v for k, v in pillars.items() if k != "meta"}
-        }
-        
-        if is_deep:
-            # Pass full pillars data including meta to the AI
-            deep_report_md = engine.generate_deep_report(pillars)
-            result["deep_report"] = deep_report_md
-        
-        print(json.dumps(result, ensure_ascii=False))
+        print(json.dumps(analyze_one(date_str, time_str, "--deep" in sys.argv), ensure_ascii=False))
     else:
         # Dummy test
-        engine = SajuEngine()
-        print(engine.compute_saju(2024, 2, 10, 14, 30))
+        from engine import SajuEngine as ChartEngine
+
+        print(ChartEngine().compute_saju(2024, 2, 10, 14, 30).to_dict())
@@ -0,0 +1,64 @@
+"""
+Production server: a gunicorn pre-fork master with uvicorn workers.
+
+The master imports the app and calls main.preload() before forking, so the
+engine's read-only data (interpreter texts, solar term table, compatibility
+pool, optionally the chart index) and the LLM/HTTP modules are loaded once
+and shared copy-on-write by every worker. gc.freeze() keeps the collector
+from touching, and so copying, those pages. The numpy tables are
+memory-mapped files, shared through the page cache even across restarts.
+
+    python serve.py --workers 4 --bind 0.0.0.0:8000
+    python serve.py --workers 4 --no-preload    # each worker loads the app itself
+
+bench/memory.py reports per-worker RSS/PSS for both modes.
+"""
+import argparse
+import gc
+import os
+
+from gunicorn.app.base import BaseApplication
+
+
+class PreforkServer(BaseApplication):
+    def __init__(self, options, preload=True):
+        self.options = options
+        self.preload = preload
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # With preload_app this runs once in the master, otherwise in every worker
+        import main
+
+        if self.preload:
+            main.preload()
+            gc.freeze()
+        return main.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork Soul Stat API server")
+    parser.add_argument("--bind", default=os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}"))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--timeout", type=int, default=120, help="seconds before a silent worker is restarted")
+    parser.add_argument("--no-preload", action="store_true", help="load the app in each worker instead")
+    args = parser.parse_args()
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": "uvicorn_worker.UvicornWorker",
+        "preload_app": not args.no_preload,
+        "timeout": args.timeout,
+        "graceful_timeout": 30,
+        "keepalive": 5,
+    }
+    PreforkServer(options, preload=not args.no_preload).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,855 @@
+# -*- coding: utf-8 -*-
+"""Offline checks for the engine package (no server or API keys needed)."""
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from engine import SajuEngine, compatibility
+from engine.chart import Chart
+from engine.compatibility import CandidatePool
+from engine.constants import META_KEYS
+from engine.index import ChartIndex
+from engine.interpreter import ELEMENTS
+from engine.luck import pillar_name
+
+engine = SajuEngine()
+
+
+def test_known_chart():
+    meta = engine.compute_saju(1990, 1, 15, 9).meta
+    assert meta == {
+        "year_gan": 5, "year_ji": 5, "month_gan": 3, "month_ji": 1,
+        "day_gan": 6, "day_ji": 4, "hour_gan": 7, "hour_ji": 5
+    }
+
+
+def test_batch_matches_scalar():
+    start = datetime(1899, 12, 25)
+    dts = [start + timedelta(minutes=97 * i) for i in range(20000)]
+    batch = engine.compute_saju_batch(dts)
+
+    for i, dt in enumerate(dts):
+        meta = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour, dt.minute).meta
+        assert tuple(int(batch[k][i]) for k in META_KEYS) == tuple(meta[k] for k in META_KEYS), dt
+
+
+def test_ipchun_boundary_is_minute_accurate():
+    # Ipchun 2025 falls at 2025-02-03 23:10 KST
+    before = engine.compute_saju(2025, 2, 3, 23, 9).meta
+    after = engine.compute_saju(2025, 2, 3, 23, 11).meta
+    assert (before["year_gan"], before["year_ji"], before["month_ji"]) == (0, 4, 1)  # 甲辰年 丑月
+    assert (after["year_gan"], after["year_ji"], after["month_ji"]) == (1, 5, 2)     # 乙巳年 寅月
+
+
+def test_true_solar_time_and_historical_offsets():
+    # 00:20 KST on 2024-02-11 at 127°E is 23:34 true solar time on the 10th (equation of time -14 min)
+    clock = engine.compute_saju(2024, 2, 11, 0, 20)
+    solar = engine.compute_saju(2024, 2, 11, 0, 20, longitude=127.0)
+    assert repr(clock) == "Chart(甲辰 丙寅 乙巳 丙子)"
+    assert repr(solar) == "Chart(甲辰 丙寅 甲辰 甲子)"
+
+    # Korea kept summer time (UTC+9:30) in 1955: 01:40 on the clock was 00:34 by the Sun, a Ja (子) hour;
+    # read as UTC+9 it would be 01:04, a Chuk (丑) hour
+    assert engine.compute_saju(1955, 7, 1, 1, 40, longitude=127.0).meta["hour_ji"] == 0
+    assert engine.compute_saju(1955, 7, 1, 1, 40, 127.0, "+09:00").meta["hour_ji"] == 1
+
+    start = datetime(1899, 6, 1)
+    dts = [start + timedelta(minutes=613 * i) for i in range(5000)]
+    longitudes = [-180 + 360 * i / len(dts) for i in range(len(dts))]
+    for timezone in (None, "America/New_York"):
+        packed = engine.compute_saju_packed(dts, longitudes, timezone)
+        for i, dt in enumerate(dts):
+            chart = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour, dt.minute, longitudes[i], timezone)
+            assert chart == packed[i], (dt, timezone)
+
+
+def test_zone_offsets_from_tzif():
+    from zoneinfo import ZoneInfo
+
+    from engine.solar_time import _wall_seconds, offset_table, utc_offset
+
+    # Spellings of one zone share one table; unknown names fail without building anything
+    assert offset_table(" asia/tokyo") is offset_table("Asia/Tokyo")
+    with pytest.raises(ValueError):
+        offset_table("Mars/Olympus_Mons")
+
+    # Past transitions come from the TZif records, later ones from its POSIX rule
+    for name in ("America/New_York", "Europe/London", "Australia/Sydney", "America/Sao_Paulo"):
+        zone = ZoneInfo(name)
+        for year in (1905, 1944, 1975, 2024, 2061, 2099):
+            for month in range(1, 13):
+                wall = datetime(year, month, 15, 12)
+                expected = zone.utcoffset(wall).total_seconds()
+                assert utc_offset(_wall_seconds(wall), name) == expected, (name, wall)
+
+
+def test_chart_round_trip():
+    chart = engine.compute_saju(1990, 1, 15, 9)
+    assert repr(chart) == "Chart(己巳 丁丑 庚辰 辛巳)"
+    assert chart.to_dict()["day"] == {"stem": "Yang Metal (庚)", "branch": "Dragon (辰)"}
+
+    start = datetime(1930, 1, 1)
+    dts = [start + timedelta(minutes=7919 * i) for i in range(5000)]
+    packed = engine.compute_saju_packed(dts)
+    bulk = engine.analyze_stats_packed(packed)
+    for i, dt in enumerate(dts):
+        chart = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour, dt.minute)
+        assert chart == packed[i]
+        analysis = engine.analyze_stats(chart)
+        assert list(bulk["stats"][i]) == list(analysis["stats"].values())
+        assert ELEMENTS[bulk["dominant"][i]] == analysis["dominant_element"]
+        assert ELEMENTS[bulk["day_master"][i]] == analysis["day_master"]
+
+
+def test_chart_index_matches_scalar():
+    index = ChartIndex.build(engine.calculator, engine.interpreter, 1990, 1991)
+    result = index.query(day_stem="Yang Fire", dominant="Water", limit=10000)
+    hits = {d.item() for d in result["matches"]}
+    assert result["total"] == len(hits) > 0
+
+    start = datetime(1990, 1, 1)
+    for h in range(0, index.hours, 7):
+        dt = start + timedelta(hours=h)
+        chart = engine.compute_saju(dt.year, dt.month, dt.day, dt.hour)
+        expected = chart.meta["day_gan"] == 2 and engine.analyze_stats(chart)["dominant_element"] == "Water"
+        assert (dt in hits) == expected, dt
+
+    paged = index.query(day_stem=2, dominant="Water", offset=5, limit=5)
+    assert list(paged["matches"]) == list(result["matches"][5:10])
+
+
+def test_chart_index_decoded_cache_bytes():
+    budget = 64 * 1024
+    index = ChartIndex.build(engine.calculator, engine.interpreter, 1990, 1991, cache_bytes=budget)
+    for stem in range(10):
+        for branch in range(12):
+            index.query(day_stem=stem, hour_branch=branch, limit=1)
+            assert index._decoded.bytes <= budget
+    cache = index.stats()["decoded_cache"]
+    assert cache["bytes"] == sum(hours.nbytes for hours in index._decoded._data.values())
+    assert 0 < cache["size"] < 22 and cache["hits"] > 0
+
+    # A list larger than the whole budget is decoded but never cached
+    tiny = ChartIndex.build(engine.calculator, engine.interpreter, 1990, 1990, cache_bytes=1024)
+    assert tiny.query(day_stem=0)["total"] > 0
+    assert tiny.stats()["decoded_cache"]["size"] == 0
+
+
+def test_luck_timeline():
+    # 己巳 year (Yin): a man runs backward from the 丁丑 month, a woman forward
+    _, male = engine.compute_luck(1990, 1, 15, 9, 0, "male")
+    _, female = engine.compute_luck(1990, 1, 15, 9, 0, "female")
+    assert (male.forward, female.forward) == (False, True)
+    assert [pillar_name(int(p)) for p in male.daewoon[:2]] == ["Yang Fire (丙) Rat (子)", "Yin Wood (乙) Pig (亥)"]
+    assert pillar_name(int(female.daewoon[0])) == "Yang Earth (戊) Tiger (寅)"
+
+    # Ten days since Sohan (Jan 5), twenty until Ipchun (Feb 4); three days make a year
+    assert (male.start_months, female.start_months) == (38, 80)
+
+    assert pillar_name(int(male.seun[0])) == "Yang Metal (庚) Horse (午)"  # 1990
+    assert pillar_name(int(male.wolun[35][0])) == "Yang Earth (戊) Tiger (寅)"  # 2025 (乙巳) opens with 戊寅
+
+
+def test_compatibility_top_k():
+    import numpy as np
+
+    start = datetime(1960, 1, 1)
+    pool = CandidatePool(engine.compute_saju_packed([start + timedelta(minutes=6007 * i) for i in range(20000)]))
+    chart = engine.compute_saju(1990, 1, 15, 9)
+
+    rows, scores = compatibility.top_k(chart, pool, k=25)
+    full = compatibility.score(chart, pool)
+    expected = np.lexsort((np.arange(len(full)), -full))[:25]
+    assert rows.tolist() == expected.tolist()
+
+    for row, score in zip(rows, scores):
+        parts = compatibility.breakdown(chart, Chart(int(pool.keys[row])))
+        total = parts["balance"] + sum(parts[k]["points"] for k in ("day_master", "day_branch", "year_branch"))
+        assert abs(total - score) < 0.01
+
+
+def test_persona_cache_and_fallback(monkeypatch):
+    import engine.generator as generator
+    from bench.stubs import PERSONA_TOKENS, StubGeminiClient
+    from engine import persona_cache
+
+    chart = {**engine.compute_saju(1990, 1, 15, 9).to_dict(), "dominant_element": "Fire", "class": "Test"}
+
+    # At its real size the persona is below the model's minimum, so no cache is ever requested
+    client = StubGeminiClient()
+    monkeypatch.setattr(generator, "_client", client)
+    gen = generator.DeepReportGenerator()
+    gen.generate(chart)
+    assert (client.caches.created, gen.persona.stats()["enabled"]) == (0, False)
+
+    monkeypatch.setattr(persona_cache, "MIN_TOKENS", 0)
+    gen = generator.DeepReportGenerator()
+    gen.generate(chart)
+    gen.generate({**chart, "class": "Other"})
+    assert client.caches.created == 1
+    assert gen.persona.stats()["tokens_saved"] == 2 * PERSONA_TOKENS
+
+    # The TTL is extended before it runs out
+    gen.persona.expires -= gen.persona.ttl_seconds * 0.9
+    gen.generate({**chart, "class": "Third"})
+    assert (client.caches.created, client.caches.updated) == (1, 1)
+
+    # A cache that vanished server-side: the request is retried inline, the next one recreates it
+    client.caches.live.clear()
+    assert not gen.generate({**chart, "class": "Fourth"}).startswith("## Error")
+    gen.generate({**chart, "class": "Fifth"})
+    assert client.caches.created == 2
+
+    # Refused as too small: every report carries the persona as a system instruction, without retries
+    client = StubGeminiClient(caching=False)
+    monkeypatch.setattr(generator, "_client", client)
+    gen = generator.DeepReportGenerator()
+    assert not gen.generate(chart).startswith("## Error")
+    stats = gen.persona.stats()
+    assert (stats["mode"], stats["tokens_saved"], stats["fallback_requests"]) == ("system_instruction", 0, 1)
+    assert not stats["enabled"] and not gen.persona._due()
+
+
+def test_pregeneration_is_resumable(monkeypatch, tmp_path):
+    import asyncio
+
+    import engine.generator as generator
+    from bench.stubs import OUTPUT_TOKENS, StubGeminiClient
+    from engine import pregen
+    from engine.report_store import ReportStore
+
+    store = ReportStore(str(tmp_path / "reports.sqlite3"))
+    charts = [engine.compute_saju(1990, 1, 15 + i, 9) for i in range(5)]
+    store.add_requests({chart: 10 - i for i, chart in enumerate(charts)})
+    store.add_requests({charts[4]: 20})
+    assert [chart for chart, _ in store.popular_charts(2)] == [charts[4], charts[0]]
+
+    client = StubGeminiClient()
+    monkeypatch.setattr(generator, "_client", client)
+    gen = generator.DeepReportGenerator(store=store)
+    queue = pregen.JobQueue(store.path)
+    assert queue.enqueue(pregen.rank_jobs(store, engine.interpreter, 4)) == 4
+
+    # The first generation fails, as if the run were interrupted there, and the
+    # second comes back empty (tokens spent, nothing to store); the rest complete
+    generate = client.aio.models.generate_content
+    calls = []
+
+    async def flaky(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("connection reset")
+        response = await generate(*args, **kwargs)
+        if len(calls) == 2:
+            response.text = ""
+        return response
+
+    monkeypatch.setattr(client.aio.models, "generate_content", flaky)
+    tally = asyncio.run(pregen.run(gen, queue, engine.interpreter, workers=2, tokens_per_minute=10 ** 6))
+    assert (tally["done"], tally["failed"]) == (2, 2)
+    assert tally["output_tokens"] == 3 * OUTPUT_TOKENS
+
+    # The next run only retries the failed jobs
+    assert len(queue.pending()) == 2
+    asyncio.run(pregen.run(gen, queue, engine.interpreter))
+    summary = queue.summary()
+    assert summary["jobs"] == {"pending": 0, "done": 4, "stored": 0, "failed": 0}
+    assert summary["cost_usd"] > 0
+
+    # Deep requests for pre-generated charts are served from the store
+    deep = gen.generate(pregen.chart_data(charts[4], engine.interpreter))
+    assert len(calls) == 6 and not deep.startswith("## Error")
+
+    # A report the API generated in the meantime is not generated again
+    gen.generate(pregen.chart_data(charts[3], engine.interpreter))
+    assert queue.enqueue(pregen.rank_jobs(store, engine.interpreter, 5)) == 1
+    tally = asyncio.run(pregen.run(gen, queue, engine.interpreter))
+    assert (tally["total"], tally["stored"], len(calls)) == (1, 1, 6)
+
+
+def test_parallel_chapters_and_fallback(monkeypatch):
+    import asyncio
+
+    import engine.generator as generator
+    from bench.stubs import STUB_CHAPTERS, STUB_REPORT, StubGeminiClient
+
+    chart = {**engine.compute_saju(1990, 1, 15, 9).to_dict(), "dominant_element": "Fire", "class": "Test"}
+    client = StubGeminiClient(latency=0.7)
+    monkeypatch.setattr(generator, "_client", client)
+    gen = generator.DeepReportGenerator(mode="chapters")
+
+    t0 = time.perf_counter()
+    report = asyncio.run(gen.agenerate(chart))
+    assert time.perf_counter() - t0 < 0.5  # seven 0.1s chapters at once, not 0.7s
+    assert report == "\n\n".join(chapter.strip() for chapter in STUB_CHAPTERS) + "\n"
+    assert gen.generate({**chart, "class": "Sync"}) == report
+    gen.generate({**chart, "class": "Sync again"})
+    assert len(generator._chapter_pool._threads) <= len(generator.CHAPTERS)  # shared, not one pool per report
+
+    # One failed chapter: the whole report comes from a single call instead
+    generate = client.aio.models.generate_content
+
+    async def flaky(model, contents, config=None):
+        if "Write only chapter 4 " in contents:
+            raise RuntimeError("chapter 4 timed out")
+        return await generate(model, contents, config)
+
+    monkeypatch.setattr(client.aio.models, "generate_content", flaky)
+    assert asyncio.run(gen.agenerate({**chart, "class": "Fallback"})) == STUB_REPORT
+
+
+def test_chart_resource_revalidates():
+    import asyncio
+    import json
+
+    import httpx
+
+    import main
+
+    async def requests():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            posted = await client.post("/analyze", json={"birthDate": "1990-05-15", "birthTime": "14:30"})
+            first = await client.get("/chart/1990-05-15/14:30", headers={"Accept-Encoding": "gzip"})
+            again = await client.get(
+                "/chart/1990-05-15/14:30", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]}
+            )
+            plain = await client.get("/chart/1990-05-15/14:30", headers={"Accept-Encoding": "identity"})
+            invalid = await client.get("/chart/1990-13-15/14:30")
+            return posted, first, again, plain, invalid
+
+    posted, first, again, plain, invalid = asyncio.run(requests())
+    assert first.status_code == 200 and first.headers["content-encoding"] == "gzip"
+    assert first.json() == posted.json()
+    assert "max-age" in first.headers["cache-control"] and "Accept-Encoding" in first.headers["vary"]
+    assert (again.status_code, again.content, again.headers["etag"]) == (304, b"", first.headers["etag"])
+    # Each coding is its own representation with its own strong validator
+    assert plain.headers["etag"] != first.headers["etag"] and "content-encoding" not in plain.headers
+    assert json.loads(plain.content) == posted.json()
+    assert invalid.status_code == 400
+
+
+def test_bulk_cli_matches_api():
+    import io
+    import json
+
+    import main
+    import saju_engine
+
+    rows = [("1990-05-15", "14:30", "", ""), ("1955-07-01", "01:40", "", "Asia/Seoul"),
+            ("2000-01-01", "00:10", "126.98", ""), ("1990-5-15", "9:05", "", "+05:30")]
+    text = "birthDate,birthTime,longitude,timezone\n" + "".join(",".join(row) + "\n" for row in rows)
+    text += "1990-02-30,10:00,,\n\n2000-01-01,12:00,,Nowhere/Else\n"
+    out = io.BytesIO()
+    assert saju_engine.run_bulk(io.StringIO(text), out, chunk_size=2) == 6
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [line.pop("index") for line in lines] == list(range(6))
+    for (birth_date, birth_time, longitude, timezone), line in zip(rows, lines):
+        expected = main.analyze_birth(birth_date, birth_time, float(longitude) if longitude else None, timezone or None)
+        assert line == json.loads(expected)
+    assert "error" in lines[4] and "Nowhere/Else" in lines[5]["error"]
+
+    # The single-date mode computes the same charts (Ipchun 2024 is at 17:27 on 02-04, not midnight)
+    for birth_date, birth_time in (("1990-05-15", "14:30"), ("2024-02-04", "12:00")):
+        assert saju_engine.analyze_one(birth_date, birth_time) == json.loads(main.analyze_birth(birth_date, birth_time))
+
+
+def test_metrics_with_report_store(monkeypatch, tmp_path):
+    import asyncio
+
+    import httpx
+
+    import main
+    from engine.report_store import ReportStore
+
+    store = ReportStore(str(tmp_path / "reports.sqlite3"))
+    store.put("k", "report")
+    store.get("k")
+    store.get("missing")
+    monkeypatch.setattr(main.engine, "report_store", store)
+
+    async def scrape():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.get("/metrics")
+
+    response = asyncio.run(scrape())
+    assert response.status_code == 200
+    assert 'soulstat_cache_hit_ratio{cache="reports"} 0.5' in response.text
+
+
+def test_deep_request_validation_and_luck_cache(monkeypatch):
+    import asyncio
+
+    import httpx
+
+    import main
+
+    payments = []
+
+    async def verify(payment_id):
+        payments.append(payment_id)
+        return False
+
+    monkeypatch.setattr(main, "averify_payment", verify)
+    built = []
+    timeline = main.luck.luck_timeline
+    monkeypatch.setattr(main.luck, "luck_timeline", lambda *args: built.append(args) or timeline(*args))
+
+    async def requests():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            deep = {"birthDate": "1990-05-15", "birthTime": "14:30", "paymentId": "P"}
+            yield await client.post("/analyze/deep", json={**deep, "gender": "other"})
+            yield await client.post("/analyze/deep", json={**deep, "birthDate": "2101-06-01", "gender": "female"})
+            yield await client.post("/analyze/deep", json={**deep, "birthDate": "1990-02-30"})
+            yield await client.post("/analyze/deep", json={**deep, "gender": "female"})
+            luck = {"birthDate": "1990-05-15", "birthTime": "14:30", "gender": "male", "years": 80}
+            yield await client.post("/luck", json=luck)
+            yield await client.post("/luck", json=luck)
+
+    async def collect():
+        return [response async for response in requests()]
+
+    bad_gender, out_of_range, bad_date, unpaid, luck, luck_again = asyncio.run(collect())
+    assert bad_gender.status_code == 422
+    assert out_of_range.status_code == 400 and "Solar terms" in out_of_range.json()["detail"]
+    assert bad_date.json()["detail"] == "Invalid date format"
+    # Only the valid request reached the payment check
+    assert unpaid.status_code == 402 and payments == ["P"]
+    # The second /luck request is a cache hit and builds no timeline (span 100 is the deep report's)
+    assert luck.content == luck_again.content and [args[-1] for args in built] == [100, 80]
+
+
+class _FakePayPal:
+    """PayPal token and order endpoints for offline PayPalClient tests; `script` holds forced order statuses."""
+
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.tokens = 0
+        self.orders = 0
+        self.script = []
+
+    def handle(self, method, path, headers):
+        if path == "/v1/oauth2/token":
+            self.tokens += 1
+            return 200, {"access_token": f"T{self.tokens}", "expires_in": self.expires_in}
+        self.orders += 1
+        status = self.script.pop(0) if self.script else 200
+        if status == 200 and headers.get("Authorization") != f"Bearer T{self.tokens}":
+            status = 401
+        return status, {"status": "COMPLETED"} if status == 200 else {}
+
+    def session(self):
+        from urllib.parse import urlsplit
+
+        paypal = self
+
+        class Response:
+            def __init__(self, status_code, payload):
+                self.status_code, self._payload, self.text = status_code, payload, str(payload)
+
+            def json(self):
+                return self._payload
+
+        class Session:
+            def request(self, method, url, timeout=None, headers=None, **kwargs):
+                return Response(*paypal.handle(method, urlsplit(url).path, headers or {}))
+
+        return Session()
+
+    def transport(self):
+        import httpx
+
+        def handler(request):
+            status, payload = self.handle(request.method, request.url.path, request.headers)
+            return httpx.Response(status, json=payload)
+
+        return httpx.MockTransport(handler)
+
+
+def _paypal_client(fake, **options):
+    from payments import PayPalClient
+
+    client = PayPalClient("id", "secret", "https://paypal.test", backoff=0, **options)
+    client._session = fake.session()
+    client._get_async_client(fake.transport())
+    return client
+
+
+def test_paypal_token_cache_and_refresh():
+    fake = _FakePayPal()
+    client = _paypal_client(fake)
+    assert client.verify("A") and client.verify("B")
+    assert (fake.tokens, fake.orders) == (1, 2)
+
+    # A token within token_margin of its expiry is refetched
+    client._token_expiry = 0.0
+    assert client.verify("C") and fake.tokens == 2
+
+    # Revoked early: one 401 refreshes the token and retries, a second 401 gives up
+    fake.script = [401]
+    assert client.verify("D") and fake.tokens == 3
+    fake.script = [401, 401]
+    assert not client.verify("E") and fake.tokens == 4
+
+    # expires_in below the margin: never cached
+    fake = _FakePayPal(expires_in=60)
+    client = _paypal_client(fake)
+    assert client.verify("A") and client.verify("B") and fake.tokens == 2
+
+
+def test_paypal_bounded_retries():
+    fake = _FakePayPal()
+    client = _paypal_client(fake, max_attempts=3)
+    fake.script = [503, 502]
+    assert client.verify("A") and fake.orders == 3
+    fake.script = [503, 503, 503, 503]
+    assert not client.verify("B") and fake.orders == 6
+    assert fake.script == [503]
+
+
+def test_paypal_async_client():
+    import asyncio
+    import threading
+
+    fake = _FakePayPal()
+    client = _paypal_client(fake, max_attempts=2)
+    assert client.verify("A")
+
+    async def run():
+        # The token cache is shared with the sync path
+        assert await client.averify("B") and fake.tokens == 1
+        # Concurrent callers with an expired token wait on one refresh
+        client._token_expiry = 0.0
+        results = await asyncio.gather(*(client.averify(str(i)) for i in range(10)))
+        fake.script = [503, 503]
+        failed = await client.averify("C")
+        await client.aclose()
+        return results, failed
+
+    results, failed = asyncio.run(run())
+    assert all(results) and fake.tokens == 2 and not failed
+
+    # Created once even when the warm-up thread and the event loop race for it
+    from payments import PayPalClient
+
+    client = PayPalClient("id", "secret", "https://paypal.test")
+    created = []
+    threads = [threading.Thread(target=lambda: created.append(client._get_async_client())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(c) for c in created}) == 1
+
+
+def _split(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def _records(body, size):
+    import asyncio
+
+    from batch import RecordError, iter_records
+
+    async def chunks():
+        for chunk in _split(body, size):
+            yield chunk
+
+    async def collect():
+        return [str(r) if isinstance(r, RecordError) else r async for r in iter_records(chunks())]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 64, 1 << 20])
+def test_batch_parser_chunk_boundaries(size):
+    import json
+
+    records = [{"birthDate": "1990-05-15", "birthTime": "14:30", "note": "명선 [x], {y}"},
+               {"birthDate": "2000-01-01"}, {"birthDate": "1955-07-01", "timezone": "Asia/Seoul"}]
+    array = (" \n[ " + " ,\n ".join(json.dumps(r, ensure_ascii=False) for r in records) + " ]\n").encode()
+    ndjson = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode()
+    assert _records(array, size) == records
+    # A trailing newline (or blank lines) adds no record; a missing one loses none
+    assert _records(ndjson, size) == records
+    assert _records(ndjson.rstrip(b"\n") + b"\n\n\n", size) == records
+    assert _records(ndjson.rstrip(b"\n"), size) == records
+    assert _records(b"[]", size) == _records(b" [ \n ] ", size) == _records(b"", size) == []
+
+
+@pytest.mark.parametrize("size", [1, 7, 1 << 20])
+def test_batch_parser_malformed_records(size):
+    good = b'{"birthDate": "1990-05-15"}'
+    # NDJSON: the bad line is reported in place and parsing carries on
+    assert _records(good + b"\n{oops\n" + good + b"\n", size) == [
+        {"birthDate": "1990-05-15"}, "Invalid JSON: Expecting property name enclosed in double quotes",
+        {"birthDate": "1990-05-15"},
+    ]
+    # Array: there is no resynchronising after a bad item, so it ends the stream with that item's error
+    assert _records(b"[" + good + b", {oops}, " + good + b"]", size) == [
+        {"birthDate": "1990-05-15"}, "Invalid JSON: Expecting property name enclosed in double quotes at char 31"
+    ]
+    assert _records(b"[" + good + b', {"birthDate": "1990-05-15"', size) == [
+        {"birthDate": "1990-05-15"}, "Invalid JSON: Expecting ',' delimiter at char 56"
+    ]
+    assert _records(b"[" + good, size) == [{"birthDate": "1990-05-15"}, "Unterminated JSON array"]
+    assert _records(b"[" + good + b",", size) == [{"birthDate": "1990-05-15"}, "Unterminated JSON array"]
+
+
+def test_batch_endpoint_streams_request_body():
+    import asyncio
+    import json
+
+    import httpx
+
+    import main
+
+    body = b'[{"birthDate": "1990-05-15", "birthTime": "14:30"}, {"birthDate": "1990-13-01"}, {"birthTime": "1"}]'
+
+    async def request():
+        async def chunks():
+            for chunk in _split(body, 9):
+                yield chunk
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.post("/analyze/batch", content=chunks())
+
+    response = asyncio.run(request())
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert lines[0]["pillars"] == json.loads(main.analyze_birth("1990-05-15", "14:30"))["pillars"]
+    assert lines[1]["error"].startswith("Invalid date") and "birthDate" in lines[2]["error"]
+
+
+def test_single_flight_threads():
+    import threading
+
+    from engine.singleflight import SingleFlight
+
+    flights = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def work(fail):
+        calls.append(fail)
+        release.wait(5)
+        if fail:
+            raise RuntimeError("boom")
+        return object()
+
+    for fail in (False, True):
+        release.clear()
+        outcomes = []
+
+        def caller():
+            try:
+                outcomes.append(flights.do("key", work, fail))
+            except RuntimeError as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=caller) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        # Let every follower join the flight before the leader finishes
+        deadline = time.monotonic() + 5
+        while flights.stats()["coalesced"] < 7 * (2 if fail else 1) and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+        assert len(outcomes) == 8 and len({id(o) for o in outcomes}) == 1
+        assert isinstance(outcomes[0], RuntimeError) == fail
+        assert flights.stats()["in_flight"] == 0
+
+    assert calls == [False, True]
+    assert (flights.leaders, flights.coalesced) == (2, 14)
+    # The key is free again after a failure
+    release.set()
+    assert flights.do("key", work, False) is not None and len(calls) == 3
+
+
+def test_single_flight_asyncio():
+    import asyncio
+
+    from engine.singleflight import AsyncSingleFlight
+
+    flights = AsyncSingleFlight()
+    calls = []
+
+    async def work(fail):
+        calls.append(fail)
+        await asyncio.sleep(0.02)
+        if fail:
+            raise RuntimeError("boom")
+        return object()
+
+    async def run():
+        results = await asyncio.gather(*(flights.do("key", work, False) for _ in range(8)))
+        assert len({id(r) for r in results}) == 1 and calls == [False]
+
+        errors = await asyncio.gather(*(flights.do("key", work, True) for _ in range(8)), return_exceptions=True)
+        assert all(isinstance(e, RuntimeError) for e in errors) and len({id(e) for e in errors}) == 1
+        assert flights.stats()["in_flight"] == 0
+
+        # A cancelled leader leaves the shared work running for its followers
+        leader = asyncio.ensure_future(flights.do("other", work, False))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do("other", work, False))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower is not None
+
+        await flights.do("key", work, False)
+        return flights.stats()
+
+    stats = asyncio.run(run())
+    assert calls == [False, True, False, False]
+    assert stats == {"leaders": 4, "coalesced": 15, "in_flight": 0}
+
+
+@pytest.mark.parametrize("size", [1, 7, 4096])
+def test_chapter_splitter_chunk_sizes(size):
+    from engine.generator import CHAPTERS, ChapterSplitter
+
+    report = "Preamble from the sage.\n\n" + "".join(
+        f"## {i}. **{title}**\n\n### A note, not a chapter\nText of chapter {i}. # not a heading\n\n"
+        for i, title in enumerate(CHAPTERS, 1)
+    ) + "Closing words without a newline"
+    splitter = ChapterSplitter()
+    events = []
+    for chunk in _split(report, size):
+        events.extend(splitter.feed(chunk))
+    events.extend(splitter.close())
+
+    chapters = [data for event, data in events if event == "chapter"]
+    assert chapters == [{"index": i, "title": title} for i, title in enumerate(CHAPTERS, 1)]
+    assert "".join(data["text"] for event, data in events if event == "chunk") == report
+    # Each chapter event comes right before the text starting with its heading
+    for i, (event, data) in enumerate(events):
+        if event == "chapter":
+            assert events[i + 1][1]["text"].startswith(f"## {data['index']}. ")
+
+
+def test_deep_stream_sse_framing(monkeypatch):
+    import asyncio
+    import json
+
+    import httpx
+
+    import engine.generator as generator
+    import main
+    from bench.stubs import STUB_REPORT, StubGeminiClient
+
+    async def verify(payment_id):
+        return True
+
+    monkeypatch.setattr(main, "averify_payment", verify)
+    monkeypatch.setattr(generator, "_client", StubGeminiClient())
+    monkeypatch.setattr(main.engine, "report_store", None)
+    monkeypatch.setattr(main.engine, "_generator", None)
+
+    async def stream():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            payload = {"birthDate": "1987-03-09", "birthTime": "05:15", "paymentId": "P"}
+            return await client.post("/analyze/deep/stream", json=payload)
+
+    response = asyncio.run(stream())
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.endswith("\n\n")
+    events = []
+    for frame in response.text[:-2].split("\n\n"):
+        event_line, data_line = frame.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        events.append((event_line[7:], json.loads(data_line[6:])))
+
+    assert [data["index"] for event, data in events if event == "chapter"] == list(range(1, 8))
+    assert "".join(data["text"] for event, data in events if event == "chunk") == STUB_REPORT + "\n\n"
+    assert [event for event, _ in events[-2:]] == ["usage", "done"]
+
+
+def test_report_store_expiry_eviction_and_counters(tmp_path):
+    import random
+    import zlib
+
+    from engine.report_store import ReportStore
+
+    now = [1000.0]
+    store = ReportStore(str(tmp_path / "reports.sqlite3"), max_bytes=10_000, ttl_seconds=3600, clock=lambda: now[0])
+    rng = random.Random(8)
+
+    def report():
+        return "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=6000))  # ~3.6 kB compressed
+
+    size = len(zlib.compress(report().encode(), 6))
+    assert 3000 < size < 5000
+
+    # TTL: still readable just before it runs out, gone at expiry and purged by the next write
+    store.put("old", "kept for an hour")
+    now[0] += 3599
+    assert store.get("old") == "kept for an hour"
+    now[0] += 1
+    assert store.get("old") is None
+    store.put("a", report())
+    assert store.stats()["entries"] == 1
+
+    # Size cap: the least recently read entry goes first
+    now[0] += 1
+    store.put("b", report())
+    now[0] += 1
+    assert store.get("a") is not None
+    now[0] += 1
+    store.put("c", report())
+    assert store.get("b") is None and store.get("a") is not None and store.get("c") is not None
+    stats = store.stats()
+    assert stats["entries"] == 2 and stats["bytes"] <= stats["max_bytes"]
+
+    # A report larger than the cap evicts everything, itself included
+    store.put("huge", "".join(report() for _ in range(4)))
+    assert store.stats()["entries"] == 0
+
+    assert (store.hits, store.misses) == (4, 2)
+    assert store.stats()["hit_ratio"] == round(4 / 6, 4)
+
+
+def test_metric_families_are_abstract():
+    from engine import metrics
+
+    class Incomplete(metrics._Recorded):
+        kind = "counter"
+
+        def _render_child(self, values, child):
+            return []
+
+    registered = len(metrics.REGISTRY)
+    with pytest.raises(TypeError, match="_new_child"):
+        Incomplete("soulstat_incomplete", "missing _new_child")
+    assert len(metrics.REGISTRY) == registered
+
+
+def test_metric_shards_of_exited_threads_are_folded():
+    import threading
+
+    from engine import metrics
+
+    histogram = metrics.Histogram("soulstat_test_threads_seconds", "per-thread shards", buckets=(0.5,))
+    metrics.REGISTRY.remove(histogram)
+    child = histogram.labels()
+    child.observe(0.25)
+
+    def record():
+        child.observe(0.25)
+        child.observe(1.0)
+
+    for _ in range(3):
+        threads = [threading.Thread(target=record) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # Only the main thread's shard is left; the rest were summed into the retired total
+    assert len(child._state._shards) == 1
+    assert child.totals() == [61, 60, 0.25 + 60 * 1.25]
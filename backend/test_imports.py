@@ -0,0 +1,12 @@
+from bench.importtime import heavy_imports, import_report
+
+
+def test_analyze_path_stays_light():
+    # google.genai, requests, httpx and friends load lazily, never for /analyze
+    assert heavy_imports(import_report()) == []
+
+
+def test_bulk_cli_skips_llm_stack():
+    # The bulk CLI needs NumPy, but google.genai and ephem only with --deep
+    snippet = 'import io, saju_engine\nsaju_engine.run_bulk(io.StringIO("1990-05-15,14:30\\n"), io.BytesIO())\n'
+    assert [name for name in heavy_imports(import_report(snippet)) if not name.startswith("numpy")] == []
@@ -0,0 +1,44 @@
+// Relays the backend's server-sent events as they arrive, so the first chapter
+// reaches the browser in about a second instead of after the whole report.
+export const maxDuration = 60;
+export const dynamic = 'force-dynamic';
+
+export async function POST(request: Request) {
+    try {
+        const body = await request.json();
+        const { birthDate } = body;
+
+        if (!birthDate) {
+            return Response.json({ error: 'Birth date is required' }, { status: 400 });
+        }
+
+        // Backend URL (Environment variable or default to localhost for development)
+        const BACKEND_URL = process.env.BACKEND_URL || 'http://127.0.0.1:8000';
+
+        const response = await fetch(`${BACKEND_URL}/analyze/deep/stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(body),
+        });
+
+        if (!response.ok || !response.body) {
+            const errorText = await response.text();
+            console.error('Backend Error:', errorText);
+            return Response.json({ error: 'Failed to stream report from backend' }, { status: response.status });
+        }
+
+        return new Response(response.body, {
+            headers: {
+                'Content-Type': 'text/event-stream',
+                'Cache-Control': 'no-cache, no-transform',
+                'Connection': 'keep-alive',
+            },
+        });
+
+    } catch (error) {
+        console.error('API Proxy Error:', error);
+        return Response.json({ error: 'Internal Server Error' }, { status: 500 });
+    }
+}
@@ -1,27 +1,37 @@
 import { NextResponse } from 'next/server';
 
+// The backend's /chart/{date}/{time} path segments: YYYY-MM-DD and HH:MM
+const DATE_PATTERN = /^\d{4}-\d{2}-\d{2}$/;
+const TIME_PATTERN = /^\d{1,2}:\d{2}$/;
+
 export async function POST(request: Request) {
     try {
         const body = await request.json();
-        const { birthDate, birthTime } = body;
+        const { birthDate } = body;
+        const birthTime = body.birthTime || '00:00';
 
         if (!birthDate) {
             return NextResponse.json({ error: 'Birth date is required' }, { status: 400 });
         }
+        if (typeof birthDate !== 'string' || !DATE_PATTERN.test(birthDate)) {
+            return NextResponse.json({ error: 'Birth date must be YYYY-MM-DD' }, { status: 400 });
+        }
+        if (typeof birthTime !== 'string' || !TIME_PATTERN.test(birthTime)) {
+            return NextResponse.json({ error: 'Birth time must be HH:MM' }, { status: 400 });
+        }
 
         // Backend URL (Environment variable or default to localhost for development)
         // Ensure BACKEND_URL in Vercel is set to https://soul-stat-backend.onrender.com (no trailing slash)
         const BACKEND_URL = process.env.BACKEND_URL || 'http://127.0.0.1:8000';
 
-        console.log(`Proxying request to: ${BACKEND_URL}/analyze`);
+        // GET /chart is cacheable (ETag + Cache-Control), so repeat lookups are served from the fetch cache
+        const chartUrl = `${BACKEND_URL}/chart/${encodeURIComponent(birthDate)}/${encodeURIComponent(birthTime)}`;
+        console.log(`Proxying request to: ${chartUrl}`);
 
         // Call the FastAPI backend
-        const response = await fetch(`${BACKEND_URL}/analyze`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({ birthDate, birthTime }),
+        const response = await fetch(chartUrl, {
+            headers: { 'Accept-Encoding': 'gzip' },
+            next: { revalidate: 604800 },
         });
 
         if (!response.ok) {